@@ -31,10 +31,17 @@ from . import application
 from . import argparse_ as argparse
 from . import base_plugin
 from . import conf
+from . import copy_ as copy
+from . import downloads
 from .license_ import LICENSE
 from .version import VERSION
 from . import logging_ as logging
+from . import logs
+from . import metrics
+from . import output
 from . import paths
 from . import plugins
+from . import properties
+from . import resources
 from . import server
 from . import worlds
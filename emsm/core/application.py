@@ -44,6 +44,7 @@ from . import argparse_
 from . import base_plugin
 from . import conf
 from . import logging_
+from . import output
 from . import paths
 from . import plugins
 from . import server
@@ -128,12 +129,23 @@ class Application(object):
         self._worlds = worlds.WorldManager(self)
         self._server = server.ServerManager(self)
         self._plugins = plugins.PluginManager(self)
+        self._output = output.Output(self)
 
         # The exit code can be changed by plugins. This is useful
         # since a plugin should not throw a SystemExit exception.
         self._exit_code = 0
         return None
 
+    def lock(self):
+        """
+        Returns the :class:`filelock.FileLock`, which makes sure that only one
+        EMSM application runs at the same time. It is acquired in
+        :meth:`setup`.
+
+        Long running plugins should release the lock, while they are idle.
+        """
+        return self._lock
+
     def paths(self):
         """
         Returns the used :class:`~emsm.core.paths.Pathsystem` instance.
@@ -171,6 +183,13 @@ class Application(object):
         """
         return self._plugins
 
+    def output(self):
+        """
+        Returns the :class:`~emsm.core.output.Output` document, which
+        collects the results of the plugins for ``--output json``.
+        """
+        return self._output
+
     def exit_code(self):
         """
         Returns the exit code of the application.
@@ -343,9 +362,14 @@ class Application(object):
         # Parse the arguments.
         self._argparser.args(cache=False)
 
-        # Dispatch the plugins.
-        self._plugins.run()
-        self._plugins.finish()
+        # Dispatch the plugins. With the JSON output, only the document is
+        # written to stdout.
+        with self._output.redirect():
+            self._plugins.run()
+            self._plugins.finish()
+
+        # Write the results of the plugins, if they have been collected.
+        self._output.write()
 
         # Save changes to the configuration that have been made during
         # execution.
@@ -39,6 +39,7 @@ import logging
 # local
 from .license_ import LICENSE
 from .version import VERSION
+from .output import FORMATS
 
 
 # Data
@@ -230,4 +231,16 @@ class ArgumentParser(object):
             default = False,
             help = "Selects all available server software."
             )
+
+        # The output format.
+        self._argparser.add_argument(
+            "--output",
+            action = "store",
+            choices = FORMATS,
+            default = "console",
+            dest = "output",
+            help = "The output format. With 'json', the plugins print one "\
+                   "JSON document with their results. All other messages "\
+                   "are printed to stderr."
+            )
         return None
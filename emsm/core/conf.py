@@ -154,6 +154,7 @@ class MainConfiguration(ConfigParser):
         user = minecraft
         timeout = 0
         screenrc =
+        max_parallel_builds = 0
 
         [backups]
         include_server = ...
@@ -170,6 +171,7 @@ class MainConfiguration(ConfigParser):
         self["emsm"]["user"] = "minecraft"
         self["emsm"]["timeout"] = "0"
         self["emsm"]["screenrc"] = ""
+        self["emsm"]["max_parallel_builds"] = "0"
         return None
 
     def epilog(self):
@@ -183,6 +185,7 @@ class MainConfiguration(ConfigParser):
             "user = minecraft",
             "timeout = -1",
             "screenrc = ",
+            "max_parallel_builds = 0",
             "",
             "The configuration section of each plugin is titled with the plugins",
             "name.",
@@ -343,6 +346,22 @@ class Configuration(object):
         """
         return self._worlds.get(name)
 
+    def add_world(self, name):
+        """
+        Creates a new :class:`WorldConfiguration` for the world with the name
+        *name* and returns it. The file is created, when the configuration
+        is written.
+
+        :raises ValueError:
+            if there is already a configuration for this world.
+        """
+        if name in self._worlds:
+            raise ValueError("The world '{}' already exists.".format(name))
+
+        path = os.path.join(self._dir, "{}.world.conf".format(name))
+        self._worlds[name] = WorldConfiguration(path)
+        return self._worlds[name]
+
     def list_worlds(self):
         """
         Returns a list with the names of all worlds, for which a configuration
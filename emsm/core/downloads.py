@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2018 <see AUTHORS.txt>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+A content-addressed cache for the downloaded server software.
+
+Each downloaded file is stored as :file:`objects/<sha256>` in the cache
+directory. The index (:file:`index.json`) maps the URLs to the hashes and the
+HTTP validators (*ETag* and *Last-Modified*) of the latest download, so
+that the file is only transferred again, if it has been changed on the
+server.
+"""
+
+
+# Modules
+# ------------------------------------------------
+
+# std
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+
+
+# Data
+# ------------------------------------------------
+
+__all__ = [
+    "DownloadError",
+    "IntegrityError",
+    "Download",
+    "DownloadCache"
+    ]
+
+log = logging.getLogger(__file__)
+
+#: The size of the chunks, which are read from the network and hashed.
+CHUNK_SIZE = 2**20
+
+#: The timeout of a download request in seconds.
+TIMEOUT = 60
+
+#: A download, which has been validated less than *MAX_AGE* seconds ago by
+#: this process, is used without asking the server again.
+MAX_AGE = 60
+
+
+# Exceptions
+# ------------------------------------------------
+
+class DownloadError(Exception):
+    """
+    Raised if a file could not be downloaded.
+    """
+
+    def __init__(self, url, msg=None):
+        self.url = url
+        self.msg = msg
+        return None
+
+    def __str__(self):
+        temp = "The download of '{}' failed.".format(self.url)
+        if self.msg is not None:
+            temp += " " + str(self.msg)
+        return temp
+
+
+class IntegrityError(DownloadError):
+    """
+    Raised if the hash of a downloaded file does not match the expected
+    hash.
+    """
+
+    def __init__(self, url, algorithm, expected, actual):
+        msg = "The {} hash '{}' does not match the expected hash '{}'."\
+              .format(algorithm, actual, expected)
+        DownloadError.__init__(self, url, msg)
+        return None
+
+
+# Functions
+# ------------------------------------------------
+
+def _hash_file(path):
+    """
+    Returns the sha1 and sha256 hex digests of the file at *path*.
+    """
+    sha1 = hashlib.sha1()
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            sha1.update(chunk)
+            sha256.update(chunk)
+    return (sha1.hexdigest(), sha256.hexdigest())
+
+
+def _verify(url, record, sha1, sha256):
+    """
+    Raises an :exc:`IntegrityError`, if the hashes in *record* do not match
+    the expected hashes *sha1* and *sha256* (if given).
+    """
+    for algorithm, expected in (("sha1", sha1), ("sha256", sha256)):
+        if expected and record[algorithm] != expected.strip().lower():
+            raise IntegrityError(url, algorithm, expected, record[algorithm])
+    return None
+
+
+# Classes
+# ------------------------------------------------
+
+class Download(object):
+    """
+    The result of :meth:`DownloadCache.fetch`.
+
+    :ivar str url:
+        The downloaded URL.
+    :ivar str path:
+        The path of the file in the cache. It must not be modified.
+    :ivar str sha1:
+        The sha1 hex digest of the file.
+    :ivar str sha256:
+        The sha256 hex digest of the file.
+    :ivar bool transferred:
+        ``True``, if the file has been transferred and ``False``, if the
+        cached file has been used (the server responded with
+        *304 Not Modified*).
+    """
+
+    def __init__(self, url, path, sha1, sha256, transferred):
+        self.url = url
+        self.path = path
+        self.sha1 = sha1
+        self.sha256 = sha256
+        self.transferred = transferred
+        return None
+
+    def copy(self, dst):
+        """
+        Copies the downloaded file atomically to *dst*.
+        """
+        dst_dir = os.path.dirname(os.path.abspath(dst))
+        fd, tmp_path = tempfile.mkstemp(dir=dst_dir, prefix=".")
+        os.close(fd)
+        try:
+            shutil.copyfile(self.path, tmp_path)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, dst)
+        except:
+            os.remove(tmp_path)
+            raise
+        return None
+
+
+class DownloadCache(object):
+    """
+    Downloads files into the *directory* and reuses them, as long as they
+    have not been changed on the server.
+
+    The cache is thread-safe, so multiple servers can be installed at the
+    same time.
+
+    .. seealso::
+
+        * :meth:`emsm.core.paths.Pathsystem.downloads`
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+        self._objects_dir = os.path.join(directory, "objects")
+        self._index_path = os.path.join(directory, "index.json")
+
+        # Maps the url to the record of the latest download.
+        # url => {"sha1", "sha256", "size", "mtime_ns", "etag",
+        #         "last_modified", "time"}
+        self._index = None
+        self._lock = threading.Lock()
+
+        # Maps the url to the time (:func:`time.monotonic`), when the cached
+        # file has been validated with the server the last time.
+        self._validated = dict()
+        return None
+
+    def directory(self):
+        """
+        Returns the directory of the cache.
+        """
+        return self._directory
+
+    def _load_index(self):
+        """
+        Loads the index, if it has not been loaded yet. Must be called with
+        the lock held.
+        """
+        if self._index is not None:
+            return None
+
+        try:
+            with open(self._index_path) as file:
+                self._index = json.load(file)
+        except (OSError, IOError, ValueError) as err:
+            self._index = dict()
+        return None
+
+    def _save_index(self):
+        """
+        Writes the index atomically. Must be called with the lock held.
+
+        The temporary file has a unique name, since other EMSM processes
+        may share the cache directory.
+        """
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self._directory, prefix=".index-", suffix=".tmp"
+            )
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump(self._index, file, indent=4, sort_keys=True)
+            os.replace(tmp_path, self._index_path)
+        except:
+            os.remove(tmp_path)
+            raise
+        return None
+
+    def _object_path(self, sha256):
+        """
+        Returns the path of the object with the hash *sha256*.
+        """
+        return os.path.join(self._objects_dir, sha256)
+
+    def _cached(self, url):
+        """
+        Returns the index record of *url*, if the cached object exists and
+        is intact. Otherwise ``None``.
+
+        The object is only hashed again, if its size or modification time
+        differ from the values, which have been stored with the verified
+        hash.
+        """
+        with self._lock:
+            self._load_index()
+            record = self._index.get(url)
+            if record is not None:
+                record = dict(record)
+        if record is None:
+            return None
+
+        path = self._object_path(record["sha256"])
+        try:
+            stat = os.stat(path)
+        except (OSError, IOError):
+            return None
+
+        if stat.st_size == record["size"] \
+           and stat.st_mtime_ns == record.get("mtime_ns"):
+            return record
+
+        try:
+            sha1, sha256 = _hash_file(path)
+        except (OSError, IOError):
+            return None
+
+        if sha256 != record["sha256"]:
+            log.warning("the cached download '{}' is corrupt.".format(path))
+            os.remove(path)
+            return None
+
+        # The record may have been replaced by a new download in the meantime.
+        record["mtime_ns"] = stat.st_mtime_ns
+        with self._lock:
+            current = self._index.get(url)
+            if current is not None and current["sha256"] == record["sha256"]:
+                current["mtime_ns"] = stat.st_mtime_ns
+                self._save_index()
+        return record
+
+    def _remove_unused(self, sha256):
+        """
+        Removes the object *sha256*, if it is no longer referenced by the
+        index. Must be called with the lock held.
+        """
+        if any(record["sha256"] == sha256 for record in self._index.values()):
+            return None
+        try:
+            os.remove(self._object_path(sha256))
+        except FileNotFoundError:
+            pass
+        return None
+
+    def fetch(self, url, sha1=None, sha256=None, max_age=None):
+        """
+        Downloads the file at *url* into the cache and returns a
+        :class:`Download`.
+
+        If the file has been downloaded before, a conditional request
+        (*If-None-Match*, *If-Modified-Since*) is sent and the cached file is
+        reused, if the server responds with *304 Not Modified*. If the file
+        has been validated less than *max_age* (default: :data:`MAX_AGE`)
+        seconds ago, no request is sent at all.
+
+        If *sha1* or *sha256* are given, the file is verified against these
+        hashes.
+
+        :raises DownloadError:
+            if the download failed.
+        :raises IntegrityError:
+            if the hashes do not match.
+        """
+        os.makedirs(self._objects_dir, exist_ok=True)
+
+        cached = self._cached(url)
+
+        # A cached file, which already has the expected hash or has been
+        # validated recently, does not need to be validated again.
+        if max_age is None:
+            max_age = MAX_AGE
+
+        validated = self._validated.get(url)
+        if cached is not None and validated is not None \
+           and time.monotonic() - validated < max_age:
+            _verify(url, cached, sha1, sha256)
+            return Download(
+                url, self._object_path(cached["sha256"]),
+                cached["sha1"], cached["sha256"], False
+                )
+
+        if cached is not None and (sha1 or sha256):
+            try:
+                _verify(url, cached, sha1, sha256)
+            except IntegrityError:
+                pass
+            else:
+                return Download(
+                    url, self._object_path(cached["sha256"]),
+                    cached["sha1"], cached["sha256"], False
+                    )
+
+        request = urllib.request.Request(url)
+        if cached is not None:
+            if cached.get("etag"):
+                request.add_header("If-None-Match", cached["etag"])
+            if cached.get("last_modified"):
+                request.add_header("If-Modified-Since", cached["last_modified"])
+
+        try:
+            response = urllib.request.urlopen(request, timeout=TIMEOUT)
+        except urllib.error.HTTPError as err:
+            if err.code == 304 and cached is not None:
+                log.info("'{}' has not been modified.".format(url))
+                self._validated[url] = time.monotonic()
+                _verify(url, cached, sha1, sha256)
+                return Download(
+                    url, self._object_path(cached["sha256"]),
+                    cached["sha1"], cached["sha256"], False
+                    )
+            raise DownloadError(url, err) from err
+        except Exception as err:
+            raise DownloadError(url, err) from err
+
+        # Stream the file into a temporary file in the cache and hash it on
+        # the fly.
+        fd, tmp_path = tempfile.mkstemp(dir=self._objects_dir, prefix=".")
+        try:
+            hash_sha1 = hashlib.sha1()
+            hash_sha256 = hashlib.sha256()
+            size = 0
+            try:
+                with response, os.fdopen(fd, "wb") as file:
+                    for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                        hash_sha1.update(chunk)
+                        hash_sha256.update(chunk)
+                        file.write(chunk)
+                        size += len(chunk)
+            except Exception as err:
+                raise DownloadError(url, err) from err
+
+            record = {
+                "sha1": hash_sha1.hexdigest(),
+                "sha256": hash_sha256.hexdigest(),
+                "size": size,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "time": time.time()
+                }
+            _verify(url, record, sha1, sha256)
+
+            os.replace(tmp_path, self._object_path(record["sha256"]))
+            record["mtime_ns"] = os.stat(
+                self._object_path(record["sha256"])
+                ).st_mtime_ns
+        except:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._load_index()
+            old_record = self._index.get(url)
+            self._index[url] = record
+            if old_record is not None \
+               and old_record["sha256"] != record["sha256"]:
+                self._remove_unused(old_record["sha256"])
+            self._save_index()
+        self._validated[url] = time.monotonic()
+
+        log.info("downloaded '{}' ({} bytes, sha256 {}).".format(
+            url, size, record["sha256"]
+            ))
+        return Download(
+            url, self._object_path(record["sha256"]),
+            record["sha1"], record["sha256"], True
+            )
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2018 <see AUTHORS.txt>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+This module contains the log matcher of the EMSM. It searches the server logs
+for multiple patterns (errors, warnings, ...) at once.
+
+Each pattern belongs to a *category* (e.g. *error* or *lag*) and has a
+*severity* (*warning* or *critical*). All patterns are compiled into one
+regular expression, which is only applied to lines containing a literal
+string, that is required by one of the patterns. So the log is usually
+scanned only by the fast :meth:`str.find` and not by the regex engine.
+"""
+
+
+# Modules
+# ------------------------------------------------
+
+# std
+import re
+import logging
+
+
+# Data
+# ------------------------------------------------
+
+__all__ = [
+    "SEVERITIES",
+    "LogMatcher"
+    ]
+
+log = logging.getLogger(__file__)
+
+#: The known severities of a log pattern.
+SEVERITIES = ("warning", "critical")
+
+#: Literals shorter than this are not used for the prefilter, since they
+#: probably occur in almost every line.
+MIN_LITERAL_LENGTH = 3
+
+
+# Functions
+# ------------------------------------------------
+
+def _required_literal(regex):
+    """
+    Returns the longest string, which occurs in every match of *regex*, or
+    ``None``, if no such string could be found.
+
+    Only a simple subset of the regex syntax is analysed: Literal characters
+    outside of groups and character classes. So the result is conservative.
+    """
+    runs = list()
+    run = str()
+    depth = 0
+
+    i = 0
+    while i < len(regex):
+        char = regex[i]
+        literal = None
+
+        if char == "\\":
+            # \. is a literal, while \d or \1 are not.
+            escaped = regex[i + 1:i + 2]
+            if escaped and not escaped.isalnum():
+                literal = escaped
+            i += 2
+        elif char == "[":
+            # Skip the character class. A "]" directly after the opening
+            # bracket (or "[^") is a literal.
+            i += 1
+            if regex[i:i + 1] == "^":
+                i += 1
+            if regex[i:i + 1] == "]":
+                i += 1
+            while i < len(regex) and regex[i] != "]":
+                i += 2 if regex[i] == "\\" else 1
+            i += 1
+        elif char == "(":
+            # Inline flags like (?i) change the meaning of the literals.
+            if regex[i + 1:i + 2] == "?" and regex[i + 2:i + 3] \
+               and regex[i + 2] in "aiLmsux-":
+                return None
+            depth += 1
+            i += 1
+        elif char == ")":
+            depth -= 1
+            i += 1
+        elif char == "|":
+            if depth == 0:
+                return None
+            i += 1
+        elif char in "*?{":
+            # The previous character is optional.
+            run = run[:-1]
+            if char == "{":
+                i = regex.find("}", i) if "}" in regex[i:] else len(regex)
+            i += 1
+        elif char in ".^$+":
+            i += 1
+        else:
+            literal = char
+            i += 1
+
+        if literal is not None and depth == 0:
+            run += literal
+        else:
+            runs.append(run)
+            run = str()
+    runs.append(run)
+
+    literal = max(runs, key=len)
+    return literal if len(literal) >= MIN_LITERAL_LENGTH else None
+
+
+# Classes
+# ------------------------------------------------
+
+class LogMatcher(object):
+    """
+    Searches a log for multiple patterns in one pass.
+
+    Each line is counted only once, for the first matching pattern. The
+    *critical* patterns are tested first.
+
+    :param list patterns:
+        A list with ``(category, severity, regex)`` tuples. The *regex* is
+        matched against single lines.
+
+    :raises ValueError:
+        if a severity is unknown or a regex is invalid.
+
+    .. seealso::
+
+        * :meth:`emsm.core.server.BaseServerWrapper.log_patterns`
+        * :meth:`emsm.core.worlds.WorldWrapper.log_matcher`
+    """
+
+    def __init__(self, patterns):
+        """
+        """
+        for category, severity, regex in patterns:
+            if not severity in SEVERITIES:
+                raise ValueError(
+                    "The severity '{}' of the log pattern '{}' is unknown."\
+                    .format(severity, category)
+                    )
+
+        # The critical patterns come first.
+        self._patterns = sorted(patterns, key=lambda p: p[1] != "critical")
+        self._severities = {
+            category: severity for category, severity, regex in self._patterns
+            }
+
+        # All patterns are combined into one alternation, which is anchored
+        # at the begin of a line. The named groups map a match back to its
+        # pattern.
+        combined = "|".join(
+            ".*?(?P<_{}>{})".format(i, regex) \
+            for i, (category, severity, regex) in enumerate(self._patterns)
+            )
+        try:
+            self._re = re.compile("^(?:{})".format(combined), re.MULTILINE)
+        except re.error as err:
+            raise ValueError("A log pattern is invalid: {}".format(err))
+
+        # The prefilter can only be used, if each pattern requires a
+        # literal.
+        literals = [
+            _required_literal(regex) for category, severity, regex in self._patterns
+            ]
+        if self._patterns and not None in literals:
+            self._literals = sorted(set(literals))
+        else:
+            self._literals = None
+        return None
+
+    def patterns(self):
+        """
+        Returns the list with the ``(category, severity, regex)`` tuples.
+        """
+        return list(self._patterns)
+
+    def severity(self, category):
+        """
+        Returns the severity of the *category*.
+        """
+        return self._severities[category]
+
+    def _candidate_lines(self, text):
+        """
+        Returns the sorted ``(start, end)`` offsets of all lines in *text*,
+        which contain one of the literals.
+        """
+        lines = dict()
+        for literal in self._literals:
+            i = text.find(literal)
+            while i != -1:
+                start = text.rfind("\n", 0, i) + 1
+                end = text.find("\n", i)
+                if end == -1:
+                    end = len(text)
+                lines[start] = end
+                i = text.find(literal, end)
+        return sorted(lines.items())
+
+    def finditer(self, text):
+        """
+        Yields a ``(category, line)`` tuple for each line in *text*, which
+        matches a pattern.
+        """
+        if not self._patterns:
+            return None
+
+        if self._literals is None:
+            for match in self._re.finditer(text):
+                end = text.find("\n", match.start())
+                if end == -1:
+                    end = len(text)
+                category = self._patterns[int(match.lastgroup[1:])][0]
+                yield (category, text[match.start():end])
+        else:
+            for start, end in self._candidate_lines(text):
+                match = self._re.match(text, start, end)
+                if match:
+                    category = self._patterns[int(match.lastgroup[1:])][0]
+                    yield (category, text[start:end])
+        return None
+
+    def scan(self, text):
+        """
+        Searches *text* for all patterns and returns a dictionary, which maps
+        each matched category to a dictionary with the *severity*, the
+        *count* of the matched lines and the first matched *line*:
+
+        .. code-block:: python
+
+            {"error": {"severity": "critical", "count": 2, "line": "..."},
+             "lag": {"severity": "warning", "count": 17, "line": "..."}}
+        """
+        report = dict()
+        for category, line in self.finditer(text):
+            record = report.get(category)
+            if record is None:
+                record = report[category] = {
+                    "severity": self._severities[category],
+                    "count": 0,
+                    "line": line
+                    }
+            record["count"] += 1
+        return report
@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2018 <see AUTHORS.txt>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+This module extracts performance metrics from the server log of a world and
+stores them as time series:
+
+*   **lag_ms**, **lag_ticks**: *"Can't keep up! ... Running 2345ms or 46
+    ticks behind"*
+*   **players**: The number of online players after each join or leave.
+*   **start_duration**: The seconds until the server was ready (*"Done
+    (12.3s)!"*).
+*   **save_duration**: The seconds between *"Saving the game"* and *"Saved
+    the game"*.
+
+Each series is a :class:`RingBuffer`, which is stored in an own file with a
+fixed size. The log is read incrementally: Only the lines appended since the
+last :meth:`LogMetrics.update` are parsed.
+
+Most servers write only the time of day into the log, so the date of a line
+is the date of the most recent occurrence of this time. Lines appended to a
+log, which has been rotated before the next update, are lost. So the metrics
+should be updated regularly, e.g. by cron.
+"""
+
+
+# Modules
+# ------------------------------------------------
+
+# std
+import os
+import re
+import sys
+import json
+import array
+import struct
+import logging
+import datetime
+
+
+# Data
+# ------------------------------------------------
+
+__all__ = [
+    "METRICS",
+    "RingBuffer",
+    "LogMetrics"
+    ]
+
+log = logging.getLogger(__file__)
+
+#: The names of the extracted time series.
+METRICS = (
+    "lag_ms", "lag_ticks", "players", "start_duration", "save_duration"
+    )
+
+#: The default number of ``(time, value)`` pairs kept per time series.
+DEFAULT_CAPACITY = 4096
+
+#: The header of a ring buffer file: magic, capacity and the total number of
+#: appended pairs.
+RING_MAGIC = b"EMSMRNG1"
+RING_HEADER = struct.Struct("<8sQQ")
+
+# Matches the timestamp at the begin of a log line:
+#
+#   [12:00:01] [Server thread/INFO]: ...     (vanilla >= 1.7, forge)
+#   [12:00:01 INFO]: ...                     (spigot)
+#   2013-04-03 12:00:01 [INFO] ...           (vanilla < 1.7, bungeecord)
+LINE_TIME_RE = re.compile(
+    r"^\[?(?:(\d{4})-(\d{2})-(\d{2}) )?(\d{2}):(\d{2}):(\d{2})"
+    )
+
+LAG_RE = re.compile(r"Can't keep up!.*?Running (\d+)ms or (\d+) ticks behind")
+JOIN_RE = re.compile(r": (\S+) joined the game")
+LEAVE_RE = re.compile(r": (\S+) left the game")
+DONE_RE = re.compile(r"Done \((\d+(?:\.\d+)?)s\)!")
+
+
+# Functions
+# ------------------------------------------------
+
+def _line_time(line, now):
+    """
+    Returns the timestamp of the log *line* or ``None``, if the line has no
+    timestamp. If the line contains only the time of day, the most recent
+    occurrence of this time (not after *now*) is returned.
+    """
+    match = LINE_TIME_RE.match(line)
+    if match is None:
+        return None
+
+    year, month, day, hour, minute, second = match.groups()
+    try:
+        if year is not None:
+            date = datetime.datetime(
+                int(year), int(month), int(day),
+                int(hour), int(minute), int(second)
+                )
+        else:
+            today = datetime.datetime.fromtimestamp(now)
+            date = today.replace(
+                hour=int(hour), minute=int(minute), second=int(second),
+                microsecond=0
+                )
+            # Allow a small clock skew between the server and the EMSM.
+            if date > today + datetime.timedelta(minutes=1):
+                date -= datetime.timedelta(days=1)
+    except ValueError:
+        return None
+    return date.timestamp()
+
+
+# Classes
+# ------------------------------------------------
+
+class RingBuffer(object):
+    """
+    A time series of ``(time, value)`` pairs with a fixed *capacity*, which
+    is stored in the file at *path*. When the buffer is full, the oldest
+    pairs are overwritten.
+
+    The pairs are kept in an :class:`array.array` of doubles, which is
+    written as it is (little endian) after a small header.
+    """
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        """
+        """
+        self._path = path
+        self._capacity = capacity
+
+        # The total number of appended pairs. The next pair is written
+        # at the index *total % capacity*.
+        self._total = 0
+        self._data = array.array("d", bytes(16*capacity))
+
+        self.load()
+        return None
+
+    def path(self):
+        """
+        Returns the path of the ring buffer file.
+        """
+        return self._path
+
+    def capacity(self):
+        """
+        Returns the maximum number of pairs in the buffer.
+        """
+        return self._capacity
+
+    def __len__(self):
+        return min(self._total, self._capacity)
+
+    def load(self):
+        """
+        Loads the buffer from :meth:`path`. If the file does not exist or is
+        corrupted, the buffer is empty.
+        """
+        self._total = 0
+        try:
+            with open(self._path, "rb") as file:
+                header = file.read(RING_HEADER.size)
+                data = file.read()
+        except (FileNotFoundError, IOError):
+            return None
+
+        if len(header) != RING_HEADER.size:
+            log.warning("the ring buffer '{}' is corrupted.".format(self._path))
+            return None
+
+        magic, capacity, total = RING_HEADER.unpack(header)
+        if magic != RING_MAGIC or len(data) != 16*capacity:
+            log.warning("the ring buffer '{}' is corrupted.".format(self._path))
+            return None
+
+        stored = array.array("d", data)
+        if sys.byteorder == "big":
+            stored.byteswap()
+
+        # The capacity has changed, so we keep only the newest pairs.
+        if capacity != self._capacity:
+            pairs = RingBuffer._pairs(stored, capacity, total)
+            for pair in pairs[-self._capacity:]:
+                self.append(*pair)
+        else:
+            self._data = stored
+            self._total = total
+        return None
+
+    def save(self):
+        """
+        Writes the buffer atomically into :meth:`path`.
+        """
+        data = array.array("d", self._data)
+        if sys.byteorder == "big":
+            data.byteswap()
+
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(RING_HEADER.pack(RING_MAGIC, self._capacity, self._total))
+            file.write(data.tobytes())
+        os.replace(tmp_path, self._path)
+        return None
+
+    def append(self, time, value):
+        """
+        Appends the pair ``(time, value)`` to the buffer.
+        """
+        i = 2*(self._total % self._capacity)
+        self._data[i] = time
+        self._data[i + 1] = value
+        self._total += 1
+        return None
+
+    @staticmethod
+    def _pairs(data, capacity, total):
+        """
+        Returns the pairs in the ring buffer *data* in chronological order.
+        """
+        count = min(total, capacity)
+        first = (total - count) % capacity
+        return [
+            (data[2*(i % capacity)], data[2*(i % capacity) + 1]) \
+            for i in range(first, first + count)
+            ]
+
+    def pairs(self, since=None):
+        """
+        Returns the ``(time, value)`` pairs in chronological order. If *since*
+        is given, only pairs not older than *since* are returned.
+        """
+        pairs = RingBuffer._pairs(self._data, self._capacity, self._total)
+        if since is not None:
+            pairs = [pair for pair in pairs if pair[0] >= since]
+        return pairs
+
+
+class LogMetrics(object):
+    """
+    Extracts the :data:`METRICS` from the server log of the *world* and
+    stores them in the *directory*.
+
+    .. seealso::
+
+        * :meth:`emsm.core.worlds.WorldWrapper.log_path`
+        * :meth:`emsm.core.server.BaseServerWrapper.log_start_re`
+    """
+
+    def __init__(self, world, directory, capacity=DEFAULT_CAPACITY):
+        """
+        """
+        self._world = world
+        self._directory = directory
+        self._capacity = capacity
+
+        # Maps the name of a metric to its RingBuffer. The buffers are
+        # loaded, when they are first needed.
+        self._series = dict()
+
+        # The log position of the last update and the parser state.
+        self._state = None
+        return None
+
+    def directory(self):
+        """
+        Returns the directory, which contains the time series files.
+        """
+        return self._directory
+
+    def _state_path(self):
+        return os.path.join(self._directory, "state.json")
+
+    def _load_state(self):
+        """
+        Loads the log position and the parser state of the last update.
+        """
+        self._state = {
+            "log_offset": 0, "log_inode": None, "players": list(),
+            "save_start": None
+            }
+        try:
+            with open(self._state_path()) as file:
+                self._state.update(json.load(file))
+        except (FileNotFoundError, IOError, ValueError):
+            pass
+        return None
+
+    def _save_state(self):
+        with open(self._state_path(), "w") as file:
+            json.dump(self._state, file)
+        return None
+
+    def series(self, name):
+        """
+        Returns the :class:`RingBuffer` of the metric *name*.
+        """
+        if name not in self._series:
+            self._series[name] = RingBuffer(
+                os.path.join(self._directory, name + ".ring"), self._capacity
+                )
+        return self._series[name]
+
+    def _read_log(self):
+        """
+        Returns the complete lines, which have been appended to the log since
+        the last update, and updates the stored offset.
+        """
+        try:
+            with open(self._world.log_path(), "rb") as file:
+                stat = os.fstat(file.fileno())
+
+                # The log has been rotated.
+                if stat.st_ino != self._state["log_inode"] \
+                   or stat.st_size < self._state["log_offset"]:
+                    self._state["log_inode"] = stat.st_ino
+                    self._state["log_offset"] = 0
+
+                file.seek(self._state["log_offset"])
+                data = file.read()
+        except (FileNotFoundError, IOError):
+            return str()
+
+        data = data[:data.rfind(b"\n") + 1]
+        self._state["log_offset"] += len(data)
+        return data.decode("utf-8", "replace")
+
+    def _parse_line(self, line, now):
+        """
+        Returns a list with the ``(metric, time, value)`` records in *line*.
+        """
+        start_re = self._world.server().log_start_re()
+        state = self._state
+
+        # Most lines contain no metric, so we check for literals first.
+        records = list()
+        if "Can't keep up!" in line:
+            match = LAG_RE.search(line)
+            time = _line_time(line, now)
+            if match and time is not None:
+                records.append(("lag_ms", time, float(match.group(1))))
+                records.append(("lag_ticks", time, float(match.group(2))))
+        elif "Saving the game" in line:
+            state["save_start"] = _line_time(line, now)
+        elif "Saved the game" in line:
+            time = _line_time(line, now)
+            if time is not None and state["save_start"] is not None:
+                records.append(("save_duration", time, time - state["save_start"]))
+            state["save_start"] = None
+        elif " the game" in line:
+            match = JOIN_RE.search(line) or LEAVE_RE.search(line)
+            time = _line_time(line, now)
+            if match and time is not None:
+                player = match.group(1)
+                if match.re is JOIN_RE and player not in state["players"]:
+                    state["players"].append(player)
+                elif match.re is LEAVE_RE and player in state["players"]:
+                    state["players"].remove(player)
+                records.append(("players", time, len(state["players"])))
+        elif "Done (" in line:
+            match = DONE_RE.search(line)
+            time = _line_time(line, now)
+            if match and time is not None:
+                records.append(("start_duration", time, float(match.group(1))))
+        elif re.match(start_re, line):
+            # The server has been restarted, so nobody is online.
+            state["players"] = list()
+            state["save_start"] = None
+            time = _line_time(line, now)
+            if time is not None:
+                records.append(("players", time, 0))
+        return records
+
+    def update(self, now=None):
+        """
+        Parses the lines, which have been appended to the log since the last
+        update and appends the metrics to the time series. Returns the number
+        of new records.
+        """
+        os.makedirs(self._directory, exist_ok=True)
+        if self._state is None:
+            self._load_state()
+        if now is None:
+            now = datetime.datetime.now().timestamp()
+
+        count = 0
+        changed = set()
+        for line in self._read_log().splitlines():
+            for metric, time, value in self._parse_line(line, now):
+                self.series(metric).append(time, value)
+                changed.add(metric)
+                count += 1
+
+        for metric in changed:
+            self.series(metric).save()
+        self._save_state()
+        return count
+
+    def summary(self, since=None):
+        """
+        Returns a dictionary, which maps the name of each metric to a
+        dictionary with the *count*, *min*, *mean*, *max* and *last* value
+        of the pairs not older than *since*. Metrics without pairs are
+        omitted.
+        """
+        summary = dict()
+        for metric in METRICS:
+            pairs = self.series(metric).pairs(since)
+            if not pairs:
+                continue
+
+            values = [value for time, value in pairs]
+            summary[metric] = {
+                "count": len(pairs),
+                "min": min(values),
+                "mean": sum(values)/len(values),
+                "max": max(values),
+                "last": pairs[-1][1],
+                "last_time": pairs[-1][0]
+                }
+        return summary
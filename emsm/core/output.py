@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2018 <see AUTHORS.txt>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+This module contains the :class:`Output` document, which collects the results
+of the plugins, if the EMSM is invoked with ``--output json``.
+
+Plugins, which support the JSON output, add their results with
+:meth:`Output.add` instead of printing them. The document is serialized once,
+when the EMSM has finished. Everything else, which is printed by the plugins
+(e.g. the progress of *--start* or *--create*), is written to *stderr*, so
+that *stdout* only contains the document:
+
+.. code-block:: bash
+
+    $ minecraft -W --output json worlds --status
+    {"worlds": {"bar": {"status": "offline"}, "foo": {"status": "online"}}}
+"""
+
+
+# Modules
+# ------------------------------------------------
+
+# std
+import sys
+import json
+import logging
+import contextlib
+
+
+# Data
+# ------------------------------------------------
+
+__all__ = [
+    "FORMATS",
+    "Output"
+    ]
+
+log = logging.getLogger(__file__)
+
+#: The available output formats.
+FORMATS = ("console", "json")
+
+
+# Classes
+# ------------------------------------------------
+
+class Output(object):
+    """
+    Collects the results of the plugins and writes them as one document.
+
+    The document is a dictionary, which maps the name of a plugin to a
+    dictionary with the results of each world or server:
+
+    .. code-block:: python
+
+        {"worlds": {"foo": {"status": "online", "pids": [1234]}},
+         "guard": {"foo": {"failed_test": None}}}
+
+    .. seealso::
+
+        * :meth:`emsm.core.application.Application.output`
+    """
+
+    def __init__(self, app):
+        """
+        """
+        self._app = app
+        self._document = dict()
+        return None
+
+    def format(self):
+        """
+        Returns the selected output format (an element of :data:`FORMATS`).
+        """
+        args = self._app.argparser().args()
+        return getattr(args, "output", "console")
+
+    def is_json(self):
+        """
+        Returns ``True``, if the results should be added to the document
+        instead of being printed.
+        """
+        return self.format() == "json"
+
+    def add(self, section, key, data):
+        """
+        Adds the dictionary *data* with the results for *key* (e.g. a world
+        name) to the *section* (e.g. the plugin name). The data is merged with
+        previously added results for *key*.
+        """
+        section = self._document.setdefault(section, dict())
+        section.setdefault(key, dict()).update(data)
+        return None
+
+    def redirect(self):
+        """
+        Returns a context manager, which redirects everything printed to
+        *stdout* to *stderr*, if the JSON output has been selected. So the
+        plain text messages of the plugins do not break the document.
+        """
+        if not self.is_json():
+            return contextlib.ExitStack()
+        return contextlib.redirect_stdout(sys.stderr)
+
+    def document(self):
+        """
+        Returns the collected document.
+        """
+        return self._document
+
+    def write(self, file=None):
+        """
+        Writes the document as JSON to *file* (:data:`sys.stdout` per
+        default), if the JSON output has been selected.
+        """
+        if not self.is_json():
+            return None
+
+        if file is None:
+            file = sys.stdout
+
+        # Dates and other objects, which are not serializable, are written
+        # as strings.
+        json.dump(self._document, file, sort_keys=True, default=str)
+        file.write("\n")
+        return None
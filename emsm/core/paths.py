@@ -111,6 +111,17 @@ class Pathsystem(object):
                     |- minecraft_server.jar
                     |- craftbukkit.jar
                     |- ...
+                |- downloads        # the cached server downloads
+                    |- index.json
+                    |- objects
+                        |- <sha256>
+                        |- ...
+                |- builds           # the workspaces of the server builds
+                    |- spigot
+                        |- m2       # the shared maven repository
+                        |- latest
+                        |- 1.12.2
+                        |- ...
                 |- worlds           # the data of the worlds (minecraft map, ...)
                     |- foo
                         |- server.properties
@@ -155,6 +166,8 @@ class Pathsystem(object):
         make_dir(self.plugins())
         make_dir(self.plugins_data())
         make_dir(self.server())
+        make_dir(self.downloads())
+        make_dir(self.builds())
         make_dir(self.worlds())
         make_dir(self.logs())
         return None
@@ -256,6 +269,27 @@ class Pathsystem(object):
         """
         return os.path.join(self.server(), server_name)
 
+    def downloads(self):
+        """
+        This directory contains the downloaded server software (the server
+        jars, installers and build tools).
+
+        The directory is located in the *instance* folder.
+
+        .. seealso:: :class:`emsm.core.downloads.DownloadCache`
+        """
+        return os.path.join(self._instance_dir, "downloads")
+
+    def builds(self):
+        """
+        This directory contains the persistent workspaces of server software,
+        which is built from source (e.g. Spigot). The workspaces are reused,
+        so that the next build is incremental.
+
+        The directory is located in the *instance* folder.
+        """
+        return os.path.join(self._instance_dir, "builds")
+
     def worlds(self):
         """
         Contains for each world in ``worlds.conf`` one folder that contains
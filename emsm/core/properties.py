@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2018 <see AUTHORS.txt>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+Parses the Java properties files of the worlds (:file:`server.properties`)
+and caches the parsed configuration files until they are modified.
+
+.. code-block:: python
+
+    >>> props = load_properties("/opt/minecraft/worlds/foo/server.properties")
+    >>> props.getint("max-players")
+    20
+    >>> props.getboolean("enable-rcon")
+    False
+"""
+
+
+# Modules
+# ------------------------------------------------
+
+# std
+import os
+import re
+import logging
+import threading
+
+# third party
+import yaml
+
+
+# Data
+# ------------------------------------------------
+
+__all__ = [
+    "Properties",
+    "parse_properties",
+    "FileCache",
+    "load_properties",
+    "load_yaml"
+    ]
+
+log = logging.getLogger(__file__)
+
+# Splits a logical line into the key and the value. The key ends at the
+# first unescaped '=', ':' or whitespace.
+_KEY_VALUE_RE = re.compile(r"((?:\\.|[^\\=:\s])*)\s*[=:]?\s*(.*)", re.DOTALL)
+
+# The escape sequences of the properties format.
+_ESCAPE_RE = re.compile(r"\\(u[0-9a-fA-F]{4}|.)", re.DOTALL)
+
+_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "f": "\f"}
+
+
+# Functions
+# ------------------------------------------------
+
+def _unescape(text):
+    """
+    Replaces the escape sequences in *text*.
+    """
+    def replace(match):
+        char = match.group(1)
+        if char[0] == "u" and len(char) == 5:
+            return chr(int(char[1:], 16))
+        return _ESCAPES.get(char, char)
+    return _ESCAPE_RE.sub(replace, text)
+
+
+def _logical_lines(text):
+    """
+    Yields the logical lines of the properties *text*. Comments and empty
+    lines are skipped, continued lines (ending with an odd number of
+    backslashes) are joined.
+    """
+    line = None
+    for physical in text.splitlines():
+        physical = physical.lstrip()
+        if line is None:
+            if not physical or physical[0] in "#!":
+                continue
+            line = physical
+        else:
+            line = line[:-1] + physical
+
+        trailing = len(line) - len(line.rstrip("\\"))
+        if trailing % 2 == 0:
+            yield line
+            line = None
+
+    if line is not None:
+        yield line[:-1]
+    return None
+
+
+def parse_properties(text):
+    """
+    Parses the Java properties *text* and returns a :class:`Properties`
+    dictionary.
+
+    .. seealso::
+
+        * https://docs.oracle.com/javase/8/docs/api/java/util/Properties.html#load-java.io.Reader-
+    """
+    properties = Properties()
+    for line in _logical_lines(text):
+        key, value = _KEY_VALUE_RE.match(line).groups()
+        properties[_unescape(key)] = _unescape(value)
+    return properties
+
+
+def load_properties(path):
+    """
+    Returns the :class:`Properties` of the file at *path*. The file is only
+    parsed again, if it has been modified.
+
+    :raises OSError:
+        if the file can not be read.
+    """
+    return _properties_cache.load(path)
+
+
+def load_yaml(path):
+    """
+    Returns the parsed YAML file at *path* (e.g. the :file:`config.yml` of
+    BungeeCord). The file is only parsed again, if it has been modified.
+
+    :raises OSError:
+        if the file can not be read.
+    :raises yaml.YAMLError:
+        if the file is not a valid YAML document.
+    """
+    return _yaml_cache.load(path)
+
+
+# Classes
+# ------------------------------------------------
+
+class Properties(dict):
+    """
+    A dictionary with the (unescaped) keys and values of a properties file
+    and some converters similar to :class:`configparser.SectionProxy`.
+
+    The converters return *fallback*, if the key does not exist or the value
+    can not be converted.
+    """
+
+    def getint(self, key, fallback=None):
+        """
+        Returns the value of *key* as int.
+        """
+        try:
+            return int(self[key].strip())
+        except (KeyError, ValueError):
+            return fallback
+
+    def getfloat(self, key, fallback=None):
+        """
+        Returns the value of *key* as float.
+        """
+        try:
+            return float(self[key].strip())
+        except (KeyError, ValueError):
+            return fallback
+
+    def getboolean(self, key, fallback=None):
+        """
+        Returns the value (``true`` or ``false``) of *key* as bool.
+        """
+        value = self.get(key, "").strip().lower()
+        if value == "true":
+            return True
+        elif value == "false":
+            return False
+        return fallback
+
+
+class FileCache(object):
+    """
+    Caches the results of *parse*, which is called with the content of a
+    file, until the file is modified (its mtime, size or inode changes).
+
+    The cached objects are shared, so they must not be modified.
+    """
+
+    def __init__(self, parse):
+        self._parse = parse
+
+        # Maps the path to the stat key and the parsed content.
+        # path => ((mtime, size, inode), content)
+        self._cache = dict()
+        self._lock = threading.Lock()
+        return None
+
+    def load(self, path):
+        """
+        Returns the parsed content of the file at *path*.
+
+        :raises OSError:
+            if the file can not be read.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+        with self._lock:
+            cached = self._cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        with open(path, "r") as file:
+            content = self._parse(file.read())
+
+        with self._lock:
+            self._cache[path] = (key, content)
+        return content
+
+    def clear(self):
+        """
+        Removes all entries from the cache.
+        """
+        with self._lock:
+            self._cache.clear()
+        return None
+
+
+_properties_cache = FileCache(parse_properties)
+_yaml_cache = FileCache(yaml.safe_load)
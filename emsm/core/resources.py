@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2018 <see AUTHORS.txt>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+This module samples the resource usage (CPU, memory, threads, IO) of the
+server processes of the worlds. The data is read directly from :file:`/proc`
+(Linux), so no extra tools are needed.
+
+A world runs in a screen session, which starts the Java VM (usually via a
+shell). So we walk from the screen pid down to the *java* process.
+"""
+
+
+# Modules
+# ------------------------------------------------
+
+# std
+import os
+import time
+import logging
+
+
+# Data
+# ------------------------------------------------
+
+__all__ = [
+    "children",
+    "find_java_pid",
+    "read_process",
+    "sample_worlds",
+    "start_time"
+    ]
+
+log = logging.getLogger(__file__)
+
+PROC_DIR = "/proc"
+
+#: The clock ticks per second (used in :file:`/proc/<pid>/stat`).
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+# Functions
+# ------------------------------------------------
+
+def _read(pid, name):
+    """
+    Returns the content of :file:`/proc/<pid>/<name>` or ``None``, if the
+    file can not be read (the process has gone or we lack the permissions).
+    """
+    try:
+        with open(os.path.join(PROC_DIR, str(pid), name)) as file:
+            return file.read()
+    except (OSError, IOError):
+        return None
+
+
+def _boot_time():
+    """
+    Returns the time of the system boot in seconds since the epoch.
+    """
+    with open(os.path.join(PROC_DIR, "uptime")) as file:
+        uptime = float(file.read().split()[0])
+    return time.time() - uptime
+
+
+def _read_fields(pid, name):
+    """
+    Parses a ``key: value`` file in :file:`/proc/<pid>/` (like *status* or
+    *io*) and returns a dictionary. Values in kB are converted to bytes.
+    """
+    data = _read(pid, name)
+    if data is None:
+        return None
+
+    fields = dict()
+    for line in data.splitlines():
+        key, sep, value = line.partition(":")
+        value = value.split()
+        if not sep or not value or not value[0].isdigit():
+            continue
+        fields[key] = int(value[0])*(1024 if value[1:] == ["kB"] else 1)
+    return fields
+
+
+def _read_stat(pid):
+    """
+    Returns the fields of :file:`/proc/<pid>/stat`, which follow the command
+    name, or ``None``. (The command name may contain spaces, so we split at
+    the last ``)``.)
+    """
+    data = _read(pid, "stat")
+    if data is None:
+        return None
+    comm = data[data.find("(") + 1:data.rfind(")")]
+    return [comm] + data[data.rfind(")") + 2:].split()
+
+
+def children(pid):
+    """
+    Returns the pids of the child processes of *pid*.
+    """
+    # This file is only available, if the kernel has been built with
+    # CONFIG_PROC_CHILDREN.
+    data = _read(pid, os.path.join("task", str(pid), "children"))
+    if data is not None:
+        return [int(child) for child in data.split()]
+
+    pids = list()
+    for name in os.listdir(PROC_DIR):
+        if not name.isdigit():
+            continue
+        stat = _read_stat(name)
+        if stat is not None and stat[2] == str(pid):
+            pids.append(int(name))
+    return pids
+
+
+def find_java_pid(pid):
+    """
+    Returns the pid of the first *java* process in the process tree of
+    *pid*. If there is no such process, the deepest descendant (or *pid*
+    itself) is returned.
+    """
+    queue = [pid]
+    last = pid
+    while queue:
+        current = queue.pop(0)
+        stat = _read_stat(current)
+        if stat is None:
+            continue
+        if stat[0] == "java":
+            return current
+
+        last = current
+        queue.extend(children(current))
+    return last
+
+
+def start_time(pid):
+    """
+    Returns the start of the process *pid* in seconds since the epoch or
+    ``None``, if the process does not exist.
+    """
+    stat = _read_stat(pid)
+    if stat is None:
+        return None
+    return _boot_time() + int(stat[20])/CLK_TCK
+
+
+def read_process(pid):
+    """
+    Returns a dictionary with the resource usage of the process *pid* or
+    ``None``, if the process does not exist:
+
+    *   **cpu_time**: The consumed CPU time (user + system) in seconds.
+    *   **threads**: The number of threads.
+    *   **rss**: The resident memory in bytes.
+    *   **pss**: The proportional set size in bytes (shared pages are
+        divided by the number of processes sharing them).
+    *   **swap**: The swapped out memory in bytes.
+    *   **read_bytes**, **write_bytes**: The bytes read from and written to
+        the storage layer. (``None``, if we lack the permissions.)
+    *   **start_time**: The start of the process in seconds since the epoch.
+    """
+    stat = _read_stat(pid)
+    if stat is None:
+        return None
+
+    status = _read_fields(pid, "status") or dict()
+    smaps = _read_fields(pid, "smaps_rollup") or dict()
+    io = _read_fields(pid, "io") or dict()
+
+    # The index in *stat* is the field number in proc(5) minus 2.
+    return {
+        "pid": pid,
+        "cpu_time": (int(stat[12]) + int(stat[13]))/CLK_TCK,
+        "threads": int(stat[18]),
+        "rss": status.get("VmRSS", smaps.get("Rss", 0)),
+        "pss": smaps.get("Pss"),
+        "swap": status.get("VmSwap", 0),
+        "read_bytes": io.get("read_bytes"),
+        "write_bytes": io.get("write_bytes"),
+        "start_time": _boot_time() + int(stat[20])/CLK_TCK
+        }
+
+
+def sample_worlds(worlds, interval=1):
+    """
+    Samples the resource usage of the server processes of all *worlds* and
+    returns a dictionary, which maps the world names to the
+    :func:`read_process` dictionaries (or ``None``, if the world is
+    offline).
+
+    The CPU usage (**cpu_percent**, 100 is one core) is measured over
+    *interval* seconds. All worlds are measured at the same time.
+    """
+    # The process table is only read once.
+    screen_list = worlds[0].screen_list() if worlds else None
+
+    pids = dict()
+    for world in worlds:
+        screen_pids = world.pids(screen_list)
+        pids[world.name()] = find_java_pid(screen_pids[0]) \
+                             if screen_pids else None
+
+    first = {
+        name: read_process(pid) for name, pid in pids.items() \
+        if pid is not None
+        }
+    start = time.monotonic()
+    time.sleep(interval)
+
+    samples = dict()
+    for name, pid in pids.items():
+        sample = read_process(pid) if first.get(name) else None
+        if sample is None:
+            samples[name] = None
+            continue
+
+        elapsed = time.monotonic() - start
+        sample["cpu_percent"] = \
+            100*(sample["cpu_time"] - first[name]["cpu_time"])/elapsed
+        samples[name] = sample
+    return samples
@@ -28,19 +28,27 @@
 
 # std
 import os
+import json
 import shlex
 import shutil
-import urllib.request
 import logging
 import subprocess
 import re
 import tempfile
+import time
 import glob
+import threading
+import concurrent.futures
 
 # third party
 import blinker
+import filelock
 import yaml
 
+# local
+from . import downloads
+from . import properties
+
 
 # Backward compatibility
 # --------------------------------------------------
@@ -197,6 +205,12 @@ class BaseServerWrapper(object):
         self.__conf = app.conf().server()[self.name()]
         return None
 
+    def app(self):
+        """
+        Returns the parent :class:`~emsm.core.application.Application`.
+        """
+        return self.__app
+
     def directory(self):
         """
         Absolute path to the directory which contains all server software.
@@ -238,6 +252,105 @@ class BaseServerWrapper(object):
             return self.conf().get("url")
         return self.default_url()
 
+    def download(self):
+        """
+        Downloads the :meth:`url` into the download cache and returns the
+        :class:`~emsm.core.downloads.Download`. The file is only transferred
+        again, if it has been changed since the last download.
+
+        If the *sha1* or *sha256* option is set in :meth:`conf`, the download
+        is verified against the hash:
+
+        .. code-block:: ini
+
+            [vanilla 1.12]
+            url = https://launcher.mojang.com/.../server.jar
+            sha1 = 886945bfb2b978778c3a0288fd7fab09d315b25f
+
+        :raises ServerInstallationFailure:
+            if the download failed or the hash does not match.
+
+        .. seealso::
+
+            * :meth:`emsm.core.downloads.DownloadCache.fetch`
+        """
+        try:
+            return self.__app.server().download_cache().fetch(
+                self.url(),
+                sha1 = self.conf().get("sha1"),
+                sha256 = self.conf().get("sha256")
+                )
+        except downloads.DownloadError as err:
+            raise ServerInstallationFailure(self, err) from err
+
+    def _artifact_path(self):
+        """
+        Returns the path of the file, which records the download installed
+        in :meth:`directory`.
+        """
+        return os.path.join(self.directory(), ".emsm_artifact.json")
+
+    def artifact(self):
+        """
+        Returns the record (*url*, *sha1*, *sha256*) of the download, which
+        has been installed, or ``None``, if it is not known (e.g. because the
+        server has been built from source).
+
+        .. seealso::
+
+            * :meth:`set_artifact`
+        """
+        try:
+            with open(self._artifact_path()) as file:
+                return json.load(file)
+        except (OSError, IOError, ValueError) as err:
+            return None
+
+    def set_artifact(self, download):
+        """
+        Records the :class:`~emsm.core.downloads.Download` *download* as
+        installed artifact. This method should be called by :meth:`install`
+        after the installation succeeded.
+        """
+        with open(self._artifact_path(), "w") as file:
+            json.dump({
+                "url": download.url,
+                "sha1": download.sha1,
+                "sha256": download.sha256
+                }, file)
+        return None
+
+    def is_up_to_date(self):
+        """
+        Returns ``True``, if the installed server is identical to the
+        latest download. In this case, a :meth:`reinstall` is useless.
+
+        The download is cached, so a following :meth:`reinstall` does not
+        transfer it again.
+
+        :raises ServerInstallationFailure:
+            if the download failed.
+        """
+        artifact = self.artifact()
+        if artifact is None or artifact.get("url") != self.url():
+            return False
+
+        download = self.download()
+        return download.sha256 == artifact.get("sha256")
+
+    @classmethod
+    def builds_from_source(cls):
+        """
+        Returns ``True``, if :meth:`install` runs a CPU intensive build or
+        installer and not only a download. The number of these installations,
+        which run at the same time, is limited.
+
+        .. seealso::
+
+            * :meth:`ServerManager.install_all`
+        """
+        return False
+
     def is_installed(self):
         """
         ``True`` if the executable has been downloaded and exists, otherwise
@@ -253,10 +366,9 @@ class BaseServerWrapper(object):
         Returns ``True`` if at least one world is currently running with
         this server.
         """
-        worlds = self.__app.worlds().get_by_pred(
-            lambda w: w.server() is self and w.is_online()
-            )
-        return bool(worlds)
+        worlds = self.__app.worlds().get_by_pred(lambda w: w.server() is self)
+        status = self.__app.worlds().status_all(worlds)
+        return any(record["online"] for record in status.values())
 
     def install(self):
         """
@@ -282,35 +394,102 @@ class BaseServerWrapper(object):
             * when the installation failed.
         :raises ServerIsOnlineError:
             * when a world powered by this server software is online.
+
+        .. seealso::
+
+            * :meth:`stage_install`
+            * :meth:`switch_install`
         """
         if self.is_online():
             raise ServerIsOnlineError(self)
 
-        # Save the old directory in a temporary folder, so that we can restore
-        # it if something fails.
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            tmp_server_path = shutil.move(self.directory(), tmp_dir)
+        staging_dir = self.stage_install()
+        try:
+            old_dir = self.switch_install(staging_dir)
+        except:
+            self.discard_install(staging_dir)
+            raise
+        self.discard_install(old_dir)
+        return None
 
-            # is_installed() returns now False.
-            assert not self.is_installed()
+    def stage_install(self):
+        """
+        Installs the server into a new, versioned directory next to
+        :meth:`directory` and returns its path. The current installation is
+        not touched, so the worlds can keep running while the new version
+        is downloaded or built.
 
-            # So we can call install() again.
-            try:
-                self.install()
-            except:
-                # Clean up the installation target directory self.directory()
-                # and move the old server path back.
-                if os.path.exists(self.directory()):
-                    if os.path.isdir(self.directory()):
-                        shutil.rmtree(self.directory())
-                    else:
-                        # This is a relict of version 3, when not all server
-                        # created a directory in ``server/``.
-                        os.remove(self.directory())
-                shutil.move(tmp_server_path, self.directory())
-
-                # Reraise the original exception.
-                raise
+        The new installation is activated with :meth:`switch_install` or
+        removed with :meth:`discard_install`.
+
+        :raises ServerInstallationFailure:
+            * when the installation failed. The new directory has already
+              been removed in this case.
+        """
+        parent = os.path.dirname(os.path.normpath(self.__directory))
+        staging_dir = tempfile.mkdtemp(
+            dir = parent,
+            prefix = ".{}-{}-".format(self.name(), time.strftime("%Y%m%d%H%M%S"))
+            )
+
+        # install() installs the server into directory().
+        directory = self.__directory
+        self.__directory = staging_dir
+        try:
+            self.install()
+        except:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        finally:
+            self.__directory = directory
+        return staging_dir
+
+    def switch_install(self, staging_dir):
+        """
+        Activates the installation in *staging_dir* (see
+        :meth:`stage_install`). :meth:`directory` becomes a symbolic link to
+        *staging_dir*, which is replaced atomically. Worlds, which are
+        started afterwards, use the new version.
+
+        Returns the path of the previous installation or ``None``. It should
+        be removed with :meth:`discard_install`, when no world uses it
+        anymore.
+
+        .. note::
+
+            Older EMSM versions installed the server directly into
+            :meth:`directory`. This directory is renamed, before the link is
+            created, so only the first switch is not atomic.
+        """
+        directory = os.path.normpath(self.__directory)
+        parent = os.path.dirname(directory)
+
+        if os.path.islink(directory):
+            old_dir = os.path.realpath(directory)
+        elif os.path.exists(directory):
+            old_dir = tempfile.mkdtemp(
+                dir = parent, prefix = ".{}-old-".format(self.name())
+                )
+            os.replace(directory, old_dir)
+        else:
+            old_dir = None
+
+        # The link is relative, so that the instance folder can be moved.
+        tmp_link = staging_dir + ".link"
+        os.symlink(os.path.basename(staging_dir), tmp_link)
+        os.replace(tmp_link, directory)
+        log.info("switched the server '{}' to '{}'."\
+                 .format(self.name(), staging_dir))
+        return old_dir
+
+    def discard_install(self, path):
+        """
+        Removes the installation at *path*, which has been returned by
+        :meth:`stage_install` or :meth:`switch_install`. If *path* is
+        ``None``, nothing happens.
+        """
+        if path is not None:
+            shutil.rmtree(path, ignore_errors=True)
         return None
 
     def default_start_cmd(self):
@@ -403,6 +582,52 @@ class BaseServerWrapper(object):
         """
         raise NotImplementedError()
 
+    def log_patterns(self):
+        """
+        Returns a list with the default ``(category, severity, regex)`` tuples
+        for the :class:`~emsm.core.logs.LogMatcher` of a world:
+
+        *   **error** (critical): :meth:`log_error_re`
+        *   **oom** (critical): The JVM ran out of memory.
+        *   **lag** (warning): The server can't keep up with the game ticks.
+
+        .. seealso::
+
+            * :meth:`emsm.core.worlds.WorldWrapper.log_matcher`
+        """
+        return [
+            ("error", "critical", self.log_error_re().pattern),
+            ("oom", "critical", r"java\.lang\.OutOfMemoryError"),
+            ("lag", "warning", r"Can't keep up!")
+            ]
+
+    def _properties_address(self, world):
+        """
+        Returns the address (ip, port) configured in the
+        :file:`server.properties` file of the *world*. This is the
+        implementation of :meth:`world_address` for all servers using this
+        file.
+
+        .. seealso::
+
+            * :meth:`emsm.core.worlds.WorldWrapper.properties`
+        """
+        conf_path = os.path.join(world.directory(), "server.properties")
+        try:
+            conf = properties.load_properties(conf_path)
+        except (OSError, IOError) as err:
+            return (None, None)
+
+        # If there is a syntax error in the configuration, we will ignore
+        # the value and return None instead.
+        port = conf.get("server-port", "").strip()
+        port = int(port) if re.fullmatch(r"\d{1,5}", port) else None
+
+        ip = conf.get("server-ip", "").strip()
+        if not re.fullmatch(r"\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}", ip):
+            ip = "localhost"
+        return (ip, port)
+
     def world_address(self, world):
         """
         **ABSTRACT**
@@ -444,38 +669,15 @@ class VanillaBase(BaseServerWrapper):
 
         # Simply download the minecraft jar from mojang and copy the .jar in
         # the EMSM_ROOT/server directory.
-        try:
-            tmp_path, http_resp = urllib.request.urlretrieve(self.url())
-        except Exception as err:
-            raise ServerInstallationFailure(self, err)
-        else:
-            shutil.move(tmp_path, self.exe_path())
+        download = self.download()
+        download.copy(self.exe_path())
+        self.set_artifact(download)
         return None
 
     def world_address(self, world):
         """
         """
-        # Read the server.properties file in the world's directory.
-        conf_path = os.path.join(world.directory(), "server.properties")
-        try:
-            with open(conf_path, "r") as file:
-                conf = file.read()
-        except (OSError, IOError) as err:
-            port = None
-            ip = None
-        else:
-            # Retrieve the values for *server-port* and *server-ip*.
-            # Note, that we use the '^' and '$' chars, so that we only match
-            # valid lines. If there is a syntax error in the configuration,
-            # we will ignore the value and return None instead.
-            port_re = "^server-port\s*=\s*([\d]{1,5})\s*$"
-            port = re.findall(port_re, conf, re.MULTILINE)
-            port = int(port[0]) if port else None
-
-            ip_re = "^server-ip\s*=\s*(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\s*$"
-            ip = re.findall(ip_re, conf, re.MULTILINE)
-            ip = ip[0] if ip else "localhost"
-        return (ip, port)
+        return self._properties_address(world)
 
 
 class Vanilla_1_2(VanillaBase):
@@ -775,6 +977,10 @@ class MinecraftForgeBase(BaseServerWrapper):
         * check if :meth:`log_error_re` is correct implemented.
     """
 
+    @classmethod
+    def builds_from_source(cls):
+        return True
+
     def translate_command(self, cmd):
         return cmd
 
@@ -786,48 +992,43 @@ class MinecraftForgeBase(BaseServerWrapper):
 
         try:
             # We need to download the *installer* first.
+            download = self.download()
+
+            # Now, we have to run the installer.
+
+            # Clear the server directory.
+            shutil.rmtree(self.directory())
+            if not os.path.exists(self.directory()):
+                os.makedirs(self.directory())
+
+            # The installer runs in the server directory. (We don't chdir,
+            # because other servers may be installed at the same time.)
+            sys_install_cmd = ["java", "-jar", download.path, "--installServer"]
             try:
-                tmp_path, http_resp = urllib.request.urlretrieve(self.url())
-            except Exception as err:
-                raise ServerInstallationFailure(self, err) from err
-            else:
-                # Now, we have to run the installer.
+                p = subprocess.Popen(
+                    sys_install_cmd,
+                    cwd = self.directory(),
+                    stdout = subprocess.PIPE,
+                    stderr = subprocess.PIPE
+                    )
 
-                # Clear the server directory.
-                shutil.rmtree(self.directory())
-                if not os.path.exists(self.directory()):
-                    os.makedirs(self.directory())
+                # Store the output of the installer in the logfiles.
+                out, err = p.communicate()
+                out = out.decode()
+                err = err.decode()
+                log.info(out)
+                log.warning(err)
 
-                os.chdir(self.directory())
-                if not os.path.samefile(self.directory(), os.curdir):
-                    msg = "Could not chdir to {}".format(self.directory())
+                # Check, if the installer exited with return code 0 and
+                # throw an exception if not.
+                if p.returncode:
+                    msg = "Installer returned with '{}'."\
+                          .format(p.returncode)
                     raise ServerInstallationFailure(self, msg)
+            except Exception as err:
+                raise ServerInstallationFailure(self, err) from err
 
-                sys_install_cmd = "java -jar {} --installServer"\
-                                      .format(tmp_path)
-                sys_install_cmd = shlex.split(sys_install_cmd)
-                try:
-                    p = subprocess.Popen(
-                        sys_install_cmd,
-                        stdout = subprocess.PIPE,
-                        stderr = subprocess.PIPE
-                        )
-
-                    # Store the output of the installer in the logfiles.
-                    out, err = p.communicate()
-                    out = out.decode()
-                    err = err.decode()
-                    log.info(out)
-                    log.warning(err)
-
-                    # Check, if the installer exited with return code 0 and
-                    # throw an exception if not.
-                    if p.returncode:
-                        msg = "Installer returned with '{}'."\
-                              .format(p.returncode)
-                        raise ServerInstallationFailure(self, msg)
-                except Exception as err:
-                    raise ServerInstallationFailure(self, err) from err
+            self.set_artifact(download)
         except:
             # Try to undo the installation.
             if os.path.exists(self.directory()):
@@ -973,12 +1174,9 @@ class BungeeCordServerWrapper(BaseServerWrapper):
 
         # Simply download the latest build and save it in the EMSM_ROOT/server
         # directory.
-        try:
-            tmp_path, http_resp = urllib.request.urlretrieve(self.url())
-        except Exception as err:
-            raise ServerInstallationFailure(err) from err
-        else:
-            shutil.move(tmp_path, self.exe_path())
+        download = self.download()
+        download.copy(self.exe_path())
+        self.set_artifact(download)
         return None
 
     def default_start_cmd(self):
@@ -1008,9 +1206,8 @@ class BungeeCordServerWrapper(BaseServerWrapper):
         # Note that it may not exist, not readable or parseable.
         conf_path = os.path.join(world.directory(), "config.yml")
         try:
-            with open(conf_path) as file:
-                conf = yaml.load(file)
-        except (OSError, IOError) as err:
+            conf = properties.load_yaml(conf_path)
+        except (OSError, IOError, yaml.YAMLError) as err:
             ip, port = (None, None)
         else:
             # Try to extract the ip and port.
@@ -1054,13 +1251,23 @@ class SpigotBase(BaseServerWrapper):
     def name(cls):
         return "spigot {}".format(cls.revision())
 
+    @classmethod
+    def builds_from_source(cls):
+        return True
+
     def default_url(self):
         return "https://hub.spigotmc.org/jenkins/job/BuildTools/lastSuccessfulBuild/artifact/target/BuildTools.jar"
 
     def build_dir(self):
         """
+        Returns the persistent workspace of the build tools. It is reused by
+        the next build of this revision, so that the repositories are only
+        updated and not cloned again. Each revision has its own workspace, so
+        that different revisions can be built at the same time.
+
         You can specify a build directory in the :file:`server.conf`. If not
-        specified, we will use a temporary directory:
+        specified, :file:`builds/spigot/<revision>` in the instance folder is
+        used:
 
         .. code-block:: ini
 
@@ -1071,42 +1278,57 @@ class SpigotBase(BaseServerWrapper):
             tmp = self.conf().get("build_dir")
             tmp = os.path.expanduser(tmp)
             tmp = os.path.abspath(tmp)
-            return tmp
-        return tempfile.mkdtemp(prefix='spigotmc')
+        else:
+            tmp = os.path.join(
+                self.app().paths().builds(), "spigot", self.revision()
+                )
+        os.makedirs(tmp, exist_ok=True)
+        return tmp
+
+    def maven_repo(self):
+        """
+        Returns the local maven repository, which is shared by the builds of
+        all revisions.
+        """
+        return os.path.join(self.app().paths().builds(), "spigot", "m2")
 
     def install(self):
         if self.is_installed():
             return None
 
-        # Download and build in /tmp
         build_dir = self.build_dir()
 
         log.info("Installing spigot ...")
         log.info("- Building in '{}' ...".format(build_dir))
-        try:
-            # Download the build tools.
-            try:
-                buildtools, http_resp = urllib.request.urlretrieve(
-                    self.url(), os.path.join(build_dir, "BuildTools.jar")
-                    )
-            except Exception as err:
-                raise ServerInstallationFailure(self, err) from err
 
-            log.info("- BuildTools: '{}' ...".format(buildtools))
+        # The BuildTools.jar is kept in the download cache.
+        buildtools = self.download().path
+        log.info("- BuildTools: '{}' ...".format(buildtools))
+
+        env = dict(os.environ)
+        env["MAVEN_OPTS"] = "{} -Dmaven.repo.local={}".format(
+            env.get("MAVEN_OPTS", ""), self.maven_repo()
+            ).strip()
 
-            # Run the BuildTools.jar file.
+        # Only one build may use the workspace at the same time.
+        with filelock.FileLock(os.path.join(build_dir, ".emsm.lock")):
+            build_start = time.time()
+
+            # Run the BuildTools.jar file and stream its output into the
+            # log.
             with subprocess.Popen(
                 ["java", "-jar", buildtools, "--rev", self.revision()],
                 cwd = build_dir,
+                env = env,
                 stdout = subprocess.PIPE,
-                stderr = subprocess.PIPE
+                stderr = subprocess.STDOUT
             ) as proc:
-                # Store the output of the installer in the logfiles.
-                out, err = proc.communicate()
-                out = out.decode()
-                err = err.decode()
-                log.info(out)
-                log.error(err)
+                # The output is decoded line by line, since Popen only
+                # accepts an *errors* argument since Python 3.6.
+                for line in proc.stdout:
+                    line = line.decode("utf-8", errors="replace")
+                    log.info("[{}] {}".format(self.name(), line.rstrip()))
+                proc.wait()
 
                 # Check, if the installer exited with return code 0 and
                 # throw an exception if not.
@@ -1115,22 +1337,21 @@ class SpigotBase(BaseServerWrapper):
                           .format(proc.returncode)
                     raise ServerInstallationFailure(self, msg)
 
-            # Move the built files to *exe_path()*.
+            # Move the built file to *exe_path()*. The workspace may contain
+            # the jars of older builds, so we take the newest one.
             jarfiles = glob.glob(
                 os.path.join(build_dir, "Spigot/Spigot-Server/target/spigot-*.jar")
-                )
-            if len(jarfiles) > 0:
-                jarfile = jarfiles[0]
-                shutil.move(jarfile, self.exe_path())
-            else:
+                ) + glob.glob(os.path.join(build_dir, "spigot-*.jar"))
+            jarfiles = [
+                jarfile for jarfile in jarfiles \
+                if os.path.getmtime(jarfile) >= build_start - 1
+                ]
+            if not jarfiles:
                 msg = "Could not find built spigot-*.jar file."
                 raise ServerInstallationFailure(self, msg)
 
-        finally:
-            # Remove the build directory, if it's only a temporary dir.
-            if "build_dir" not in self.conf():
-                log.info("- Removing build directory {}".format(build_dir))
-                shutil.rmtree(build_dir)
+            jarfile = max(jarfiles, key=os.path.getmtime)
+            shutil.move(jarfile, self.exe_path())
         return None
 
     def exe_path(self):
@@ -1157,27 +1378,7 @@ class SpigotBase(BaseServerWrapper):
     def world_address(self, world):
         """
         """
-        # Read the server.properties file in the world's directory.
-        conf_path = os.path.join(world.directory(), "server.properties")
-        try:
-            with open(conf_path, "r") as file:
-                conf = file.read()
-        except (OSError, IOError) as err:
-            port = None
-            ip = None
-        else:
-            # Retrieve the values for *server-port* and *server-ip*.
-            # Note, that we use the '^' and '$' chars, so that we only match
-            # valid lines. If there is a syntax error in the configuration,
-            # we will ignore the value and return None instead.
-            port_re = "^server-port\s*=\s*([\d]{1,5})\s*$"
-            port = re.findall(port_re, conf, re.MULTILINE)
-            port = int(port[0]) if port else None
-
-            ip_re = "^server-ip\s*=\s*(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\s*$"
-            ip = re.findall(ip_re, conf, re.MULTILINE)
-            ip = ip[0] if ip else "localhost"
-        return (ip, port)
+        return self._properties_address(world)
 
 
 class Spigot(SpigotBase):
@@ -1255,8 +1456,21 @@ class ServerManager(object):
         # Maps *server.name()* to *server*
         self._server = dict()
         self.__add_emsm_wrapper()
+
+        self._download_cache = downloads.DownloadCache(app.paths().downloads())
+
+        # Maps *server.name()* to the result of the installation in
+        # *install_all()*.
+        self._install_report = dict()
         return None
 
+    def download_cache(self):
+        """
+        Returns the :class:`~emsm.core.downloads.DownloadCache`, which is
+        shared by all server wrappers.
+        """
+        return self._download_cache
+
     def __add_emsm_wrapper(self):
         """
         Loads all default EMSM server wrappers. These are all server wrappers
@@ -1366,3 +1580,70 @@ class ServerManager(object):
         Returns a list with the names of all server.
         """
         return list(self._server.keys())
+
+    # installation
+    # --------------------------------------------
+
+    def install_all(self, server, max_builds=None):
+        """
+        Installs all *server*, which are not installed yet, at the same time.
+        Downloads run concurrently, while at most *max_builds* server, which
+        :meth:`~BaseServerWrapper.builds_from_source`, are built at the same
+        time. *max_builds* defaults to the *max_parallel_builds* option in
+        the :file:`main.conf` or to half the number of CPUs.
+
+        Returns a dictionary, which maps the name of each server to a
+        dictionary with the *seconds* the installation took and the *error*
+        (``None``, if the installation succeeded). The failed installations
+        are not retried by the :class:`~emsm.core.worlds.WorldWrapper`, which
+        raises the recorded *error* instead.
+
+        .. seealso::
+
+            * :meth:`install_report`
+        """
+        server = [s for s in server if not s.is_installed()]
+        if not server:
+            return dict()
+
+        if max_builds is None:
+            max_builds = self._app.conf().main()["emsm"]\
+                         .getint("max_parallel_builds", 0)
+        if max_builds <= 0:
+            max_builds = max((os.cpu_count() or 2)//2, 1)
+        build_slots = threading.BoundedSemaphore(max_builds)
+
+        def install(s):
+            start = time.monotonic()
+            error = None
+            try:
+                if s.builds_from_source():
+                    # The download (e.g. of the installer or build tools) is
+                    # cached, so it does not need to wait for a build slot.
+                    s.download()
+                    with build_slots:
+                        s.install()
+                else:
+                    s.install()
+            except Exception as err:
+                log.exception(err)
+                error = err
+            return {"seconds": time.monotonic() - start, "error": error}
+
+        log.info("installing the server {} ...".format(
+            ", ".join(s.name() for s in server)
+            ))
+        with concurrent.futures.ThreadPoolExecutor(len(server)) as executor:
+            results = dict(zip(
+                [s.name() for s in server], executor.map(install, server)
+                ))
+
+        self._install_report.update(results)
+        return results
+
+    def install_report(self):
+        """
+        Returns the results of all :meth:`install_all` calls of this
+        application.
+        """
+        return dict(self._install_report)
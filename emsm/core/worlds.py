@@ -44,6 +44,13 @@ import io
 # third party
 import blinker
 
+# local
+from . import copy_
+from . import properties
+from . import resources
+from .logs import LogMatcher
+from .metrics import DONE_RE
+
 
 # Backward compatibility
 # ------------------------------------------------
@@ -98,6 +105,16 @@ log = logging.getLogger(__file__)
 
 _SCREEN = shlex.which("screen")
 
+#: These files are not copied, when a world is cloned.
+CLONE_IGNORE_PATTERNS = ["session.lock", "*.lck"]
+
+#: Matches the log line, which is printed when *save-all* has been completed.
+SAVE_DONE_RE = re.compile(r"Saved the game|Save complete")
+
+#: The properties in the :file:`server.properties` file, whose port is
+#: changed to a free one, when a world is cloned.
+CLONE_PORT_PROPERTIES = ["server-port", "query.port", "rcon.port"]
+
 
 # Exceptions
 # ------------------------------------------------
@@ -194,6 +211,41 @@ class WorldCommandTimeout(WorldError):
         return temp
 
 
+# Functions
+# ------------------------------------------------
+
+def _clone_file(src, dst):
+    """
+    Copies the file *src* of a world, which is cloned, to *dst*.
+
+    The minecraft server modifies the region files in place, so the clone
+    must not share them with the original world. Where the file system
+    supports reflinks (btrfs, xfs, ...), copy_file() creates copy-on-write
+    clones, which cost no disk space until one of the worlds modifies them.
+    Only the rotated (compressed) logs are never modified again, so they
+    are hardlinked.
+    """
+    if src.endswith(".gz"):
+        copy_.link_or_copy_file(src, dst)
+    else:
+        copy_.copy_file(src, dst)
+    return None
+
+
+def _port_is_free(port):
+    """
+    Returns ``True``, if no process on this host listens on the TCP *port*.
+    """
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        s.bind(("", port))
+    except OSError:
+        return False
+    finally:
+        s.close()
+    return True
+
+
 # Classes
 # ------------------------------------------------
 
@@ -214,6 +266,10 @@ class WorldWrapper(object):
     #: Signal, that is emitted when a world has been uninstalled.
     world_uninstalled = blinker.signal("world_uninstalled")
 
+    #: Signal, that is emitted when a world has been cloned. The new
+    #: world is passed as *clone* argument.
+    world_cloned = blinker.signal("world_cloned")
+
     #: Signal, that is emitted when a world is about to start.
     world_about_to_start = blinker.signal("world_about_to_start")
 
@@ -253,10 +309,23 @@ class WorldWrapper(object):
         # The ServerWrapper for the server that powers this world.
         self._server = app.server().get(self._conf["server"])
         if not self._server.is_installed():
+            # An installation, which already failed in
+            # :meth:`~emsm.core.server.ServerManager.install_all`, is not
+            # retried for every world.
+            report = app.server().install_report().get(self._server.name())
+            if report is not None and report["error"] is not None:
+                raise report["error"]
             self._server.install()
 
         # The directory that contains the world data.
         self._directory = app.paths().world(name)
+
+        # The LogMatcher is compiled, when it is first needed.
+        self._log_matcher = None
+
+        # The (inode, size) of the log file, before the world has been
+        # started by :meth:`start`. Used by :meth:`is_ready`.
+        self._start_log_position = None
         return None
 
     def _check_conf(self):
@@ -349,6 +418,7 @@ class WorldWrapper(object):
 
         self._server = server
         self._conf["server"] = server.name()
+        self._log_matcher = None
 
         log.info("assigned '{}' server to the world '{}'."\
                  .format(server.name(), self._name)
@@ -389,6 +459,43 @@ class WorldWrapper(object):
         """
         return self._server.world_address(self)
 
+    def properties(self):
+        """
+        Returns the :class:`~emsm.core.properties.Properties` of the
+        world's :file:`server.properties` file, e.g. to read the
+        *max-players*, *view-distance* or RCON settings. The file is only
+        parsed again, if it has been modified. If it does not exist or
+        can not be read, an empty dictionary is returned.
+
+        The returned dictionary is shared and must not be modified.
+
+        .. code-block:: python
+
+            >>> world.properties().getint("max-players", 20)
+            20
+
+        .. seealso::
+
+            * :func:`emsm.core.properties.load_properties`
+        """
+        path = os.path.join(self._directory, "server.properties")
+        try:
+            return properties.load_properties(path)
+        except (OSError, IOError):
+            return properties.Properties()
+
+    def log_path(self):
+        """
+        Returns the absolute path of the server log file of the world.
+
+        .. seealso::
+
+            * :meth:`emsm.core.server.BaseServerWrapper.log_path`
+        """
+        return os.path.abspath(
+            os.path.join(self._directory, self._server.log_path())
+            )
+
     def latest_log(self):
         """
         Returns the log of the world since the last start. If the
@@ -397,9 +504,7 @@ class WorldWrapper(object):
         # Matches all lines in the log, that signalize the start of
         # a server.
         re_start_line = self._server.log_start_re()
-        log_path = os.path.abspath(
-            os.path.join(self._directory, self._server.log_path())
-            )
+        log_path = self.log_path()
 
         try:
             last_log = io.StringIO()
@@ -413,15 +518,87 @@ class WorldWrapper(object):
             last_log = str()
         return last_log
 
-    def pids(self):
+    def log_matcher(self):
         """
-        Returns a list with the pids of the screen sessions with the name
-        :meth:`screen_name`.
+        Returns the :class:`~emsm.core.logs.LogMatcher` for the server log of
+        this world.
+
+        The default patterns of the server can be overridden and extended in
+        the ``[log_patterns]`` section of the world configuration. Each
+        option is a category and its value is the severity followed by the
+        regex. An empty value disables the category:
+
+        .. code-block:: ini
+
+            # morpheus.world.conf
+            [log_patterns]
+            lag =
+            chunk = warning Chunk file at .* is in the wrong location
+
+        :raises ValueError:
+            if a pattern in the configuration is invalid.
+
+        .. seealso::
+
+            * :meth:`emsm.core.server.BaseServerWrapper.log_patterns`
+        """
+        if self._log_matcher is not None:
+            return self._log_matcher
+
+        patterns = collections.OrderedDict(
+            (category, (severity, regex)) \
+            for category, severity, regex in self._server.log_patterns()
+            )
+
+        # The regexes may contain "$", so we don't interpolate them.
+        if self._world_conf.has_section("log_patterns"):
+            for category in self._world_conf.options("log_patterns"):
+                value = self._world_conf.get(
+                    "log_patterns", category, raw=True
+                    ).strip()
+                if not value:
+                    patterns.pop(category, None)
+                    continue
+
+                severity, sep, regex = value.partition(" ")
+                if not regex.strip():
+                    raise ValueError("{} - conf:log_patterns:{} is not a "\
+                                     "'severity regex' pair"\
+                                     .format(self._name, category))
+                patterns[category] = (severity, regex.strip())
+
+        self._log_matcher = LogMatcher([
+            (category, severity, regex) \
+            for category, (severity, regex) in patterns.items()
+            ])
+        return self._log_matcher
+
+    @staticmethod
+    def screen_list():
+        """
+        Returns the output of ``screen -ls``.
+
+        .. seealso::
+
+            * :meth:`pids`
+            * :meth:`WorldManager.status_all`
         """
-        # Get sessions
         # XXX: screen -ls seems to exit always with the exit code 1.
         #   so it's convenient to use gestatusoutput.
         status, output = subprocess.getstatusoutput("screen -ls")
+        return output
+
+    def pids(self, screen_list=None):
+        """
+        Returns a list with the pids of the screen sessions with the name
+        :meth:`screen_name`.
+
+        If *screen_list* is given, the pids are parsed from this output of
+        :meth:`screen_list` instead of calling ``screen -ls`` again.
+        """
+        # Get sessions
+        output = screen_list if screen_list is not None \
+                 else self.screen_list()
 
         # Example output (without the '>' char):
         #
@@ -486,13 +663,17 @@ class WorldWrapper(object):
         return None
 
     def send_command_get_output(self, server_cmd, timeout=10,
-                                poll_intervall=0.2):
+                                poll_intervall=0.2, until=None):
         """
         Like :meth:`send_commmand` but checks every *poll_intervall*
         seconds, if content has been added to the logfile and returns the
         change. If no change could be detected after *timeout* seconds,
         an error will be raised.
 
+        If the compiled regular expression *until* is given, the logfile is
+        polled until the added content matches it, e.g. until the server
+        reports that a command has been completed.
+
         :raises WorldIsOfflineError:
             if the world is offline.
         :raises WorldCommandTimeout:
@@ -516,7 +697,12 @@ class WorldWrapper(object):
         # Parse the logfile for a change.
         start_time = time.time()
         output = str()
-        while (not output) and time.time() - start_time < timeout:
+        def done():
+            if until is None:
+                return bool(output)
+            return until.search(output) is not None
+
+        while (not done()) and time.time() - start_time < timeout:
             time.sleep(poll_intervall)
 
             try:
@@ -526,7 +712,7 @@ class WorldWrapper(object):
             except (FileNotFoundError, IOError):
                 break
 
-        if not output:
+        if not done():
             raise WorldCommandTimeout(self)
         return output
 
@@ -620,6 +806,151 @@ class WorldWrapper(object):
         WorldWrapper.world_uninstalled.send(self)
         return None
 
+    def clone(self, name):
+        """
+        Creates a copy of this world with the name *name* and returns the
+        :class:`WorldWrapper` of the new world.
+
+        The new world gets a copy of the world directory and of the
+        configuration file :file:`name.world.conf`. If the world is online,
+        the auto-save is disabled while the files are copied, so that the
+        copy is consistent. The ports in the :file:`server.properties` of
+        the copy are changed to free ports.
+
+        :raises ValueError:
+            if the *name* is invalid or a world with this name already
+            exists.
+
+        .. seealso::
+
+            * :func:`_clone_file`
+        """
+        if not name or os.sep in name or name.startswith(("_", ".")):
+            raise ValueError("'{}' is not a valid world name.".format(name))
+
+        directory = self._app.paths().world(name)
+        if self._app.conf().world(name) is not None \
+           or os.path.exists(directory):
+            raise ValueError("The world '{}' already exists.".format(name))
+
+        # The world is copied into a hidden directory first, so that a
+        # failed copy does not leave a half cloned world.
+        tmp_dir = os.path.join(
+            os.path.dirname(directory), ".{}.clone".format(name)
+            )
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+
+        was_online = self.is_online()
+        try:
+            if was_online:
+                self.send_command("save-off")
+                try:
+                    self.send_command_get_output(
+                        "save-all", timeout=30, until=SAVE_DONE_RE
+                        )
+                except WorldCommandTimeout:
+                    pass
+
+            copy_.copytree(
+                self._directory, tmp_dir,
+                ignore = shutil.ignore_patterns(*CLONE_IGNORE_PATTERNS),
+                copy_function = _clone_file
+                )
+        except:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        finally:
+            if was_online:
+                self.send_command("save-on")
+
+        # The clone could not be started next to this world with the same
+        # ports.
+        try:
+            self._assign_free_ports(tmp_dir)
+        except:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        os.rename(tmp_dir, directory)
+
+        # Copy the configuration.
+        world_conf = self._app.conf().add_world(name)
+        world_conf.read_dict(self._world_conf)
+        world_conf.write()
+
+        world = WorldWrapper(self._app, name)
+        WorldWrapper.world_cloned.send(self, clone=world)
+
+        log.info("cloned the world '{}' to '{}'.".format(self._name, name))
+        return world
+
+    def _assign_free_ports(self, directory):
+        """
+        Changes the ports (:data:`CLONE_PORT_PROPERTIES`) in the
+        :file:`server.properties` file of the cloned world *directory* to
+        ports, which are neither used by another world nor by another
+        process on this host. Returns a dictionary with the new ports.
+
+        A missing *server-port* is added, since the default port is most
+        likely used by this world.
+
+        .. seealso::
+
+            * :meth:`clone`
+        """
+        path = os.path.join(directory, "server.properties")
+        if not os.path.isfile(path):
+            return dict()
+
+        with open(path, encoding="latin-1") as file:
+            lines = file.read().splitlines()
+
+        # The ports of all worlds, including this one.
+        used = set()
+        for world in self._app.worlds().get_all() + [self]:
+            conf = world.properties()
+            for key in CLONE_PORT_PROPERTIES:
+                port = conf.getint(key)
+                if port is not None:
+                    used.add(port)
+
+        # The next free port after *port*. The privileged ports are skipped.
+        def free_port(port):
+            for offset in range(1, 65536 - 1024):
+                candidate = (port - 1024 + offset) % (65536 - 1024) + 1024
+                if candidate not in used and _port_is_free(candidate):
+                    used.add(candidate)
+                    return candidate
+            raise WorldError("There is no free port for the clone.")
+
+        ports = dict()
+        port_re = re.compile(
+            r"^(\s*)({})(\s*[=:]\s*|\s+)(\d{{1,5}})\s*$".format(
+                "|".join(re.escape(key) for key in CLONE_PORT_PROPERTIES)
+                )
+            )
+        for i, line in enumerate(lines):
+            match = port_re.match(line)
+            if match is None:
+                continue
+            indent, key, separator, port = match.groups()
+            ports[key] = free_port(int(port))
+            lines[i] = indent + key + separator + str(ports[key])
+
+        if "server-port" not in ports:
+            ports["server-port"] = free_port(25565)
+            lines.append("server-port={}".format(ports["server-port"]))
+
+        with open(path, "w", encoding="latin-1") as file:
+            file.write("\n".join(lines) + "\n")
+
+        log.info("the clone of '{}' uses the ports {}.".format(
+            self._name, ", ".join(
+                "{}={}".format(key, port) for key, port in sorted(ports.items())
+                )
+            ))
+        return ports
+
 
     def start(self, wait_check_time=0.1):
         """
@@ -646,6 +977,10 @@ class WorldWrapper(object):
 
         WorldWrapper.world_about_to_start.send(self)
 
+        # Remember the end of the current log, so that is_ready() only
+        # looks at the output of this run.
+        self._start_log_position = self._log_position()
+
         # We need to change the current working directory to the world's
         # directory so that the server starts in the correct environment.
         old_wd = os.getcwd()
@@ -695,6 +1030,72 @@ class WorldWrapper(object):
         return None
 
 
+    def _log_position(self):
+        """
+        Returns the (inode, size) of the log file or ``(None, 0)``, if it does
+        not exist.
+        """
+        try:
+            stat = os.stat(self.log_path())
+        except (OSError, IOError):
+            return (None, 0)
+        return (stat.st_ino, stat.st_size)
+
+    def is_ready(self):
+        """
+        Returns ``True``, if the world is online and the server is ready to
+        accept players: The log contains the *Done* message of the current
+        run or the port of the world accepts connections.
+
+        .. seealso::
+
+            * :meth:`wait_ready`
+        """
+        if not self.is_online():
+            return False
+
+        # Read the log written since start() or the log since the last start
+        # line, if the world has not been started by this process.
+        if self._start_log_position is None:
+            log_text = self.latest_log()
+        else:
+            inode, offset = self._start_log_position
+            try:
+                with open(self.log_path(), "rb") as file:
+                    stat = os.fstat(file.fileno())
+                    if stat.st_ino == inode and stat.st_size >= offset:
+                        file.seek(offset)
+                    log_text = file.read().decode(errors="replace")
+            except (OSError, IOError):
+                log_text = ""
+
+        if DONE_RE.search(log_text):
+            return True
+
+        # Probe the port.
+        ip, port = self.address()
+        if port is None:
+            return False
+        try:
+            with socket.create_connection((ip or "localhost", port), 1):
+                return True
+        except OSError:
+            return False
+
+    def wait_ready(self, timeout, interval=1):
+        """
+        Waits until the world :meth:`is_ready`, but at most *timeout*
+        seconds. Returns ``False``, if the timeout has been reached or the
+        world went offline.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.is_ready():
+                return True
+            if time.monotonic() >= deadline or not self.is_online():
+                return False
+            time.sleep(interval)
+
     def kill_processes(self):
         """
         Kills all processes with a pid in :meth:`pids`.
@@ -854,6 +1255,7 @@ class WorldManager(object):
         self._worlds = dict()
 
         WorldWrapper.world_uninstalled.connect(self._remove)
+        WorldWrapper.world_cloned.connect(self._add_clone)
         return None
 
     def load_worlds(self):
@@ -866,6 +1268,16 @@ class WorldManager(object):
             * :class:`~emsm.core.conf.WorldsConfiguration`
         """
         world_names = self._app.conf().list_worlds()
+
+        # Install the missing server software of all worlds at the same time
+        # and not one after another in the WorldWrapper constructor.
+        server = set()
+        for name in world_names:
+            server_name = self._app.conf().world(name)["world"].get("server")
+            if server_name in self._app.server().get_names():
+                server.add(self._app.server().get(server_name))
+        self._app.server().install_all(server)
+
         for name in world_names:
             world = WorldWrapper(self._app, name)
             self._worlds[world.name()] = world
@@ -886,6 +1298,14 @@ class WorldManager(object):
             del self._worlds[world.name()]
         return None
 
+    def _add_clone(self, world, clone):
+        """
+        Adds the :class:`WorldWrapper` *clone* of the *world* to the
+        internal map.
+        """
+        self._worlds[clone.name()] = clone
+        return None
+
     def get(self, worldname):
         """
         Returns the :class:`WorldWrapper` for the world with the name
@@ -940,3 +1360,53 @@ class WorldManager(object):
         Returns a list with the names of all worlds.
         """
         return list(self._worlds.keys())
+
+    # status
+    # --------------------------------------------
+
+    def status_all(self, worlds=None):
+        """
+        Returns the status of all *worlds* (default: all loaded worlds) as
+        dictionary, which maps the world name to a dictionary with these keys:
+
+        *   **name**: The name of the world.
+        *   **online**: ``True``, if the world is running.
+        *   **pids**: The pids of the world's screen sessions.
+        *   **address**: The ``(ip, port)`` tuple of the world.
+        *   **uptime**: The seconds since the world has been started or
+            ``None``, if the world is offline.
+        *   **server**: The name of the world's server.
+
+        In contrast to calling :meth:`WorldWrapper.is_online` for each world,
+        the process table (``screen -ls``) is only read once.
+
+        .. seealso::
+
+            * :meth:`WorldWrapper.pids`
+            * :meth:`WorldWrapper.screen_list`
+        """
+        if worlds is None:
+            worlds = self.get_all()
+
+        screen_list = WorldWrapper.screen_list()
+        now = time.time()
+
+        status = dict()
+        for world in worlds:
+            pids = world.pids(screen_list)
+
+            uptime = None
+            if pids:
+                start_time = resources.start_time(pids[0])
+                if start_time is not None:
+                    uptime = max(now - start_time, 0)
+
+            status[world.name()] = {
+                "name": world.name(),
+                "online": bool(pids),
+                "pids": pids,
+                "address": world.address(),
+                "uptime": uptime,
+                "server": world.server().name()
+                }
+        return status
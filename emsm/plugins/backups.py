@@ -47,6 +47,12 @@ main.conf
     restore_message = This world is about to be ressetted to an earlier state.
     restore_delay = 5
     max_storage_size = 30
+    keep_hourly = 0
+    keep_daily = 0
+    keep_weekly = 0
+    keep_monthly = 0
+    delta_backups = 0
+    max_parallel_backups = 2
     backup_logs = yes
     exclude_paths =
 
@@ -70,6 +76,49 @@ main.conf
     Maximum number of backups in the storage folder, before older backups
     will be removed.
 
+**keep_hourly**, **keep_daily**, **keep_weekly**, **keep_monthly**
+
+    Grandfather-father-son retention. If at least one of these options is
+    greater than *0*, the newest backup of each of the last *keep_hourly*
+    hours, *keep_daily* days, *keep_weekly* weeks and *keep_monthly* months
+    is kept and all other backups are removed. The latest backup is always
+    kept.
+
+    For example, to keep hourly backups for a day, daily backups for a
+    week, weekly backups for a month and monthly backups for a year:
+
+    .. code-block:: ini
+
+        max_storage_size = 0
+        keep_hourly = 24
+        keep_daily = 7
+        keep_weekly = 4
+        keep_monthly = 12
+
+    *max_storage_size* is still applied to the kept backups. So it should
+    be *0* (no limit) or at least the sum of the ``keep_*`` options (*47* in
+    the example above), otherwise the oldest kept backups are removed. A
+    warning is logged, if this is not the case.
+
+**delta_backups**
+
+    If greater than *0*, up to *delta_backups* delta backups are created
+    after each full backup. A delta backup contains only the chunks of the
+    region files (*\*.mca*), which have been modified since the full backup,
+    and all other files of the world. So the backups of large worlds, where
+    only a few regions change, become much smaller and faster.
+
+    Restoring a delta backup requires its full backup, so a full backup is
+    not removed as long as a delta backup depends on it, even if this
+    exceeds the *max_storage_size*. A warning is logged in this case. The
+    name of the full backup is stored in a *.base* file next to the delta
+    backup.
+
+**max_parallel_backups**
+
+    The maximum number of backups, which are created at the same time by
+    *--create-changed*.
+
 **backup_logs**
 
     If ``yes``, the log files are included into the backup, otherwise not.
@@ -92,6 +141,8 @@ Some global configuration options can be overridden for each world:
 
 *   *archive_format*
 *   *max_storage_size*
+*   *keep_hourly*, *keep_daily*, *keep_weekly*, *keep_monthly*
+*   *delta_backups*
 *   *backup_logs*
 *   *exclude_paths*
 
@@ -114,12 +165,36 @@ Arguments
 
 .. option:: --list
 
-    Lists all available backups.
+    Lists all available backups. With the global ``--output json`` argument,
+    the index records of the backups are printed as one JSON document.
 
 .. option:: --create
 
     Creates a new backup.
 
+.. option:: --create-changed
+
+    Creates a new backup of each world, which has been modified since its
+    latest backup. Unchanged worlds are skipped, so that idle worlds do
+    not cost any IO. A world is considered modified, if the paths, sizes or
+    modification times of its files differ from the latest backup. Online
+    worlds are saved before they are checked.
+
+    The backups are created in parallel, but at most *max_parallel_backups*
+    at the same time.
+
+.. option:: --verify
+
+    Checks all backups against the checksum manifest, which is created
+    next to each backup archive. The archives are checked in parallel, so
+    that corrupted backups can be found without restoring them.
+
+.. option:: --rebuild-index
+
+    Rebuilds the backup index (*index.json* in the world's backup directory)
+    by scanning the backup directory. This is only necessary, if you added
+    or removed backups manually.
+
 .. option:: --restore PATH
 
     Restores the world with the backup from the given BACKUP_PATH.
@@ -132,6 +207,21 @@ Arguments
 
     Opens a menu, where the user can select which backup he wants to restore.
 
+.. option:: --restore-path PATTERN
+
+    Can be combined with the restore actions above to restore only the files
+    matching the :func:`~glob.glob` like *PATTERN*. The pattern is relative to
+    the world directory and ``**`` matches any number of subdirectories.
+    The option can be used multiple times.
+
+    .. code-block:: bash
+
+        # Restore only the nether of the world *foo*
+        $ minecraft -w foo backups --restore-latest --restore-path 'world/DIM-1/**'
+
+    Zip archives and uncompressed tar archives allow to extract single files
+    without decompressing the rest of the archive.
+
 Cron
 ----
 
@@ -143,6 +233,15 @@ You should create a cronjob to create daily backups:
     # Creates a backup of all worlds everyday at 2:00h
     0 2 *   *   *   root minecraft -W backups --create
 
+If you want to backup your worlds more often, you can use *--create-changed*,
+which only creates a backup of the worlds that have been modified:
+
+.. code-block:: none
+
+    # m h dom mon dow user command
+    # Creates a backup of all modified worlds every hour
+    0 *   *   *   *   root minecraft -W backups --create-changed
+
 
 Backup archive structure
 ------------------------
@@ -158,6 +257,21 @@ A typical backup archive has this structure:
         |- server.properties
         |- ...
 
+Each backup archive is accompanied by a checksum manifest
+(*archive name*\ *.sha512*), which has the same format as the output of
+``sha512sum``.
+
+The backup directory of each world contains an index (*index.json*) with
+the date, size, archive format, duration, number of files and checksum of
+every backup, so that the backups can be listed without scanning the
+directory.
+
+If *delta_backups* is enabled, the chunk timestamps of the region files in
+a full backup are stored next to the archive (*archive name*\ *.regions*).
+A delta backup contains *region*\ *.mca.delta* files instead of the region
+files of the full backup. They only contain the header of the region file
+and the modified chunks.
+
 Changelog
 ---------
 
@@ -188,6 +302,12 @@ import datetime
 import tempfile
 import logging
 import json
+import re
+import concurrent.futures
+import tarfile
+import zipfile
+import struct
+import base64
 
 # third party
 import termcolor
@@ -213,22 +333,331 @@ PLUGIN = "Backups"
 
 AVLB_ARCHIVE_FORMATS = [name for name, desc in shutil.get_archive_formats()]
 
+#: The number of bytes read at once, when the hash sum of a file is computed.
+HASH_CHUNK_SIZE = 1024**2
+
+#: The extension of the checksum manifest, which is stored next to each
+#: backup archive.
+MANIFEST_EXT = ".sha512"
+
+#: The retention periods and the functions, which map the date of a backup
+#: to the period it belongs to.
+RETENTION_PERIODS = [
+    ("hourly", lambda date: (date.year, date.month, date.day, date.hour)),
+    ("daily", lambda date: (date.year, date.month, date.day)),
+    ("weekly", lambda date: tuple(date.isocalendar()[:2])),
+    ("monthly", lambda date: (date.year, date.month))
+    ]
+
+#: The extension of the file, which stores the chunk timestamps of the region
+#: files in a full backup. It is needed to create delta backups.
+REGIONS_EXT = ".regions"
+
+#: The extension of the file, which stores the filename of the full backup,
+#: on which a delta backup is based. So the index can be rebuilt from the
+#: backup directory alone.
+BASE_EXT = ".base"
+
+#: All files with these extensions belong to a backup archive.
+SIDECAR_EXTS = (MANIFEST_EXT, REGIONS_EXT, BASE_EXT)
+
+#: The size of a sector in an Anvil region file (*.mca*) and the size of the
+#: region file header (chunk locations and chunk timestamps).
+REGION_SECTOR_SIZE = 4096
+REGION_HEADER_SIZE = 2*REGION_SECTOR_SIZE
+
+#: Delta region files contain only the changed chunks of a region file.
+DELTA_EXT = ".delta"
+DELTA_MAGIC = b"EMSMDLT1"
+
+#: These files are not included into the fingerprint of a world, since they
+#: are modified by every save, even if nothing has changed in the world.
+FINGERPRINT_IGNORE_PATTERNS = ["logs", "level.dat", "level.dat_old", "session.lock"]
+
+#: The name of the backup index file in each world's backup directory.
+INDEX_FILENAME = "index.json"
+
+#: The version of the backup index format.
+INDEX_VERSION = 1
+
 log = logging.getLogger(__file__)
 
 
+# Exceptions
+# ------------------------------------------------
+
+class MissingBaseBackup(Exception):
+    """
+    Raised if a delta backup should be restored, but the full backup it
+    depends on does not exist.
+    """
+
+    def __init__(self, backup_path, base):
+        self.backup_path = backup_path
+        self.base = base
+        return None
+
+    def __str__(self):
+        temp = "The base backup '{}' of the delta backup '{}' does not exist."\
+               .format(self.base, self.backup_path)
+        return temp
+
+
 # Functions
 # ------------------------------------------------
 
-def file_hash(path):
+def file_hash(path, chunk_size=HASH_CHUNK_SIZE):
     """
     Returns the sha512 hash sum of the file at *path*.
+
+    The file is read in chunks of *chunk_size* bytes into a reused buffer,
+    so that hashing a large archive does not require to load it into the
+    memory.
     """
-    with open(path, "rb") as file:
-        data = file.read()
-        sum_ = hashlib.sha512(data)
+    sum_ = hashlib.sha512()
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as file:
+        while True:
+            size = file.readinto(buf)
+            if not size:
+                break
+            sum_.update(view[:size])
     return sum_.hexdigest()
 
 
+def read_index(backup_dir):
+    """
+    Returns the backup records of the index in *backup_dir* or ``None``, if
+    the index does not exist or can not be read.
+
+    Unlike :meth:`BackupManager.index`, this never creates or rebuilds the
+    index, so it can be used by other plugins without side effects.
+    """
+    try:
+        with open(os.path.join(backup_dir, INDEX_FILENAME)) as file:
+            index = json.load(file)
+    except (OSError, IOError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION:
+        return None
+    return index["backups"]
+
+
+def _member_name(name):
+    """
+    Normalizes the name of an archive member, so that ``./world/foo`` and
+    ``world/foo`` are equal.
+    """
+    name = name.replace("\\", "/")
+    while name.startswith("./"):
+        name = name[2:]
+    return name.rstrip("/")
+
+
+def _safe_join(directory, rel_path):
+    """
+    Joins *directory* and *rel_path* and raises a :exc:`ValueError`, if the
+    result is not located in *directory*.
+    """
+    directory = os.path.normpath(directory)
+    path = os.path.normpath(os.path.join(directory, rel_path))
+    if os.path.commonpath([directory, path]) != directory:
+        raise ValueError("unsafe archive member '{}'".format(rel_path))
+    return path
+
+
+def glob_to_re(pattern):
+    """
+    Translates the :func:`~glob.glob` like *pattern* into a compiled regular
+    expression. ``*`` and ``?`` do not match the path separator ``/``, but
+    ``**`` matches any number of directories.
+
+    Example:
+        >>> glob_to_re("world/DIM-1/**").match("world/DIM-1/region/r.0.0.mca")
+        <re.Match object; span=(0, 28), match='world/DIM-1/region/r.0.0.mca'>
+    """
+    pattern = _member_name(pattern)
+    regex = str()
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return re.compile(regex + r"\Z")
+
+
+def extract_archive(path, route):
+    """
+    Extracts the backup archive at *path* in a single pass.
+
+    *route* is called with the normalized name of each archive member
+    and returns the absolute target path of the member or ``None``, if the
+    member should be skipped. This way, the members can be streamed
+    directly to their final location instead of unpacking the whole
+    archive into a temporary directory first.
+
+    Zip archives are read using their central directory, so that members
+    which are not routed are never decompressed. Uncompressed tar archives
+    are read with seeks over the data of skipped members. Compressed tar
+    archives have no index and must be decompressed up to the last
+    extracted member.
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                target = route(_member_name(info.filename))
+                if target is None:
+                    continue
+
+                if info.filename.endswith("/"):
+                    os.makedirs(target, exist_ok=True)
+                    continue
+
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with archive.open(info) as src, open(target, "wb") as dst:
+                    shutil.copyfileobj(src, dst, HASH_CHUNK_SIZE)
+    else:
+        with tarfile.open(path, "r:*") as archive:
+            for info in archive:
+                target = route(_member_name(info.name))
+                if target is None:
+                    continue
+
+                # Only regular files and directories are restored. Links
+                # and device files have no place in a minecraft world.
+                if info.isdir():
+                    os.makedirs(target, exist_ok=True)
+                elif info.isfile():
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    with archive.extractfile(info) as src, \
+                         open(target, "wb") as dst:
+                        shutil.copyfileobj(src, dst, HASH_CHUNK_SIZE)
+                    os.utime(target, (info.mtime, info.mtime))
+    return None
+
+
+# Minecraft stores the chunks of a world in Anvil region files (*.mca*). Each
+# file starts with a header of two tables with 1024 big endian integers: The
+# locations of the chunks (3 byte sector offset, 1 byte sector count) and the
+# timestamps of the last modification of the chunks.
+#
+# Only a few chunks of a region file change between two backups. So a delta
+# file stores only the chunks, whose timestamp differs from the timestamp in
+# the full (base) backup:
+#
+#   DELTA_MAGIC | region header | 128 byte bitmap | sectors of stored chunks
+
+def region_timestamps(path):
+    """
+    Returns the raw chunk timestamp table of the region file at *path* or
+    ``None``, if the file is not a valid region file.
+    """
+    with open(path, "rb") as file:
+        header = file.read(REGION_HEADER_SIZE)
+    if len(header) != REGION_HEADER_SIZE:
+        return None
+    return header[REGION_SECTOR_SIZE:]
+
+
+def _read_sectors(file, location):
+    """
+    Reads the sectors of the chunk at the raw *location* from the region
+    *file*. The result is padded to a multiple of the sector size.
+    """
+    offset, count = location >> 8, location & 0xff
+    file.seek(offset*REGION_SECTOR_SIZE)
+    data = file.read(count*REGION_SECTOR_SIZE)
+    return data.ljust(count*REGION_SECTOR_SIZE, b"\0")
+
+
+def write_region_delta(path, base_timestamps, delta_path):
+    """
+    Writes the chunks of the region file at *path*, whose timestamp differs
+    from the timestamp in *base_timestamps*, into the delta file at
+    *delta_path*. Returns ``False``, if *path* is not a valid region file and
+    no delta has been written.
+    """
+    with open(path, "rb") as file:
+        header = file.read(REGION_HEADER_SIZE)
+        if len(header) != REGION_HEADER_SIZE:
+            return False
+
+        locations = struct.unpack(">1024I", header[:REGION_SECTOR_SIZE])
+        timestamps = struct.unpack(">1024I", header[REGION_SECTOR_SIZE:])
+        base_timestamps = struct.unpack(">1024I", base_timestamps)
+
+        bitmap = bytearray(128)
+        with open(delta_path, "wb") as delta:
+            delta.write(DELTA_MAGIC)
+            delta.write(header)
+            delta.write(bitmap)
+
+            for i, location in enumerate(locations):
+                if location & 0xff and timestamps[i] != base_timestamps[i]:
+                    bitmap[i//8] |= 1 << (i%8)
+                    delta.write(_read_sectors(file, location))
+
+            delta.seek(len(DELTA_MAGIC) + REGION_HEADER_SIZE)
+            delta.write(bitmap)
+    return True
+
+
+def apply_region_delta(base_path, delta_path, path):
+    """
+    Reconstructs the region file *path* from the region file of the full
+    backup at *base_path* and the delta file at *delta_path*.
+    """
+    with open(delta_path, "rb") as delta, open(base_path, "rb") as base, \
+         open(path, "wb") as file:
+        if delta.read(len(DELTA_MAGIC)) != DELTA_MAGIC:
+            raise ValueError("'{}' is not a region delta".format(delta_path))
+
+        header = delta.read(REGION_HEADER_SIZE)
+        bitmap = delta.read(128)
+        locations = struct.unpack(">1024I", header[:REGION_SECTOR_SIZE])
+
+        base_header = base.read(REGION_SECTOR_SIZE)
+        base_header = base_header.ljust(REGION_SECTOR_SIZE, b"\0")
+        base_locations = struct.unpack(">1024I", base_header)
+
+        # The chunks are written one after another, so their locations
+        # in the new file are computed on the fly.
+        new_locations = list()
+        sector = 2
+        file.write(bytes(REGION_HEADER_SIZE))
+        for i, location in enumerate(locations):
+            if not location & 0xff:
+                new_locations.append(0)
+                continue
+
+            if bitmap[i//8] & (1 << (i%8)):
+                count = location & 0xff
+                data = delta.read(count*REGION_SECTOR_SIZE)
+                data = data.ljust(count*REGION_SECTOR_SIZE, b"\0")
+            else:
+                count = base_locations[i] & 0xff
+                data = _read_sectors(base, base_locations[i])
+
+            file.write(data)
+            new_locations.append((sector << 8) | count)
+            sector += count
+
+        file.seek(0)
+        file.write(struct.pack(">1024I", *new_locations))
+        file.write(header[REGION_SECTOR_SIZE:])
+    return None
+
+
 # Classes
 # ------------------------------------------------
 
@@ -239,7 +668,8 @@ class BackupManager(object):
 
     def __init__(
         self, app, world, max_storage_size, backup_dir, backup_logs,
-        default_archive_format, exclude_paths
+        default_archive_format, exclude_paths, retention=None,
+        delta_backups=0
         ):
         """
         """
@@ -247,10 +677,15 @@ class BackupManager(object):
         self._world = world
         self._backup_dir = backup_dir
         self._max_storage_size = max_storage_size
+        self._retention = retention or dict()
+        self._delta_backups = delta_backups
         self._backup_logs = backup_logs
         self._default_archive_format = default_archive_format
         self._exclude_paths = exclude_paths
 
+        # The backup index is loaded on demand.
+        self._index = None
+
         os.makedirs(self._backup_dir, exist_ok=True)
         return None
 
@@ -279,6 +714,28 @@ class BackupManager(object):
         """
         return self._max_storage_size
 
+    def retention(self):
+        """
+        Returns a dictionary, which maps the name of a retention period
+        (*hourly*, *daily*, *weekly*, *monthly*) to the number of periods
+        for which the newest backup is kept. If all values are *0*, the
+        retention policy is disabled.
+
+        See also:
+            * RETENTION_PERIODS
+        """
+        return self._retention
+
+    def delta_backups(self):
+        """
+        Returns the maximum number of delta backups, which are created after
+        a full backup. If this value is *0*, only full backups are created.
+
+        See also:
+            * write_region_delta()
+        """
+        return self._delta_backups
+
     def backup_logs(self):
         """
         Returns the option to include the logs in the backup.
@@ -334,12 +791,92 @@ class BackupManager(object):
         filename = date.strftime(self._filename_format())
         return filename
 
-    def backup_list(self):
+    # The backup index
+    #
+    # Scanning the backup directory and parsing all filenames is slow, if
+    # there are thousands of backups. So we keep a small JSON index in the
+    # backup directory, which maps the filename of each backup to its
+    # metadata:
+    #
+    #   {"version": 1,
+    #    "backups": {"2014_09_02-20_37_08-foo.tar.bz2": {
+    #                    "date": [2014, 9, 2, 20, 37, 8],
+    #                    "size": 1048576,
+    #                    "format": "bztar",
+    #                    "duration": 12.3,
+    #                    "file_count": 4711,
+    #                    "checksum": "..."
+    #                    },
+    #                ...
+    #                }
+    #   }
+    #
+    # The index is rebuilt from a directory scan, if it does not exist yet.
+    # Unknown values (e.g. the duration of backups found during a scan) are
+    # *null*.
+
+    def index_path(self):
         """
-        Returns a dictionary that maps the creation date of the backup to
-        the backup path.
+        Returns the path of the backup index.
         """
-        backups = dict()
+        return os.path.join(self._backup_dir, INDEX_FILENAME)
+
+    def _load_index(self):
+        """
+        Loads the backup index or rebuilds it, if it does not exist or
+        can not be read.
+        """
+        try:
+            with open(self.index_path()) as file:
+                index = json.load(file)
+            if index.get("version") != INDEX_VERSION:
+                raise ValueError("unknown index version")
+        except (OSError, IOError, ValueError) as err:
+            log.info("rebuilding the backup index of '{}' ({})."\
+                     .format(self._world.name(), err))
+
+            # The index is loaded implicitly, so the subclasses must not
+            # print anything here.
+            self._rebuild_index()
+        else:
+            self._index = index["backups"]
+        return None
+
+    def _save_index(self):
+        """
+        Writes the backup index atomically into the backup directory.
+        """
+        index = {"version": INDEX_VERSION, "backups": self._index}
+        with open(self.index_path() + ".tmp", "w") as file:
+            json.dump(index, file, indent=1, sort_keys=True)
+        os.replace(self.index_path() + ".tmp", self.index_path())
+        return None
+
+    def index(self):
+        """
+        Returns the backup index, a dictionary that maps the filename of a
+        backup archive to its metadata record.
+        """
+        if self._index is None:
+            self._load_index()
+        return self._index
+
+    def rebuild_index(self):
+        """
+        Rebuilds the backup index by scanning the backup directory.
+
+        The metadata of backups, which are already indexed, is kept.
+        """
+        self._rebuild_index()
+        return None
+
+    def _rebuild_index(self):
+        """
+        Implements :meth:`rebuild_index`. Unlike the public method, it is
+        not overridden by the :class:`UiBackupManager`.
+        """
+        old_index = self._index or dict()
+        index = dict()
         for filename in os.listdir(self._backup_dir):
             path = os.path.join(self._backup_dir, filename)
 
@@ -347,12 +884,65 @@ class BackupManager(object):
                 continue
             if path.endswith(".tmp"):
                 continue
+            if path.endswith(SIDECAR_EXTS):
+                continue
 
             date = self._date_from_filename(filename)
             if date is None:
                 continue
 
-            backups[date] = path
+            record = old_index.get(filename)
+            if record is None:
+                record = {
+                    "date": list(date.timetuple()[:6]),
+                    "size": os.path.getsize(path),
+                    "format": self._format_from_filename(filename),
+                    "duration": None,
+                    "file_count": None,
+                    "checksum": self.read_manifest(path),
+                    "base": self._read_base(path),
+                    "fingerprint": None
+                    }
+            index[filename] = record
+
+        self._index = index
+        self._save_index()
+        return None
+
+    def _format_from_filename(self, filename):
+        """
+        Returns the name of the archive format of the backup *filename* or
+        ``None``, if the format is unknown.
+        """
+        extensions = [
+            (".tar.gz", "gztar"), (".tgz", "gztar"),
+            (".tar.bz2", "bztar"), (".tar.xz", "xztar"),
+            (".tar", "tar"), (".zip", "zip")
+            ]
+        for ext, archive_format in extensions:
+            if filename.endswith(ext):
+                return archive_format
+        return None
+
+    def backup_info(self, path):
+        """
+        Returns the metadata record of the backup at *path* or ``None``,
+        if the backup is not indexed.
+
+        See also:
+            * index()
+        """
+        return self.index().get(os.path.basename(path))
+
+    def backup_list(self):
+        """
+        Returns a dictionary that maps the creation date of the backup to
+        the backup path.
+        """
+        backups = dict()
+        for filename, record in self.index().items():
+            date = datetime.datetime(*record["date"])
+            backups[date] = os.path.join(self._backup_dir, filename)
         return backups
 
     def latest_backup(self):
@@ -378,15 +968,41 @@ class BackupManager(object):
 
         See also:
             * max_storage_size()
+            * retention()
         """
-        # Remove some old backups if we store currently too many backups.
+        backups = list(self.backup_list().items())
+        backups.sort(reverse=True)
+
+        # Apply the retention policy and remove some old backups if we
+        # store currently too many backups.
+        keep = self._select_retained(date for date, path in backups)
+        kept = [path for date, path in backups if date in keep]
+        removed = [path for date, path in backups if date not in keep]
         if self._max_storage_size > 0:
-            backups = list(self.backup_list().items())
-            backups.sort(reverse=True)
+            removed.extend(kept[self._max_storage_size:])
+
+        # Full backups are still needed, as long as a delta backup
+        # depends on them.
+        index = self.index()
+        bases = {
+            index[os.path.basename(path)].get("base") for date, path \
+            in backups if path not in removed
+            }
+        pinned = [
+            path for path in removed if os.path.basename(path) in bases
+            ]
+        removed = [path for path in removed if path not in pinned]
+        if pinned and 0 < self._max_storage_size < len(backups) - len(removed):
+            log.warning(
+                "{}: {} backups are stored, which is more than "
+                "max_storage_size ({}), because {} full backups are still "
+                "needed by delta backups.".format(
+                    self._world.name(), len(backups) - len(removed),
+                    self._max_storage_size, len(pinned)
+                    )
+                )
 
-            while len(backups) > self._max_storage_size:
-                date, path = backups.pop()
-                os.remove(path)
+        self._remove_backups(removed)
 
         # Remove .tmp files.
         # These are backups which could not be craeated successfully.
@@ -400,6 +1016,292 @@ class BackupManager(object):
                     pass
         return None
 
+    def _select_retained(self, dates):
+        """
+        Returns the set of the *dates*, whose backups are kept by the
+        grandfather-father-son retention policy.
+
+        The dates are visited only once in descending order. For each period
+        type, the first (newest) backup of a period is kept until the
+        configured number of periods has been reached.
+        """
+        dates = sorted(dates, reverse=True)
+        if not any(self._retention.get(name) for name, key in RETENTION_PERIODS):
+            return set(dates)
+
+        keep = set(dates[:1])
+        seen = {name: set() for name, key in RETENTION_PERIODS}
+        for date in dates:
+            for name, key in RETENTION_PERIODS:
+                periods = seen[name]
+                if len(periods) >= self._retention.get(name, 0):
+                    continue
+
+                period = key(date)
+                if period not in periods:
+                    periods.add(period)
+                    keep.add(date)
+        return keep
+
+    def _remove_backups(self, paths):
+        """
+        Removes the backups at *paths* and updates the index only once.
+        """
+        if not paths:
+            return None
+
+        index = self.index()
+        for path in paths:
+            index.pop(os.path.basename(path), None)
+        self._save_index()
+
+        # We remove the files after the index has been updated, so that
+        # the index never contains a backup that does not exist.
+        for path in paths:
+            for file in (path, self.manifest_path(path), path + REGIONS_EXT,
+                         path + BASE_EXT):
+                try:
+                    os.remove(file)
+                except OSError:
+                    pass
+        return None
+
+    def manifest_path(self, backup_path):
+        """
+        Returns the path of the checksum manifest, which belongs to the backup
+        archive at *backup_path*.
+
+        The manifest has the same format as the output of ``sha512sum``, so
+        that it can also be checked with ``sha512sum -c``.
+        """
+        return backup_path + MANIFEST_EXT
+
+    def _write_manifest(self, backup_path, checksum):
+        """
+        Writes the checksum manifest for the backup archive at *backup_path*.
+        """
+        manifest_path = self.manifest_path(backup_path)
+        with open(manifest_path + ".tmp", "w") as file:
+            file.write("{}  {}\n".format(checksum, os.path.basename(backup_path)))
+        os.rename(manifest_path + ".tmp", manifest_path)
+        return None
+
+    def read_manifest(self, backup_path):
+        """
+        Returns the checksum stored in the manifest of the backup archive
+        at *backup_path* or ``None``, if the backup has no manifest.
+        """
+        try:
+            with open(self.manifest_path(backup_path)) as file:
+                line = file.readline()
+        except (OSError, IOError):
+            return None
+
+        checksum = line.split(maxsplit=1)[0] if line.strip() else None
+        return checksum
+
+    def verify(self, backup_path):
+        """
+        Checks the backup archive at *backup_path* against its checksum
+        manifest.
+
+        Returns ``True`` if the archive is intact, ``False`` if it is
+        corrupted and ``None`` if the backup has no manifest.
+        """
+        checksum = self.read_manifest(backup_path)
+        if checksum is None:
+            return None
+        return file_hash(backup_path) == checksum
+
+    def verify_all(self, max_workers=None):
+        """
+        Verifies all backups in parallel and returns a dictionary, which maps
+        the creation date of each backup to the result of :meth:`verify`.
+
+        Hashing releases the GIL, so using threads is enough to keep
+        multiple disks and cores busy.
+        """
+        backups = self.backup_list()
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            results = executor.map(self.verify, backups.values())
+            results = dict(zip(backups.keys(), results))
+        return results
+
+    def _delta_base(self):
+        """
+        Returns the filename of the full backup, on which the next backup
+        is based, or ``None`` if the next backup must be a full backup.
+        """
+        if self._delta_backups <= 0:
+            return None
+
+        index = self.index()
+        records = sorted(
+            index.items(), key=lambda item: item[1]["date"], reverse=True
+            )
+
+        deltas = 0
+        for filename, record in records:
+            if record.get("base") is None:
+                break
+            deltas += 1
+        else:
+            return None
+
+        path = os.path.join(self._backup_dir, filename)
+        if deltas >= self._delta_backups \
+           or not os.path.exists(path + REGIONS_EXT):
+            return None
+        return filename
+
+    def _write_base(self, backup_path, base):
+        """
+        Stores the filename of the full backup *base* next to the delta
+        backup archive at *backup_path*.
+        """
+        with open(backup_path + BASE_EXT + ".tmp", "w") as file:
+            file.write(base + "\n")
+        os.rename(backup_path + BASE_EXT + ".tmp", backup_path + BASE_EXT)
+        return None
+
+    def _read_base(self, backup_path):
+        """
+        Returns the filename of the full backup, on which the backup at
+        *backup_path* is based, or ``None``, if it is a full backup.
+        """
+        try:
+            with open(backup_path + BASE_EXT) as file:
+                return file.readline().strip() or None
+        except (OSError, IOError):
+            return None
+
+    def _region_files(self, world_dir):
+        """
+        Yields the paths of all region files in *world_dir* relative
+        to *world_dir*.
+        """
+        for dirpath, dirnames, filenames in os.walk(world_dir):
+            for filename in filenames:
+                if filename.endswith(".mca"):
+                    path = os.path.join(dirpath, filename)
+                    yield os.path.relpath(path, world_dir).replace(os.sep, "/")
+
+    def _read_regions(self, backup_path):
+        """
+        Returns the chunk timestamp tables of the region files in the full
+        backup at *backup_path*.
+        """
+        with open(backup_path + REGIONS_EXT) as file:
+            regions = json.load(file)
+        return {
+            name: base64.b64decode(timestamps) \
+            for name, timestamps in regions.items()
+            }
+
+    def _write_regions(self, backup_path, world_dir):
+        """
+        Stores the chunk timestamp tables of all region files in the full
+        backup next to the backup archive at *backup_path*.
+        """
+        regions = dict()
+        for name in self._region_files(world_dir):
+            timestamps = region_timestamps(os.path.join(world_dir, name))
+            if timestamps is not None:
+                regions[name] = base64.b64encode(timestamps).decode()
+
+        with open(backup_path + REGIONS_EXT + ".tmp", "w") as file:
+            json.dump(regions, file)
+        os.rename(backup_path + REGIONS_EXT + ".tmp", backup_path + REGIONS_EXT)
+        return None
+
+    def _make_deltas(self, world_dir, base):
+        """
+        Replaces all region files in the copied world *world_dir*, which are
+        also part of the full backup *base*, with delta files.
+        """
+        regions = self._read_regions(os.path.join(self._backup_dir, base))
+        for name in self._region_files(world_dir):
+            if name not in regions:
+                continue
+
+            path = os.path.join(world_dir, name)
+            if write_region_delta(path, regions[name], path + DELTA_EXT):
+                os.remove(path)
+        return None
+
+    def _ignore_patterns(self):
+        """
+        Returns the :func:`~glob.glob` like patterns of the files in the
+        world directory, which are not included into a backup.
+        """
+        ignore_patterns = list()
+        if not self._backup_logs:
+            ignore_patterns.append("logs")
+        if self._exclude_paths:
+            ignore_patterns.extend(self._exclude_paths)
+        return ignore_patterns
+
+    def _fingerprint(self, directory):
+        """
+        Returns a fingerprint of the paths, sizes and modification times of
+        all files in the world *directory*, which would be included into a
+        backup. The content of the files is not read.
+
+        The logs and the files, which are modified by every save, are
+        ignored (:data:`FINGERPRINT_IGNORE_PATTERNS`), so that an idle world
+        keeps its fingerprint.
+        """
+        ignore = shutil.ignore_patterns(
+            *(self._ignore_patterns() + FINGERPRINT_IGNORE_PATTERNS)
+            )
+
+        entries = list()
+        for dirpath, dirnames, filenames in os.walk(directory):
+            ignored = ignore(dirpath, dirnames + filenames)
+            dirnames[:] = [name for name in dirnames if name not in ignored]
+
+            for filename in filenames:
+                if filename in ignored:
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except (OSError, IOError):
+                    continue
+                entries.append((
+                    os.path.relpath(path, directory).replace(os.sep, "/"),
+                    stat.st_size, stat.st_mtime_ns
+                    ))
+
+        entries.sort()
+        return hashlib.sha1(json.dumps(entries).encode()).hexdigest()
+
+    def has_changed(self):
+        """
+        Returns ``True``, if the world has been modified since the latest
+        backup.
+
+        If the world is online, it is saved first, so that the modifications
+        have already been written to the disk.
+        """
+        if self._world.is_online():
+            try:
+                self._world.send_command_get_output(
+                    "save-all", timeout=30,
+                    until=emsm.core.worlds.SAVE_DONE_RE
+                    )
+            except emsm.core.worlds.WorldCommandTimeout as err:
+                pass
+
+        date, path = self.latest_backup()
+        if path is None:
+            return True
+
+        fingerprint = self.backup_info(path).get("fingerprint")
+        if fingerprint is None:
+            return True
+        return self._fingerprint(self._world.directory()) != fingerprint
+
     def _save_world(self, backup_dir):
         """
         Copies the world directory (world data) into the backup directory:
@@ -414,38 +1316,129 @@ class BackupManager(object):
                 try:
                     # We use verbose send, to wait until the world has been
                     # saved.
-                    self._world.send_command_get_output("save-all", timeout=30)
+                    self._world.send_command_get_output(
+                        "save-all", timeout=30,
+                        until=emsm.core.worlds.SAVE_DONE_RE
+                        )
                 except emsm.core.worlds.WorldCommandTimeout as err:
                     pass
 
             # Copy the world data to *backup_dir*.
-            ignore_patterns = list()
-            if not self._backup_logs:
-                ignore_patterns.append("logs")
-            if self._exclude_paths:
-                ignore_patterns.extend(self._exclude_paths)
-
-            if not ignore_patterns:
-                shutil.copytree(
-                    self._world.directory(),
-                    os.path.join(backup_dir, "world")
-                )
-            else:
-                shutil.copytree(
-                    self._world.directory(),
-                    os.path.join(backup_dir, "world"),
-                    ignore=shutil.ignore_patterns(*ignore_patterns)
-                )
+            ignore_patterns = self._ignore_patterns()
+            emsm.core.copy.copytree(
+                self._world.directory(),
+                os.path.join(backup_dir, "world"),
+                ignore=shutil.ignore_patterns(*ignore_patterns)
+            )
         finally:
             if self._world.is_online():
                 self._world.send_command("save-on")
                 self._world.send_command("save-all")
         return None
 
-    def _restore_world(self, backup_dir):
+    def _sibling_dir(self, suffix):
+        """
+        Returns the path of a hidden directory next to the world directory,
+        e.g. ``EMSM_ROOT/worlds/.foo.restore``.
+
+        The directory is on the same file system as the world, so that it
+        can be swapped with the world directory by a simple rename.
+        """
+        world_dir = os.path.normpath(self._world.directory())
+        return os.path.join(
+            os.path.dirname(world_dir),
+            ".{}.{}".format(os.path.basename(world_dir), suffix)
+            )
+
+    def _extract_backup(self, backup_file, world_dir, conf_dir=None,
+                        match=None):
+        """
+        Extracts the world data of the backup directly into *world_dir*
+        and the world configuration into *conf_dir*. Returns the paths of
+        the extracted files relative to *world_dir*.
+
+        If *match* is given, only the world files, for which *match(name)*
+        returns true, are extracted. The region files of a delta backup are
+        reconstructed with the help of its full backup.
+
+        Exceptions:
+            * MissingBaseBackup
+        """
+        extracted = list()
+        def route(name):
+            if name == "world.conf":
+                return os.path.join(conf_dir, name) if conf_dir else None
+            elif not name.startswith("world/"):
+                return None
+
+            name = name[len("world/"):]
+            if name.endswith(DELTA_EXT):
+                logical_name = name[:-len(DELTA_EXT)]
+            else:
+                logical_name = name
+            if match is not None and not match(logical_name):
+                return None
+
+            extracted.append(name)
+            return _safe_join(world_dir, name)
+
+        os.makedirs(world_dir, exist_ok=True)
+        extract_archive(backup_file, route)
+
+        # Only files are extracted, directories are created on demand.
+        extracted = [
+            name for name in extracted \
+            if os.path.isfile(os.path.join(world_dir, name))
+            ]
+        deltas = [name for name in extracted if name.endswith(DELTA_EXT)]
+        if deltas:
+            self._apply_deltas(backup_file, world_dir, deltas)
+
+        extracted = [
+            name[:-len(DELTA_EXT)] if name.endswith(DELTA_EXT) else name \
+            for name in extracted
+            ]
+        return extracted
+
+    def _apply_deltas(self, backup_file, world_dir, deltas):
+        """
+        Reconstructs the region files of the delta files *deltas* in
+        *world_dir*. Only the needed region files are extracted from the
+        full backup.
+
+        Exceptions:
+            * MissingBaseBackup
+        """
+        info = self.backup_info(backup_file) or dict()
+        base = info.get("base")
+        base_path = os.path.join(os.path.dirname(backup_file), base or "")
+        if base is None or not os.path.isfile(base_path):
+            raise MissingBaseBackup(backup_file, base)
+
+        needed = {name[:-len(DELTA_EXT)] for name in deltas}
+        with tempfile.TemporaryDirectory(dir=world_dir) as base_dir:
+            def route(name):
+                if name.startswith("world/") and name[6:] in needed:
+                    return _safe_join(base_dir, name[6:])
+                return None
+
+            extract_archive(base_path, route)
+
+            for name in deltas:
+                path = os.path.join(world_dir, name[:-len(DELTA_EXT)])
+                apply_region_delta(
+                    os.path.join(base_dir, name[:-len(DELTA_EXT)]),
+                    os.path.join(world_dir, name), path
+                    )
+                os.remove(os.path.join(world_dir, name))
+        return None
+
+    def _restore_world(self, world_dir):
         """
-        Copies the world directory from the backup in *backup_dir* into the
-        EMSM world folder.
+        Replaces the EMSM world folder with the directory *world_dir*, which
+        contains the extracted world data of a backup. *world_dir* must be
+        located on the same file system, so that the directories can simply
+        be renamed.
 
         Exceptions:
             * WorldIsOnlineError
@@ -455,24 +1448,21 @@ class BackupManager(object):
         """
         # Break if the world is currently online.
         if self._world.is_online():
-            raise emsm.core.worlds.WorldIsOnlineError()
-
-        # Delete the world directory (``EMSM/world/...``)
-        for i in range(100):
-            # XXX: Fixes an error with server.log.lck
-            # and shutil.rmtree(...) when the server was online.
-            try:
-                shutil.rmtree(self._world.directory())
-            except OSError:
-                time.sleep(0.05)
-            else:
-                break
-
-        # Copy the world backup to the EMSM world directory.
-        shutil.copytree(
-            src = os.path.join(backup_dir, "world"),
-            dst = self._world.directory()
-            )
+            raise emsm.core.worlds.WorldIsOnlineError(self._world)
+
+        # Swap the directories. The old world directory is removed later,
+        # when the world is online again.
+        old_dir = self._sibling_dir("old")
+        if os.path.exists(old_dir):
+            shutil.rmtree(old_dir)
+        if os.path.exists(self._world.directory()):
+            os.rename(self._world.directory(), old_dir)
+        try:
+            os.rename(world_dir, self._world.directory())
+        except:
+            if os.path.exists(old_dir):
+                os.rename(old_dir, self._world.directory())
+            raise
         return None
 
     def _save_world_conf(self, backup_dir):
@@ -517,6 +1507,7 @@ class BackupManager(object):
         if archive_format is None:
             archive_format = self._default_archive_format
 
+        start_time = time.time()
         with tempfile.TemporaryDirectory() as tmp_data_dir:
 
             # Copy all stuff that should be included into the backup in the
@@ -524,8 +1515,24 @@ class BackupManager(object):
             self._save_world(tmp_data_dir)
             self._save_world_conf(tmp_data_dir)
 
+            # The copy keeps the modification times, so we can compare
+            # its fingerprint later with the world directory.
+            fingerprint = self._fingerprint(os.path.join(tmp_data_dir, "world"))
+
+            # Replace the region files with their changed chunks, if this
+            # is a delta backup.
+            base = self._delta_base()
+            if base is not None:
+                self._make_deltas(os.path.join(tmp_data_dir, "world"), base)
+
+            file_count = sum(
+                len(filenames) for dirpath, dirnames, filenames \
+                in os.walk(os.path.join(tmp_data_dir, "world"))
+                )
+
             # Put all in an archive.
-            backup_filename = self._create_filename(datetime.datetime.now())
+            backup_date = datetime.datetime.now().replace(microsecond=0)
+            backup_filename = self._create_filename(backup_date)
             with tempfile.TemporaryDirectory() as tmp_archive_dir:
 
                 # *make_archive* returns the **complete** path to the crated
@@ -548,29 +1555,137 @@ class BackupManager(object):
                     self._backup_dir, os.path.basename(backup_path)
                     )
                 shutil.move(src=backup_path, dst=dst + ".tmp")
+                checksum = file_hash(dst + ".tmp")
+
+                # The base is stored before the delta backup appears, so a
+                # delta backup can never be mistaken for a full backup.
+                if base is not None:
+                    self._write_base(dst, base)
                 os.rename(dst + ".tmp", dst)
+                self._write_manifest(dst, checksum)
+
+                if self._delta_backups > 0 and base is None:
+                    self._write_regions(dst, os.path.join(tmp_data_dir, "world"))
+
+        # Register the new backup in the index.
+        self.index()[os.path.basename(dst)] = {
+            "date": list(backup_date.timetuple()[:6]),
+            "size": os.path.getsize(dst),
+            "format": archive_format,
+            "duration": time.time() - start_time,
+            "file_count": file_count,
+            "checksum": checksum,
+            "base": base,
+            "fingerprint": fingerprint
+            }
+        self._save_index()
 
         self.clean_backup_dir()
         return None
 
+    def create_if_changed(self, archive_format=None):
+        """
+        Creates a backup, if the world has been modified since the latest
+        backup. Returns ``True`` if a backup has been created and ``False``
+        if it has been skipped.
+
+        See also:
+            * has_changed()
+            * create()
+        """
+        if not self.has_changed():
+            log.info("skipping the backup of the unchanged world '%s'.",
+                     self._world.name())
+            return False
+
+        # This method may run in parallel for several worlds, so we bypass
+        # the output of the UiBackupManager.
+        BackupManager.create(self, archive_format)
+        return True
+
     def restore(self, backup_file, message=str(), delay=0):
         """
         Restores the backup of the world from the given *backup_file*. If
         the backup archive contains the server executable it will be restored
         too if necessary.
 
+        The backup is extracted into a directory next to the world, while the
+        world is still running. The world is only stopped to swap the
+        directories.
+
+        Exceptions:
+            * WorldStartFailed
+            * WorldStopFailed
+            * ... tarfile and zipfile exceptions ...
+        """
+        restore_dir = self._sibling_dir("restore")
+        if os.path.exists(restore_dir):
+            shutil.rmtree(restore_dir)
+
+        was_online = False
+        try:
+            with tempfile.TemporaryDirectory() as conf_dir:
+                self._extract_backup(backup_file, restore_dir, conf_dir)
+
+                # Stop the world.
+                was_online = self._world.is_online()
+                if was_online:
+                    self._world.send_command("say {}".format(message))
+                    time.sleep(delay)
+                    self._world.kill_processes()
+
+                # Restore the world.
+                self._restore_world(restore_dir)
+                self._restore_world_conf(conf_dir)
+        finally:
+            # After a successful swap, the directory does not exist anymore.
+            # Otherwise, it would block the next restore.
+            shutil.rmtree(restore_dir, ignore_errors=True)
+
+            # Restart the world if it was online before restoring.
+            if was_online:
+                self._world.start()
+
+        # Remove the old world data, now that the world is online again.
+        shutil.rmtree(self._sibling_dir("old"), ignore_errors=True)
+        return None
+
+    def restore_paths(self, backup_file, patterns, message=str(), delay=0):
+        """
+        Restores only the files of the backup, which match at least one of
+        the :func:`~glob.glob` like *patterns*, and returns a list with their
+        paths relative to the world directory. The patterns are relative to
+        the world directory, e.g. ``world/DIM-1/**`` or
+        ``world/playerdata/<uuid>.dat``.
+
+        The matching files are extracted next to the world, while it is
+        running. If the world is online, it is only stopped to move the
+        files into place.
+
         Exceptions:
             * WorldStartFailed
             * WorldStopFailed
-            * ... shutil.unpack_archive() exceptions ...
-        """
-        # Extract the backup in a temporary directory and copy then all things
-        # into the EMSM directories.
-        with tempfile.TemporaryDirectory() as temp_dir:
-            shutil.unpack_archive(
-                filename = backup_file,
-                extract_dir = temp_dir
+            * ... tarfile and zipfile exceptions ...
+
+        See also:
+            * glob_to_re()
+        """
+        patterns = [glob_to_re(pattern) for pattern in patterns]
+
+        restore_dir = self._sibling_dir("restore")
+        if os.path.exists(restore_dir):
+            shutil.rmtree(restore_dir)
+
+        def match(name):
+            return any(pattern.match(name) for pattern in patterns)
+
+        was_online = False
+        try:
+            restored = self._extract_backup(
+                backup_file, restore_dir, match=match
                 )
+            if not restored:
+                return restored
 
             # Stop the world.
             was_online = self._world.is_online()
@@ -579,14 +1694,19 @@ class BackupManager(object):
                 time.sleep(delay)
                 self._world.kill_processes()
 
-            # Restore the world.
-            self._restore_world(temp_dir)
-            self._restore_world_conf(temp_dir)
+            # Move the files into the world directory.
+            for name in restored:
+                dst = self._world.worldpath_to_ospath(name)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                os.replace(os.path.join(restore_dir, name), dst)
+        finally:
+            shutil.rmtree(restore_dir, ignore_errors=True)
 
-        # Restart the world if it was online before restoring.
-        if was_online:
-            self._world.start()
-        return None
+            # Restart the world if it was online before restoring, even if
+            # the files could not be moved into place.
+            if was_online:
+                self._world.start()
+        return restored
 
 
 class UiBackupManager(BackupManager):
@@ -598,12 +1718,57 @@ class UiBackupManager(BackupManager):
         backups = list(self.backup_list().items())
         backups.sort(reverse=True)
 
+        output = self.app().output()
+        if output.is_json():
+            output.add("backups", self.world().name(), {
+                "backups": [
+                    dict(self.backup_info(path), path=path,
+                         date=date.isoformat()) \
+                    for date, path in backups
+                    ]
+                })
+            return None
+
         print(termcolor.colored("{}:".format(self.world().name()), "cyan"))
         if not backups:
             print("\t", "- no backups found -")
         else:
             for date, path in backups:
-                print("\t", "*", date.ctime())
+                info = self.backup_info(path)
+                details = ["{:.1f} MiB".format(info["size"]/1024**2)]
+                if info.get("duration") is not None:
+                    details.append("{:.1f}s".format(info["duration"]))
+                print("\t", "*", date.ctime(), "({})".format(", ".join(details)))
+        return None
+
+    def rebuild_index(self):
+        """
+        Rebuilds the backup index and prints the number of found backups.
+        """
+        print(termcolor.colored("{}:".format(self.world().name()), "cyan"))
+        super().rebuild_index()
+        print("\t", "indexed {} backups.".format(len(self.index())))
+        return None
+
+    def verify_all(self, max_workers=None):
+        """
+        Verifies all backups and prints the result.
+        """
+        print(termcolor.colored("{}:".format(self.world().name()), "cyan"))
+
+        results = list(super().verify_all(max_workers).items())
+        results.sort(reverse=True)
+
+        if not results:
+            print("\t", "- no backups found -")
+        for date, result in results:
+            if result is None:
+                status = termcolor.colored("no manifest", "yellow")
+            elif result:
+                status = termcolor.colored("ok", "green")
+            else:
+                status = termcolor.colored("corrupted", "red")
+            print("\t", "*", date.ctime(), "-", status)
         return None
 
     def create(self, archive_format=None):
@@ -623,7 +1788,8 @@ class UiBackupManager(BackupManager):
             print("\t", "done.")
         return None
 
-    def _restore(self, *, backup_path, message, delay, verify_restore=True):
+    def _restore(self, *, backup_path, message, delay, verify_restore=True,
+                 patterns=None):
         """
         The main purpose of this method is simply to wrap the restore
         progress and print it in a user friendly way to the console.
@@ -633,6 +1799,8 @@ class UiBackupManager(BackupManager):
 
         If *verify_restore* is True, the user is asked if he really wants to
         restore (and so overwrite) the world.
+
+        If *patterns* are given, only the matching files are restored.
         """
         if verify_restore:
             prompt = "\t Do you really want to restore and " +\
@@ -644,7 +1812,12 @@ class UiBackupManager(BackupManager):
 
         # Restore the world.
         try:
-            super().restore(backup_path, message, delay)
+            if patterns:
+                restored = super().restore_paths(
+                    backup_path, patterns, message, delay
+                    )
+            else:
+                super().restore(backup_path, message, delay)
         except emsm.core.worlds.WorldStopFailed:
             print("\t", termcolor.colored("error:", "red"),
                   "the world could not be stopped.")
@@ -658,10 +1831,17 @@ class UiBackupManager(BackupManager):
             # them.
             raise
         else:
-            print("\t", "done.")
+            if patterns and not restored:
+                print("\t", termcolor.colored("error:", "red"),
+                      "no file in the backup matches the paths.")
+            elif patterns:
+                print("\t", "restored {} files.".format(len(restored)))
+            else:
+                print("\t", "done.")
         return None
 
-    def restore(self, backup_path, message, delay, backup_date=None):
+    def restore(self, backup_path, message, delay, backup_date=None,
+                patterns=None):
         """
         This method corresponds to the command line argument:
 
@@ -675,11 +1855,11 @@ class UiBackupManager(BackupManager):
         # Restore the backup.
         self._restore(
             backup_path=backup_path, message=message, delay=delay,
-            verify_restore=True
+            verify_restore=True, patterns=patterns
             )
         return None
 
-    def restore_latest(self, message, delay):
+    def restore_latest(self, message, delay, patterns=None):
         """
         This method corresponds to the command line argument:
 
@@ -698,11 +1878,11 @@ class UiBackupManager(BackupManager):
             # Restore the backup.
             self._restore(
                 backup_path=path, message=message, delay=delay,
-                verify_restore=True
+                verify_restore=True, patterns=patterns
                 )
         return None
 
-    def restore_menu(self, message, delay):
+    def restore_menu(self, message, delay, patterns=None):
         """
         This method corresponds to the command line argument:
 
@@ -735,7 +1915,7 @@ class UiBackupManager(BackupManager):
             # Restore the backup.
             self._restore(
                 backup_path=backup[1], message=message, delay=delay,
-                verify_restore=True
+                verify_restore=True, patterns=patterns
                 )
         return None
 
@@ -785,6 +1965,19 @@ class Backups(BasePlugin):
         if self._max_storage_size < 0:
             self._max_storage_size = 0
 
+        # keep_hourly, keep_daily, keep_weekly, keep_monthly
+        self._retention = dict()
+        for name, key in RETENTION_PERIODS:
+            self._retention[name] = max(conf.getint("keep_" + name, 0), 0)
+
+        # delta_backups
+        self._delta_backups = max(conf.getint("delta_backups", 0), 0)
+
+        # max_parallel_backups
+        self._max_parallel_backups = conf.getint("max_parallel_backups", 2)
+        if self._max_parallel_backups < 1:
+            self._max_parallel_backups = 1
+
         # backup_logs
         self._backup_logs = conf.getboolean("backup_logs", True)
 
@@ -802,6 +1995,10 @@ class Backups(BasePlugin):
         conf["restore_message"] = str(self._restore_message)
         conf["restore_delay"] = str(self._restore_delay)
         conf["max_storage_size"] = str(self._max_storage_size)
+        for name, key in RETENTION_PERIODS:
+            conf["keep_" + name] = str(self._retention[name])
+        conf["delta_backups"] = str(self._delta_backups)
+        conf["max_parallel_backups"] = str(self._max_parallel_backups)
         conf["backup_logs"] = "yes" if self._backup_logs else "no"
         conf["exclude_paths"] = "\n".join(self._exclude_paths)
         return None
@@ -830,6 +2027,17 @@ class Backups(BasePlugin):
             max_storage_size = 0
             conf["max_storage_size"] = str(max_storage_size)
 
+        # keep_hourly, keep_daily, keep_weekly, keep_monthly
+        for name, key in RETENTION_PERIODS:
+            keep = conf.getint("keep_" + name)
+            if keep is not None and keep < 0:
+                conf["keep_" + name] = "0"
+
+        # delta_backups
+        delta_backups = conf.getint("delta_backups")
+        if delta_backups is not None and delta_backups < 0:
+            conf["delta_backups"] = "0"
+
         # backups_logs
         backup_logs = conf.getboolean("backup_logs")
         if backup_logs is not None:
@@ -867,6 +2075,25 @@ class Backups(BasePlugin):
             dest = "backups_create",
             help = "Creates a new backup."
             )
+        me_group.add_argument(
+            "--create-changed",
+            action = "count",
+            dest = "backups_create_changed",
+            help = "Creates a new backup of each world, which has been "\
+                   "modified since its latest backup."
+            )
+        me_group.add_argument(
+            "--verify",
+            action = "count",
+            dest = "backups_verify",
+            help = "Checks all backups against their checksum manifest."
+            )
+        me_group.add_argument(
+            "--rebuild-index",
+            action = "count",
+            dest = "backups_rebuild_index",
+            help = "Rebuilds the backup index by scanning the backup directory."
+            )
         me_group.add_argument(
             "--restore",
             action = "store",
@@ -887,8 +2114,35 @@ class Backups(BasePlugin):
             help = "Opens a dialog allowing the user to select the backup "\
                    "that should be restored."
             )
+
+        # The restore actions can be limited to some paths.
+        parser.add_argument(
+            "--restore-path",
+            action = "append",
+            dest = "backups_restore_paths",
+            metavar = "PATTERN",
+            help = "Restores only the files matching the pattern, e.g. "\
+                   "'world/DIM-1/**'. Can be used multiple times."
+            )
         return None
 
+    def backup_dir(self, world):
+        """
+        Returns the directory, which contains the backups of the *world*.
+        The directory is not created.
+        """
+        return os.path.join(self.data_dir(create=False), world.name())
+
+    def backup_index(self, world):
+        """
+        Returns the backup records of the *world* without creating or
+        rebuilding its index, or ``None`` if the world has no index yet.
+
+        See also:
+            * read_index()
+        """
+        return read_index(self.backup_dir(world))
+
     def _init_backup_manager(self, world):
         """
         Creates a new :class:`UiBackupManager` for the world *world* and
@@ -903,6 +2157,13 @@ class Backups(BasePlugin):
         max_storage_size = world_conf.getint(
             "max_storage_size", self._max_storage_size
         )
+        retention = {
+            name: world_conf.getint("keep_" + name, self._retention[name]) \
+            for name, key in RETENTION_PERIODS
+            }
+        delta_backups = world_conf.getint(
+            "delta_backups", self._delta_backups
+        )
         backup_logs = world_conf.getboolean(
             "backup_logs", self._backup_logs
         )
@@ -918,17 +2179,56 @@ class Backups(BasePlugin):
         else:
             exclude_paths = self._exclude_paths
 
+        # The retention policy may keep more backups than allowed.
+        keep = sum(retention.values())
+        if 0 < max_storage_size < keep:
+            log.warning(
+                "{}: the keep_* options of the backups plugin keep up to {} "
+                "backups, but max_storage_size is only {}. The oldest kept "
+                "backups will be removed.".format(
+                    world.name(), keep, max_storage_size
+                    )
+                )
+
         bm = UiBackupManager(
             app = self.app(),
             world = world,
             max_storage_size = max_storage_size,
-            backup_dir = os.path.join(self.data_dir(), world.name()),
+            backup_dir = self.backup_dir(world),
             backup_logs = backup_logs,
             default_archive_format = archive_format,
-            exclude_paths = exclude_paths
+            exclude_paths = exclude_paths,
+            retention = retention,
+            delta_backups = delta_backups
         )
         return bm
 
+    def _create_changed(self, worlds):
+        """
+        Creates a backup of each world in *worlds*, which has been modified
+        since its latest backup. At most *max_parallel_backups* backups are
+        created at the same time.
+        """
+        managers = [self._init_backup_manager(world) for world in worlds]
+
+        with concurrent.futures.ThreadPoolExecutor(
+            self._max_parallel_backups) as executor:
+            futures = [
+                executor.submit(bm.create_if_changed) \
+                for bm in managers
+                ]
+
+        for bm, future in zip(managers, futures):
+            print(termcolor.colored("{}:".format(bm.world().name()), "cyan"))
+            try:
+                created = future.result()
+            except Exception as err:
+                log.exception(err)
+                print("\t", termcolor.colored("error:", "red"), err)
+            else:
+                print("\t", "done." if created else "skipped, no changes.")
+        return None
+
     def run(self, args):
         """
         """
@@ -937,6 +2237,10 @@ class Backups(BasePlugin):
         worlds = self.app().worlds().get_selected()
         worlds.sort(key = lambda w: w.name())
 
+        if args.backups_create_changed:
+            self._create_changed(worlds)
+            return None
+
         for world in worlds:
             bm = self._init_backup_manager(world)
 
@@ -944,12 +2248,21 @@ class Backups(BasePlugin):
                 bm.list()
             elif args.backups_create:
                 bm.create()
+            elif args.backups_verify:
+                bm.verify_all()
+            elif args.backups_rebuild_index:
+                bm.rebuild_index()
             elif args.backups_restore:
                 bm.restore(args.backups_restore, self._restore_message,
-                           self._restore_delay
+                           self._restore_delay,
+                           patterns=args.backups_restore_paths
                            )
             elif args.backups_restore_latest:
-                bm.restore_latest(self._restore_message, self._restore_delay)
+                bm.restore_latest(self._restore_message, self._restore_delay,
+                                  patterns=args.backups_restore_paths
+                                  )
             elif args.backups_restore_menu:
-                bm.restore_menu(self._restore_message, self._restore_delay)
+                bm.restore_menu(self._restore_message, self._restore_delay,
+                                patterns=args.backups_restore_paths
+                                )
         return None
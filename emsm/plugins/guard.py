@@ -40,6 +40,15 @@ Configuration
 Since EMSM version 3.2.2-beta, this plugin requires no more configuration.
 The command line arguments allow you to adjust the guard for each world.
 
+The patterns, which are searched in the server logs, can be changed in the
+``[log_patterns]`` section of a world's configuration (see
+:meth:`emsm.core.worlds.WorldWrapper.log_matcher`). Per default, these
+categories are searched:
+
+*   **error** (critical): A severe server error.
+*   **oom** (critical): The JVM ran out of memory.
+*   **lag** (warning): *"Can't keep up! Is the server overloaded?"*
+
 Arguments
 ---------
 
@@ -62,17 +71,75 @@ are checked.
 
 .. option:: --test-log
 
-    Check if the logs contain an error.
+    Check if the logs contain an error. The test fails, if a *critical*
+    pattern matches a line in the log since the last start. The failure
+    message contains the counts of all matched categories.
+
+.. option:: --test-lag
+
+    Check if the server can keep up with the game ticks. The test fails, if
+    the log since the last start contains at least *--lag-threshold* lines
+    of the *lag* category.
+
+.. option:: --lag-threshold N
+
+    The number of *lag* lines, which fail the lag test (default: 10).
 
 .. option:: --test-port
 
-    Check if the world is reachable.
+    Check if the world is reachable and responding. The guard sends a
+    *Server List Ping* (the request of the multiplayer server list) to each
+    world, so that a hung server, which still accepts connections, is
+    detected too. The ping latency and the number of players are stored in
+    the guard's *ping.json* file.
+
+    The worlds are pinged concurrently.
+
+.. option:: --timeout SECONDS
+
+    The worlds are tested concurrently. If the tests of a world did not
+    finish after *SECONDS* seconds (default: 30), the world fails the
+    *timeout* test. This makes sure, that the guard finishes before the next
+    cron run, even if many worlds are not responding.
+
+.. option:: --watch
+
+    Runs the guard as resident watchdog, until it is interrupted (*Ctrl+C*
+    or *SIGINT*). Instead of polling, the guard waits for the exit of the
+    world processes (*pidfd*) and for appends to the server logs
+    (*inotify*), so crashes and errors are detected within seconds and the
+    guard uses almost no CPU while it is idle. All worlds are additionally
+    checked every minute.
+
+    Only new log lines are searched for errors and lag warnings, which are
+    counted until the guard reacts. Delayed restarts (see
+    *--restart-budget*) are performed as soon as they are allowed.
+
+    The EMSM lock is only held, while the guard reacts on an issue, so that
+    other EMSM commands can still be used.
+
+.. option:: --restart-budget N
+
+    If *--error-action* is *restart*, a world is restarted at most *N* times
+    (default: 3) within the *--restart-window*. Consecutive restarts are
+    delayed exponentially (5s, 10s, 20s, ... up to 10 minutes), so that
+    a world in a crash loop does not keep the host busy with starting JVMs.
+
+    When the budget is used up, the world is stopped and *quarantined*: The
+    guard does not restart it again, until you fixed and started the world
+    yourself.
+
+.. option:: --restart-window SECONDS
+
+    The time window of the *--restart-budget* (default: 3600).
 
 .. option:: --output-format {console, text}
 
     Defines the output format.
 
-    *text* is suitable for sending the guard output via email.
+    *text* is suitable for sending the guard output via email. With the
+    global ``--output json`` argument, the guard prints the test results and
+    the last server list ping of all worlds as one JSON document.
 
 .. option:: --output-only-new-warnings
 
@@ -93,6 +160,13 @@ This plugin is made for cron (therefore it does not print much):
     # Runs the guard every 5 minutes for the world *foo*.
     */5 * *   *   *   root minecraft -w foo guard --output-only-new-warnings --output-format text
 
+Alternatively, you can run the guard permanently in watch mode, e.g. as
+systemd service:
+
+.. code-block:: text
+
+    minecraft -W guard --watch --error-action restart
+
 Changelog
 ---------
 
@@ -116,12 +190,18 @@ Changelog
 
 # std
 import os
-import re
 import sys
+import copy
 import time
 import socket
 import logging
 import json
+import struct
+import asyncio
+import selectors
+import ctypes
+import ctypes.util
+import concurrent.futures
 
 # third party
 import termcolor
@@ -147,6 +227,28 @@ PLUGIN = "Guard"
 
 log = logging.getLogger(__file__)
 
+#: The maximum time in seconds waited for the response to a server list ping.
+PING_TIMEOUT = 5
+
+#: In watch mode, all worlds are checked at least every *WATCH_INTERVAL*
+#: seconds, even if no event occured.
+WATCH_INTERVAL = 60
+
+#: A restart is delayed, if the world has already been restarted within the
+#: restart window. The delay (seconds) is doubled with each restart, but
+#: stays between these bounds.
+RESTART_BACKOFF_MIN = 5
+RESTART_BACKOFF_MAX = 600
+
+#: The inotify events (see *inotify(7)*), which signal an append to a log.
+IN_MODIFY = 0x00000002
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+#: The protocol version sent in the server list ping handshake. *-1* is used
+#: by convention, if the client does not know the server version.
+PING_PROTOCOL_VERSION = -1
+
 
 # Exceptions
 # ------------------------------------------------
@@ -172,10 +274,26 @@ class TestFailure(Exception):
         return tmp
 
 
+class ServerNotReachable(Exception):
+    """
+    Raised by :func:`server_list_ping`, if no connection to the server
+    could be established.
+    """
+    pass
+
+
+class ServerNotResponding(Exception):
+    """
+    Raised by :func:`server_list_ping`, if the server accepts the connection,
+    but does not respond correctly to the ping.
+    """
+    pass
+
+
 # Functions
 # ------------------------------------------------
 
-def port_is_open(adr, timeout=1, attempts=1):
+def port_is_open(adr, timeout=1, attempts=1, deadline=None):
     """
     Returns `true` if the tcp address *ip*:*port* is reachable.
 
@@ -188,8 +306,14 @@ def port_is_open(adr, timeout=1, attempts=1):
         * attempts
             Number of port checks done until the *adr* is considered
             to be unreachable.
+        * deadline
+            If given, no new attempt is started after this point in time
+            (:func:`time.monotonic`).
     """
     for i in range(attempts):
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+
         s = socket.socket()
         s.settimeout(timeout)
         try:
@@ -203,9 +327,292 @@ def port_is_open(adr, timeout=1, attempts=1):
     return False
 
 
+def _pack_varint(value):
+    """
+    Encodes the integer *value* as varint of the minecraft protocol.
+    """
+    value &= 0xffffffff
+    data = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            data.append(byte | 0x80)
+        else:
+            data.append(byte)
+            return bytes(data)
+
+
+def _unpack_varint(data, offset=0):
+    """
+    Decodes the varint in *data* at *offset* and returns a tuple with its
+    value and the offset of the next byte.
+    """
+    value = 0
+    for i in range(5):
+        byte = data[offset + i]
+        value |= (byte & 0x7f) << 7*i
+        if not byte & 0x80:
+            return (value, offset + i + 1)
+    raise ValueError("varint is too long")
+
+
+def _pack_packet(packet_id, data=b""):
+    """
+    Returns the minecraft protocol packet with the id *packet_id*
+    and the payload *data*.
+    """
+    data = _pack_varint(packet_id) + data
+    return _pack_varint(len(data)) + data
+
+
+async def _read_varint(reader, data=b""):
+    """
+    Reads a varint from the stream *reader*. *data* contains the bytes of
+    the varint, which have already been read.
+    """
+    data = bytearray(data)
+    while not data or data[-1] & 0x80:
+        if len(data) >= 5:
+            raise ValueError("varint is too long")
+        data += await reader.readexactly(1)
+    return _unpack_varint(data)[0]
+
+
+async def _status_request(reader, writer, host, port):
+    """
+    Sends the handshake and the status request of the server list ping and
+    returns the parsed response.
+    """
+    host_data = host.encode("utf-8")
+    handshake = _pack_varint(PING_PROTOCOL_VERSION) \
+                + _pack_varint(len(host_data)) + host_data \
+                + struct.pack(">H", port) \
+                + _pack_varint(1)
+    writer.write(_pack_packet(0x00, handshake) + _pack_packet(0x00))
+    await writer.drain()
+    start = time.monotonic()
+
+    status = {
+        "latency": None, "players_online": None, "players_max": None,
+        "version": None
+        }
+
+    # Servers older than 1.7 do not understand the handshake and kick us
+    # with the legacy 0xff packet. They are responding though.
+    data = await reader.readexactly(1)
+    if data == b"\xff":
+        data += await reader.readexactly(1)
+        if data == b"\xff\x00":
+            status["latency"] = time.monotonic() - start
+            return status
+
+    length = await _read_varint(reader, data)
+    packet = await reader.readexactly(length)
+    status["latency"] = time.monotonic() - start
+
+    packet_id, offset = _unpack_varint(packet)
+    if packet_id != 0x00:
+        raise ValueError("unexpected packet id {}".format(packet_id))
+    length, offset = _unpack_varint(packet, offset)
+    response = json.loads(packet[offset:offset + length].decode("utf-8"))
+
+    players = response.get("players", dict())
+    status["players_online"] = players.get("online")
+    status["players_max"] = players.get("max")
+    status["version"] = response.get("version", dict()).get("name")
+    return status
+
+
+def _run_until_complete(coro):
+    """
+    Runs the coroutine *coro* in a new event loop and returns its result.
+
+    This is :func:`asyncio.run`, which is not available before Python 3.7.
+    The loop is also set as the current event loop, since the asyncio
+    functions of Python 3.5 and 3.6 do not use the running loop by default.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(coro)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+async def server_list_ping(host, port, timeout=PING_TIMEOUT):
+    """
+    Sends a *Server List Ping* to the minecraft server at *host*:*port* and
+    returns a dictionary with the *latency* (seconds), *players_online*,
+    *players_max* and the *version* name of the server. The player count
+    and the version are ``None`` for servers older than 1.7.
+
+    Unlike :func:`port_is_open`, this detects servers, which still accept
+    connections, but are hung.
+
+    :raises ServerNotReachable:
+        if no connection can be established.
+    :raises ServerNotResponding:
+        if the server does not respond correctly within *timeout* seconds.
+    """
+    deadline = time.monotonic() + timeout
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout
+            )
+    except (OSError, asyncio.TimeoutError) as err:
+        raise ServerNotReachable(err)
+
+    try:
+        return await asyncio.wait_for(
+            _status_request(reader, writer, host, port),
+            max(deadline - time.monotonic(), 0)
+            )
+    except asyncio.TimeoutError:
+        raise ServerNotResponding("no response after {}s".format(timeout))
+    except (OSError, EOFError, ValueError) as err:
+        raise ServerNotResponding(err)
+    finally:
+        writer.close()
+
+
 # Classes
 # ------------------------------------------------
 
+class Inotify(object):
+    """
+    A minimal wrapper around the Linux *inotify* API, which is not part of the
+    Python standard library.
+
+    :raises OSError:
+        if *inotify* is not available.
+    """
+
+    # struct inotify_event {int wd; uint32_t mask, cookie, len; char name[];}
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        """
+        """
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("the libc could not be found.")
+
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available.")
+
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        return None
+
+    def fileno(self):
+        """
+        Returns the file descriptor of the inotify instance.
+        """
+        return self._fd
+
+    def add_watch(self, path, mask):
+        """
+        Watches the file or directory *path* for the events in *mask* and
+        returns the watch descriptor.
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def read(self):
+        """
+        Returns a list with the pending events as tuples
+        ``(wd, mask, name)``.
+        """
+        try:
+            data = os.read(self._fd, 64*1024)
+        except BlockingIOError:
+            return list()
+
+        events = list()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        """
+        Closes the inotify instance.
+        """
+        os.close(self._fd)
+        return None
+
+
+class WatchedWorld(object):
+    """
+    The state of a world, which is monitored in watch mode.
+    """
+
+    def __init__(self, world):
+        """
+        """
+        self.world = world
+        self.log_path = world.log_path()
+
+        # Only log lines written after this offset are searched for errors.
+        self.log_offset = 0
+        self.log_inode = None
+        try:
+            stat = os.stat(self.log_path)
+        except (OSError, IOError):
+            pass
+        else:
+            self.log_offset = stat.st_size
+            self.log_inode = stat.st_ino
+
+        # The pidfd of the screen session, which runs the world.
+        self.pidfd = None
+
+        # The *lag* record (see LogMatcher.scan()) of the log lines since
+        # the last reaction.
+        self.lag = None
+
+        # The time of the delayed reaction (time.monotonic()).
+        self.next_reaction = None
+        self.pending_failure = None
+        return None
+
+    def read_log(self):
+        """
+        Returns the complete lines, which have been appended to the log
+        since the last call.
+        """
+        try:
+            with open(self.log_path, "rb") as file:
+                stat = os.fstat(file.fileno())
+
+                # The log has been rotated.
+                if stat.st_ino != self.log_inode \
+                   or stat.st_size < self.log_offset:
+                    self.log_inode = stat.st_ino
+                    self.log_offset = 0
+
+                file.seek(self.log_offset)
+                data = file.read()
+        except (OSError, IOError):
+            return str()
+
+        data = data[:data.rfind(b"\n") + 1]
+        self.log_offset += len(data)
+        return data.decode("utf-8", "replace")
+
+
 class Guard(BasePlugin):
 
     VERSION = "6.0.0-beta"
@@ -222,6 +629,10 @@ class Guard(BasePlugin):
         # in the guard database. Read more below.
         self._guard_db = None
         self._load_guard_db()
+
+        # The results of the last server list ping of each world.
+        self._ping_db = None
+        self._load_ping_db()
         return None
 
     def _setup_argparser(self):
@@ -251,6 +662,12 @@ class Guard(BasePlugin):
             dest = "guard_test_log",
             help = "Check if the logs contain an error."
             )
+        tests_group.add_argument(
+            "--test-lag",
+            action = "count",
+            dest = "guard_test_lag",
+            help = "Check if the server can keep up with the game ticks."
+            )
         tests_group.add_argument(
             "--test-port",
             action = "count",
@@ -258,6 +675,34 @@ class Guard(BasePlugin):
             help = "Check if the world's server is reachable."
             )
 
+        parser.add_argument(
+            "--lag-threshold",
+            action = "store",
+            type = int,
+            default = 10,
+            dest = "guard_lag_threshold",
+            metavar = "N",
+            help = "The number of lag warnings, which fail the lag test."
+            )
+
+        parser.add_argument(
+            "--timeout",
+            action = "store",
+            type = int,
+            default = 30,
+            dest = "guard_timeout",
+            metavar = "SECONDS",
+            help = "The maximum time for the tests of all worlds."
+            )
+
+        parser.add_argument(
+            "--watch",
+            action = "count",
+            dest = "guard_watch",
+            help = "Monitors the worlds permanently and reacts on crashes "\
+                   "and log errors within seconds."
+            )
+
         # Error action
         parser.add_argument(
             "--error-action",
@@ -267,6 +712,25 @@ class Guard(BasePlugin):
             dest = "guard_error_action",
             help = "Defines the reaction on detected errors."
             )
+        parser.add_argument(
+            "--restart-budget",
+            action = "store",
+            type = int,
+            default = 3,
+            dest = "guard_restart_budget",
+            metavar = "N",
+            help = "The maximum number of restarts within the restart window, "\
+                   "before a world is quarantined."
+            )
+        parser.add_argument(
+            "--restart-window",
+            action = "store",
+            type = int,
+            default = 3600,
+            dest = "guard_restart_window",
+            metavar = "SECONDS",
+            help = "The time window of the restart budget."
+            )
 
         # Output
         output_group = parser.add_argument_group(
@@ -302,13 +766,21 @@ class Guard(BasePlugin):
         {'myworld': {'failed_test': 'status',
                      'test_message': 'world is offline',
                      'time': 1418996881.327088,
-                     'warning_printed': False
+                     'warning_printed': False,
+                     'restarts': [1418996581.12, 1418996881.33],
+                     'quarantined': False,
+                     'pids': [4711]
                      }
          'world2': ...
         }
 
     A world is removed from this database, as soon as it is restarted or if
-    it passes all tests.
+    it passes all tests. Only the times of the recent restarts are kept, so
+    that a crash loop can be detected. In watch mode, *pids* are the pids of
+    the world after the guard reacted on the failure.
+
+    The watch mode does not hold the EMSM lock all the time, so it reloads
+    the database before each change.
     """
 
     def _guard_db_path(self):
@@ -322,15 +794,39 @@ class Guard(BasePlugin):
         try:
             with open(self._guard_db_path()) as file:
                 self._guard_db = json.load(file)
-        except (IOError, FileNotFoundError):
+        except (IOError, FileNotFoundError, ValueError):
             self._guard_db = dict()
         return None
 
     def _save_guard_db(self):
         """
         """
-        with open(self._guard_db_path(), "w") as file:
+        path = self._guard_db_path()
+        with open(path + ".tmp", "w") as file:
             json.dump(self._guard_db, file)
+        os.replace(path + ".tmp", path)
+        return None
+
+    def _ping_db_path(self):
+        """
+        """
+        return os.path.join(self.data_dir(), "ping.json")
+
+    def _load_ping_db(self):
+        """
+        """
+        try:
+            with open(self._ping_db_path()) as file:
+                self._ping_db = json.load(file)
+        except (IOError, FileNotFoundError, ValueError):
+            self._ping_db = dict()
+        return None
+
+    def _save_ping_db(self):
+        """
+        """
+        with open(self._ping_db_path(), "w") as file:
+            json.dump(self._ping_db, file)
         return None
 
     # World health checks
@@ -340,12 +836,17 @@ class Guard(BasePlugin):
     ``TestFailedError`` exception.
     """
 
-    def _test_status(self, world):
+    def _test_status(self, world, pids=None):
         """
         This test fails, if the world is offline or has been launched multiple
         times.
+
+        *pids* are the pids of the world's screen sessions from a
+        :meth:`WorldManager.status_all` snapshot. If ``None``, they are
+        queried.
         """
-        pids = world.pids()
+        if pids is None:
+            pids = world.pids()
 
         # Check if the world is offline.
         if len(pids) == 0:
@@ -358,22 +859,54 @@ class Guard(BasePlugin):
                 )
         return None
 
-    def _test_log(self, world):
+    def _test_log(self, world, report):
         """
         This test failes, if the log contains a severe error.
+
+        The *report* is the result of :meth:`emsm.core.logs.LogMatcher.scan`.
         """
-        # Search the log for error records.
-        error_re = world.server().log_error_re()
-        log = world.latest_log()
+        critical = [
+            category for category, record in report.items() \
+            if record["severity"] == "critical"
+            ]
+        if critical:
+            message = "; ".join(
+                "{} ({}x): {}".format(
+                    category, report[category]["count"],
+                    report[category]["line"].strip()
+                    ) \
+                for category in sorted(critical)
+                )
 
-        res = re.search(error_re, log)
-        if res:
-            raise TestFailure(world, "log", str(res))
+            # Mention the warnings too.
+            warnings = [
+                "{} ({}x)".format(category, record["count"]) \
+                for category, record in sorted(report.items()) \
+                if record["severity"] != "critical"
+                ]
+            if warnings:
+                message += "; " + ", ".join(warnings)
+            raise TestFailure(world, "log", message)
         return None
 
-    def _test_port(self, world):
+    def _test_lag(self, world, report, threshold):
         """
-        This test fails, if the world's port is not open.
+        This test fails, if the log contains at least *threshold* lines of
+        the *lag* category.
+        """
+        count = report.get("lag", dict()).get("count", 0)
+        if count >= threshold:
+            raise TestFailure(
+                world, "lag",
+                "the server can't keep up ({}x): {}"\
+                .format(count, report["lag"]["line"].strip())
+                )
+        return None
+
+    async def _test_port(self, world, deadline):
+        """
+        This test fails, if the world's port is not open or if the server
+        does not respond to a server list ping.
         """
         ip, port = world.address()
 
@@ -381,40 +914,158 @@ class Guard(BasePlugin):
         if port is None:
             log.warning("port test for '{}' could not be performed, since the "
                         "world's address could not be retrieved."
+                        .format(world.name())
                         )
-        # Check if we can create a connection to the address and raise an
-        # error if not.
-        elif not port_is_open((ip, port), timeout=1, attempts=5):
+            return None
+
+        timeout = min(PING_TIMEOUT, max(deadline - time.monotonic(), 0))
+        try:
+            status = await server_list_ping(ip or "localhost", port, timeout)
+        except ServerNotReachable:
             raise TestFailure(world, "port")
+        except ServerNotResponding as err:
+            raise TestFailure(
+                world, "port",
+                "accepting connections, but not responding ({})".format(err)
+                )
+
+        status["time"] = time.time()
+        self._ping_db[world.name()] = status
         return None
 
-    def _test(self, world, args):
+    async def _test_ports(self, worlds, deadline):
         """
-        Performs the via *args* selected tests on the world, to check if
-        everything works fine.
+        Runs the port test for all *worlds* concurrently in one event loop
+        and returns a dictionary, which maps the name of a world to the
+        :class:`TestFailure` or ``None``.
         """
-        # Todo: If the number of tests gets bigger, it would be wise
-        #       to replace this with loops.
+        async def test(world):
+            try:
+                await self._test_port(world, deadline)
+            except TestFailure as err:
+                return err
+            return None
 
-        do_all_tests = not (args.guard_test_status \
-                            or args.guard_test_log \
-                            or args.guard_test_port
-                            )
+        results = await asyncio.gather(*[test(world) for world in worlds])
+        return {world.name(): res for world, res in zip(worlds, results)}
+
+    def _selected_tests(self, args):
+        """
+        Returns the names of the tests selected via *args*.
+        """
+        tests = [
+            name for name in ("status", "log", "lag", "port") \
+            if getattr(args, "guard_test_" + name)
+            ]
+        return tests or ["status", "log", "lag", "port"]
+
+    def _test(self, world, tests, args, pids=None):
+        """
+        Performs the *status*, *log* and *lag* test on the world, if they
+        are in *tests*. The port test is performed by :meth:`_test_ports`.
 
-        if do_all_tests or args.guard_test_status:
-            self._test_status(world)
-        if do_all_tests or args.guard_test_log:
-            self._test_log(world)
-        if do_all_tests or args.guard_test_port:
-            self._test_port(world)
+        See also:
+            * _test_status()
+        """
+        if "status" in tests:
+            self._test_status(world, pids)
+
+        # The log and the lag test share one scan of the log.
+        if "log" in tests or "lag" in tests:
+            report = world.log_matcher().scan(world.latest_log())
+            if "log" in tests:
+                self._test_log(world, report)
+            if "lag" in tests:
+                self._test_lag(world, report, args.guard_lag_threshold)
         return None
 
+    def _test_all(self, worlds, args):
+        """
+        Tests all *worlds* concurrently and returns a dictionary, which maps
+        the name of a world to the :class:`TestFailure` or ``None``, if the
+        world passed all tests.
+
+        The status, log and lag tests run in a thread pool, while the port tests
+        run in an event loop in the main thread. Worlds, whose tests did not
+        finish until the *--timeout*, fail the *timeout* test.
+        """
+        deadline = time.monotonic() + args.guard_timeout
+        tests = self._selected_tests(args)
+
+        # The process table is only read once for all worlds.
+        status = self.app().worlds().status_all(worlds) \
+                 if "status" in tests else dict()
+
+        def test(world):
+            pids = status[world.name()]["pids"] if status else None
+            try:
+                self._test(world, tests, args, pids)
+            except TestFailure as err:
+                return err
+            return None
+
+        # We don't wait for the threads of hanging tests, when we leave this
+        # method. They are only joined, when the EMSM exits.
+        executor = concurrent.futures.ThreadPoolExecutor(max(len(worlds), 1))
+        try:
+            futures = {executor.submit(test, world): world for world in worlds}
+
+            port_results = dict()
+            if "port" in tests:
+                port_results = _run_until_complete(
+                    self._test_ports(worlds, deadline)
+                    )
+
+            done, not_done = concurrent.futures.wait(
+                futures, timeout=max(deadline - time.monotonic(), 0)
+                )
+        finally:
+            executor.shutdown(wait=False)
+
+        results = dict()
+        for future, world in futures.items():
+            if future in done:
+                results[world.name()] = future.result() \
+                                        or port_results.get(world.name())
+            else:
+                results[world.name()] = TestFailure(
+                    world, "timeout", "the tests did not finish in time"
+                    )
+        return results
+
     # Error reaction
 
+    def _recent_restarts(self, db_record, args):
+        """
+        Returns the times of the restarts within the restart window.
+        """
+        now = time.time()
+        return [
+            restart for restart in db_record.get("restarts", list()) \
+            if now - restart < args.guard_restart_window
+            ]
+
+    def _restart_delay(self, db_record, args):
+        """
+        Returns the number of seconds until the world may be restarted again.
+        The delay is doubled with each restart within the restart window.
+        """
+        restarts = self._recent_restarts(db_record, args)
+        if not restarts:
+            return 0
+
+        delay = min(
+            RESTART_BACKOFF_MIN*2**(len(restarts) - 1), RESTART_BACKOFF_MAX
+            )
+        return max(restarts[-1] + delay - time.time(), 0)
+
     def _handle_error(self, world, args):
         """
         The *world* is in trouble. This method reacts on the world's issues
         with the defined *errro_action* in *args*.
+
+        Returns ``False``, if the restart has been delayed by the crash-loop
+        backoff and should be tried again later.
         """
         # I assume, that no error happens here.
         if args.guard_error_action == "none":
@@ -422,18 +1073,35 @@ class Guard(BasePlugin):
         elif args.guard_error_action == "stop":
             world.stop(force_stop=True)
         elif args.guard_error_action == "restart":
+            db_record = self._guard_db[world.name()]
+            if db_record.get("quarantined"):
+                return True
+
+            # Quarantine the world, if the restart budget is used up.
+            restarts = self._recent_restarts(db_record, args)
+            if len(restarts) >= args.guard_restart_budget:
+                log.warning("the world '{}' has been restarted {} times "\
+                            "within {}s and is quarantined."\
+                            .format(world.name(), len(restarts),
+                                    args.guard_restart_window))
+                db_record["quarantined"] = True
+                world.stop(force_stop=True)
+                return True
+
+            if self._restart_delay(db_record, args) > 0:
+                return False
+
             world.restart(force_restart=True)
-        return None
+            db_record["restarts"] = restarts + [time.time()]
+        return True
 
-    def _guard(self, world, args):
+    def _guard(self, world, args, failure):
         """
-        Tests if the world is in trouble. Reacts if necessary on issues and
-        saves information about the world's status in the guard database.
+        Reacts if necessary on the *failure* of the world's tests and saves
+        information about the world's status in the guard database.
         """
-        try:
-            self._test(world, args)
-        except TestFailure as err:
-            log.warning(err)
+        if failure is not None:
+            log.warning(failure)
 
             # Note, that *db_record* is actually a reference and not only
             # a copy.
@@ -441,22 +1109,28 @@ class Guard(BasePlugin):
             self._guard_db[world.name()] = db_record
 
             # Handle the error, if we did not react earlier on it
-            # or if the error_action changed.
-            if db_record.get("error_action") is None \
-               or db_record.get("error_action") != args.guard_error_action:
-                self._handle_error(world, args)
+            # or if the error_action changed. A delayed restart is tried
+            # again in the next run.
+            if db_record.get("error_action") != args.guard_error_action:
+                if self._handle_error(world, args):
+                    db_record["error_action"] = args.guard_error_action
+                else:
+                    db_record["error_action"] = None
 
             # Update the guard database.
-            db_record["failed_test"] = err.test_name
-            db_record["test_message"] = err.message
+            db_record["failed_test"] = failure.test_name
+            db_record["test_message"] = failure.message
             db_record["test_time"] = time.time()
-            db_record["error_action"] = args.guard_error_action
             db_record["warning_printed"] = db_record.get("warning_printed", False)
         else:
             # The world is running fine. So we can remove it from the
-            # error database, if it was registered.
-            if world.name() in self._guard_db:
-                self._guard_db.pop(world.name())
+            # error database, if it was registered. Only the recent restarts
+            # are kept to detect crash loops.
+            db_record = self._guard_db.pop(world.name(), None)
+            if db_record is not None:
+                restarts = self._recent_restarts(db_record, args)
+                if restarts:
+                    self._guard_db[world.name()] = {"restarts": restarts}
         return None
 
     # Output
@@ -471,6 +1145,8 @@ class Guard(BasePlugin):
         print("test_message: ", db_record["test_message"])
         print("test_time:    ", time.ctime(db_record["test_time"]))
         print("error_action: ", db_record["error_action"])
+        if db_record.get("quarantined"):
+            print("quarantined:   yes")
         print()
         print()
         return None
@@ -483,6 +1159,8 @@ class Guard(BasePlugin):
         print("\t", "test_message: ", db_record["test_message"])
         print("\t", "test_time:    ", time.ctime(db_record["test_time"]))
         print("\t", "error_action: ", db_record["error_action"])
+        if db_record.get("quarantined"):
+            print("\t", "quarantined:   ", termcolor.colored("yes", "red"))
         return None
 
     def _print_status(self, world, args):
@@ -492,9 +1170,18 @@ class Guard(BasePlugin):
         # Get the status report without altering the database.
         db_record = self._guard_db.get(world.name())
 
+        # The JSON output contains the status of all worlds.
+        output = self.app().output()
+        if output.is_json():
+            data = {"failed_test": None}
+            data.update(db_record or dict())
+            data["ping"] = self._ping_db.get(world.name())
+            output.add("guard", world.name(), data)
+            return None
+
         # Break, if the world is not in trouble.
         # (This means that no records exists.)
-        if db_record is None:
+        if db_record is None or "failed_test" not in db_record:
             return None
 
         # Break, if we should not print the same warning twice.
@@ -512,18 +1199,246 @@ class Guard(BasePlugin):
         db_record["warning_printed"] = True
         return None
 
+    # Watch mode
+
+    def _watch_process(self, selector, watched):
+        """
+        Registers a pidfd for the screen session of the *watched* world in
+        the *selector*, so that we get notified, when the world stops.
+        """
+        if watched.pidfd is not None or not hasattr(os, "pidfd_open"):
+            return None
+
+        pids = watched.world.pids()
+        if not pids:
+            return None
+
+        try:
+            watched.pidfd = os.pidfd_open(pids[0])
+        except (OSError, IOError) as err:
+            log.warning("could not open a pidfd for '{}': {}"\
+                        .format(watched.world.name(), err))
+            return None
+        selector.register(watched.pidfd, selectors.EVENT_READ, watched)
+        return None
+
+    def _watch_check(self, watched, args, test_status=True, pids=None):
+        """
+        Checks the *watched* world for new log errors and, if *test_status*
+        is true, if it is still running. Reacts on issues.
+
+        *pids* is passed to :meth:`_test_status`.
+
+        Returns ``True``, if the record of the world in the guard database
+        has been changed.
+        """
+        world = watched.world
+        old_record = copy.deepcopy(self._guard_db.get(world.name()))
+
+        report = world.log_matcher().scan(watched.read_log())
+
+        # The lag warnings are counted until the guard reacts.
+        if "lag" in report:
+            if watched.lag is None:
+                watched.lag = report["lag"]
+            else:
+                watched.lag["count"] += report["lag"]["count"]
+
+        try:
+            self._test_log(world, report)
+            if test_status:
+                self._test_status(world, pids)
+            if watched.lag is not None:
+                self._test_lag(
+                    world, {"lag": watched.lag}, args.guard_lag_threshold
+                    )
+        except TestFailure as err:
+            failure = err
+        else:
+            failure = watched.pending_failure
+
+        if failure is None:
+            self._guard(world, args, None)
+            return self._guard_db.get(world.name()) != old_record
+
+        # Wait for the delayed reaction.
+        if watched.next_reaction is not None \
+           and time.monotonic() < watched.next_reaction:
+            return False
+
+        # In watch mode, we react on each new issue and not only once. New
+        # log errors and lag warnings are always new issues. A status failure
+        # is only new, if the world has been running after the last
+        # reaction. Otherwise, a world which is offline (e.g. stopped or
+        # quarantined), would be handled again on every check.
+        db_record = self._guard_db.get(world.name())
+        if db_record is not None and db_record.get("error_action") is not None:
+            if failure.test_name == "status" and not db_record.get("pids"):
+                return False
+            db_record.pop("error_action", None)
+            db_record["warning_printed"] = False
+
+        self._guard(world, args, failure)
+        self._print_status(world, args)
+        sys.stdout.flush()
+
+        db_record = self._guard_db[world.name()]
+        db_record["pids"] = world.pids()
+
+        # If the restart has been delayed, we check the world again, as soon
+        # as the restart is allowed. The log lines have already been read, so
+        # we must remember a log error.
+        db_record = self._guard_db[world.name()]
+        if db_record.get("error_action") is None:
+            delay = self._restart_delay(db_record, args)
+            log.info("delaying the reaction on '{}' by {:.0f}s."\
+                     .format(world.name(), delay))
+            watched.next_reaction = time.monotonic() + delay
+            if failure.test_name == "log":
+                watched.pending_failure = failure
+        else:
+            watched.next_reaction = None
+            watched.pending_failure = None
+            watched.lag = None
+        return self._guard_db.get(world.name()) != old_record
+
+    def _watch(self, worlds, args):
+        """
+        Monitors the *worlds* until the guard is interrupted.
+
+        See also:
+            * _watch_check()
+        """
+        watched_worlds = {world.name(): WatchedWorld(world) for world in worlds}
+        selector = selectors.DefaultSelector()
+
+        # Watch the log directories for appends and rotations.
+        log_watches = dict()
+        try:
+            inotify = Inotify()
+        except OSError as err:
+            log.warning("inotify is not available, the logs are checked "\
+                        "every {}s: {}".format(WATCH_INTERVAL, err))
+            inotify = None
+        else:
+            selector.register(inotify, selectors.EVENT_READ, None)
+            for watched in watched_worlds.values():
+                try:
+                    wd = inotify.add_watch(
+                        os.path.dirname(watched.log_path),
+                        IN_MODIFY | IN_CREATE | IN_MOVED_TO
+                        )
+                except OSError as err:
+                    log.warning(err)
+                else:
+                    log_watches.setdefault(wd, list()).append(watched)
+
+        for watched in watched_worlds.values():
+            self._watch_process(selector, watched)
+
+        # We only hold the EMSM lock, when we react on an issue.
+        lock = self.app().lock()
+        lock.release()
+
+        # All worlds are checked every WATCH_INTERVAL seconds, even if the
+        # logs are appended all the time.
+        last_full_check = time.monotonic()
+        try:
+            while True:
+                timeout = last_full_check + WATCH_INTERVAL - time.monotonic()
+                for watched in watched_worlds.values():
+                    if watched.next_reaction is not None:
+                        timeout = min(
+                            timeout, watched.next_reaction - time.monotonic()
+                            )
+                events = selector.select(max(timeout, 0))
+
+                # Maps the name of the worlds, which must be checked, to
+                # *True*, if the status must be checked too. (Log appends are
+                # frequent, so we don't call *screen* for each of them.)
+                due = dict()
+                for key, mask in events:
+                    if key.data is None:
+                        for wd, event_mask, name in inotify.read():
+                            for watched in log_watches.get(wd, list()):
+                                if name == os.path.basename(watched.log_path):
+                                    due.setdefault(watched.world.name(), False)
+                    else:
+                        watched = key.data
+                        selector.unregister(watched.pidfd)
+                        os.close(watched.pidfd)
+                        watched.pidfd = None
+                        due[watched.world.name()] = True
+
+                # Check all worlds periodically.
+                now = time.monotonic()
+                if now - last_full_check >= WATCH_INTERVAL:
+                    due = dict.fromkeys(watched_worlds.keys(), True)
+                    last_full_check = now
+
+                # Check the worlds, whose delayed reaction is due.
+                for name, watched in watched_worlds.items():
+                    if watched.next_reaction is not None \
+                       and now >= watched.next_reaction:
+                        due[name] = True
+
+                # The process table is only read once for all worlds.
+                status_worlds = [
+                    watched_worlds[name].world \
+                    for name, test_status in due.items() if test_status
+                    ]
+                status = dict()
+                if status_worlds:
+                    with lock:
+                        status = self.app().worlds().status_all(status_worlds)
+
+                for name, test_status in sorted(due.items()):
+                    watched = watched_worlds[name]
+                    pids = status[name]["pids"] if name in status else None
+                    with lock:
+                        # Other EMSM runs may have changed the database,
+                        # while we did not hold the lock.
+                        self._load_guard_db()
+                        changed = self._watch_check(
+                            watched, args, test_status, pids
+                            )
+                        self._watch_process(selector, watched)
+                        if changed:
+                            self._save_guard_db()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            lock.acquire()
+
+            for watched in watched_worlds.values():
+                if watched.pidfd is not None:
+                    os.close(watched.pidfd)
+            if inotify is not None:
+                inotify.close()
+            selector.close()
+        return None
+
     # --
 
     def run(self, args):
         """
         """
-        # Run the guard for all selected worlds in alphabetical order.
+        # Test all selected worlds concurrently, but handle the results
+        # in alphabetical order.
         worlds = self.app().worlds().get_selected()
         worlds.sort(key = lambda w: w.name())
+
+        # The watch mode saves all changes immediately.
+        if args.guard_watch:
+            self._watch(worlds, args)
+            return None
+
+        results = self._test_all(worlds, args)
         for world in worlds:
-            self._guard(world, args)
+            self._guard(world, args, results[world.name()])
             self._print_status(world, args)
 
         # Save any changes made during the run.
         self._save_guard_db()
+        self._save_ping_db()
         return None
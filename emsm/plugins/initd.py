@@ -337,9 +337,11 @@ class InitD(BasePlugin):
         ok_msg = "[ {status} ] the minecraft world '{{world_name}}' is online."\
                  .format(status=termcolor.colored("ok  ", "green"))
 
-        # Print the status the worlds.
-        for world in self._initd_worlds():
-            if world.is_online():
+        # Print the status the worlds. The process table is only read once.
+        worlds = self._initd_worlds()
+        status = self.app().worlds().status_all(worlds)
+        for world in worlds:
+            if status[world.name()]["online"]:
                 print(ok_msg.format(world_name=world.name()))
             else:
                 print(fail_msg.format(world_name=world.name()))
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2018 <see AUTHORS.txt>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+About
+-----
+
+Exports metrics about the worlds, the guard and the backups for the
+`textfile collector <https://github.com/prometheus/node_exporter#textfile-collector>`_
+of the Prometheus *node_exporter*.
+
+The metrics file is written atomically at the end of **each** EMSM run, so
+it's always up to date. The metrics are computed from data, which already
+exists (the guard database, the backup indexes, the world processes), so
+no plugin must be run for them.
+
+Download
+--------
+
+You can find the latest version of this plugin in the EMSM
+`GitHub repository <https://github.com/benediktschmitt/emsm>`_.
+
+Configuration
+-------------
+
+main.conf
+^^^^^^^^^
+
+.. code-block:: ini
+
+    [prometheus]
+    textfile = /var/lib/node_exporter/textfile_collector/emsm.prom
+
+**textfile**
+
+    The path of the metrics file. If empty (default), the file is written
+    into the plugin's data directory.
+
+Metrics
+-------
+
+All world metrics have a *world* label.
+
+*   **emsm_world_online**: 1, if the world is online.
+*   **emsm_world_uptime_seconds**: The uptime of the Java process.
+*   **emsm_world_cpu_seconds_total**: The CPU time of the Java process.
+*   **emsm_world_memory_rss_bytes**: The resident memory of the Java process.
+*   **emsm_world_threads**: The threads of the Java process.
+*   **emsm_guard_test_failed**: 1 for the test (label *test*), which failed
+    in the last guard run.
+*   **emsm_guard_quarantined**: 1, if the guard quarantined the world.
+*   **emsm_guard_recent_restarts**: The restarts by the guard in the restart
+    window.
+*   **emsm_guard_ping_latency_seconds**, **emsm_guard_players_online**: The
+    result of the last server list ping by the guard.
+*   **emsm_backup_count**, **emsm_backup_size_bytes_total**: The backups of
+    the world.
+*   **emsm_backup_last_timestamp_seconds**,
+    **emsm_backup_last_size_bytes**, **emsm_backup_last_duration_seconds**:
+    The latest backup.
+*   **emsm_command_duration_seconds**,
+    **emsm_command_last_run_timestamp_seconds**: The duration and time of
+    the last EMSM run of each plugin (label *plugin*).
+
+Arguments
+---------
+
+This plugin has no arguments. If you only want to update the metrics, run:
+
+.. code-block:: bash
+
+    $ minecraft prometheus
+
+Examples
+--------
+
+.. code-block:: text
+
+    # m h dom mon dow user command
+    # Update the metrics every minute, even if no other EMSM command runs.
+    * * * * * root minecraft prometheus
+"""
+
+
+# Modules
+# ------------------------------------------------
+
+# std
+import os
+import time
+import datetime
+import json
+import logging
+
+# local
+import emsm
+from emsm.core.base_plugin import BasePlugin
+
+
+# Data
+# ------------------------------------------------
+
+PLUGIN = "Prometheus"
+
+log = logging.getLogger(__file__)
+
+# The HELP and TYPE of each exported metric.
+METRICS = [
+    ("emsm_world_online", "gauge", "1, if the world is online."),
+    ("emsm_world_uptime_seconds", "gauge", "The uptime of the world's Java process."),
+    ("emsm_world_cpu_seconds_total", "counter", "The CPU time of the world's Java process."),
+    ("emsm_world_memory_rss_bytes", "gauge", "The resident memory of the world's Java process."),
+    ("emsm_world_threads", "gauge", "The number of threads of the world's Java process."),
+    ("emsm_guard_test_failed", "gauge", "1 for the guard test, which failed in the last run."),
+    ("emsm_guard_quarantined", "gauge", "1, if the guard quarantined the world."),
+    ("emsm_guard_recent_restarts", "gauge", "The restarts by the guard within the restart window."),
+    ("emsm_guard_ping_latency_seconds", "gauge", "The latency of the last server list ping."),
+    ("emsm_guard_players_online", "gauge", "The online players reported by the last server list ping."),
+    ("emsm_backup_count", "gauge", "The number of backups of the world."),
+    ("emsm_backup_size_bytes_total", "gauge", "The size of all backups of the world."),
+    ("emsm_backup_last_timestamp_seconds", "gauge", "The creation time of the latest backup."),
+    ("emsm_backup_last_size_bytes", "gauge", "The size of the latest backup."),
+    ("emsm_backup_last_duration_seconds", "gauge", "The time needed to create the latest backup."),
+    ("emsm_command_duration_seconds", "gauge", "The duration of the last EMSM run of a plugin."),
+    ("emsm_command_last_run_timestamp_seconds", "gauge", "The time of the last EMSM run of a plugin."),
+    ]
+
+
+# Functions
+# ------------------------------------------------
+
+def _escape(value):
+    """
+    Escapes a label value for the Prometheus text format.
+    """
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n")\
+                     .replace("\"", "\\\"")
+
+
+# Classes
+# ------------------------------------------------
+
+class Prometheus(BasePlugin):
+
+    VERSION = "6.0.0-beta"
+
+    DESCRIPTION = __doc__
+
+    # The metrics should be collected after all other plugins finished.
+    FINISH_PRIORITY = 100
+
+    def __init__(self, app, name):
+        """
+        """
+        BasePlugin.__init__(self, app, name)
+
+        # We measure the duration of the EMSM run from here.
+        self._start_time = time.monotonic()
+
+        self._setup_conf()
+        self._setup_argparser()
+        return None
+
+    def _setup_conf(self):
+        """
+        Loads the configuration.
+        """
+        conf = self.global_conf()
+
+        self._textfile = conf.get("textfile", "")
+        conf["textfile"] = self._textfile
+        return None
+
+    def _setup_argparser(self):
+        """
+        Sets the argument parser up.
+        """
+        parser = self.argparser()
+        parser.description = "Exports metrics for the Prometheus node_exporter."
+        return None
+
+    def textfile(self):
+        """
+        Returns the path of the metrics file.
+        """
+        if self._textfile:
+            return self._textfile
+        return os.path.join(self.data_dir(), "emsm.prom")
+
+    # Collectors
+
+    """
+    Each collector returns a list of ``(metric, labels, value)`` samples.
+    """
+
+    def _collect_worlds(self):
+        """
+        Returns the samples of the world processes.
+        """
+        worlds = self.app().worlds()
+        status = worlds.status_all()
+
+        samples = list()
+        for world in worlds.get_all():
+            labels = {"world": world.name()}
+
+            pids = status[world.name()]["pids"]
+            samples.append(("emsm_world_online", labels, int(bool(pids))))
+            if not pids:
+                continue
+
+            process = emsm.core.resources.read_process(
+                emsm.core.resources.find_java_pid(pids[0])
+                )
+            if process is None:
+                continue
+
+            samples.extend([
+                ("emsm_world_uptime_seconds", labels,
+                 time.time() - process["start_time"]),
+                ("emsm_world_cpu_seconds_total", labels, process["cpu_time"]),
+                ("emsm_world_memory_rss_bytes", labels, process["rss"]),
+                ("emsm_world_threads", labels, process["threads"])
+                ])
+        return samples
+
+    def _collect_guard(self):
+        """
+        Returns the samples of the guard database and the last server list
+        pings.
+        """
+        guard = self.app().plugins().get_plugin("guard")
+        if guard is None:
+            return list()
+
+        samples = list()
+        for name, record in sorted(guard._guard_db.items()):
+            labels = {"world": name}
+            if "failed_test" in record:
+                samples.append((
+                    "emsm_guard_test_failed",
+                    dict(labels, test=record["failed_test"]), 1
+                    ))
+            samples.append((
+                "emsm_guard_quarantined", labels,
+                int(bool(record.get("quarantined")))
+                ))
+            samples.append((
+                "emsm_guard_recent_restarts", labels,
+                len(record.get("restarts", list()))
+                ))
+
+        for name, record in sorted(guard._ping_db.items()):
+            labels = {"world": name}
+            if record.get("latency") is not None:
+                samples.append((
+                    "emsm_guard_ping_latency_seconds", labels, record["latency"]
+                    ))
+            if record.get("players_online") is not None:
+                samples.append((
+                    "emsm_guard_players_online", labels,
+                    record["players_online"]
+                    ))
+        return samples
+
+    def _collect_backups(self):
+        """
+        Returns the samples of the backup indexes.
+
+        The indexes are only read. Worlds without a backup index are
+        skipped, so that the export does not create any files.
+        """
+        backups = self.app().plugins().get_plugin("backups")
+        if backups is None:
+            return list()
+
+        samples = list()
+        for world in self.app().worlds().get_all():
+            labels = {"world": world.name()}
+
+            index = backups.backup_index(world)
+            if index is None:
+                continue
+
+            samples.append(("emsm_backup_count", labels, len(index)))
+            samples.append((
+                "emsm_backup_size_bytes_total", labels,
+                sum(info["size"] for info in index.values())
+                ))
+            if not index:
+                continue
+
+            info = max(index.values(), key=lambda info: info["date"])
+            date = datetime.datetime(*info["date"])
+            samples.append((
+                "emsm_backup_last_timestamp_seconds", labels, date.timestamp()
+                ))
+            samples.append(("emsm_backup_last_size_bytes", labels, info["size"]))
+            if info.get("duration") is not None:
+                samples.append((
+                    "emsm_backup_last_duration_seconds", labels,
+                    info["duration"]
+                    ))
+        return samples
+
+    def _collect_commands(self):
+        """
+        Returns the samples of the EMSM runs.
+
+        The duration of the last run of each plugin is stored in the
+        plugin's data directory.
+        """
+        path = os.path.join(self.data_dir(), "commands.json")
+        try:
+            with open(path) as file:
+                commands = json.load(file)
+        except (OSError, IOError, ValueError):
+            commands = dict()
+
+        plugin = self.app().argparser().args().plugin or ""
+        commands[plugin] = {
+            "duration": time.monotonic() - self._start_time,
+            "time": time.time()
+            }
+        with open(path, "w") as file:
+            json.dump(commands, file)
+
+        samples = list()
+        for plugin, record in sorted(commands.items()):
+            labels = {"plugin": plugin}
+            samples.append((
+                "emsm_command_duration_seconds", labels, record["duration"]
+                ))
+            samples.append((
+                "emsm_command_last_run_timestamp_seconds", labels,
+                record["time"]
+                ))
+        return samples
+
+    # Export
+
+    def _format(self, samples):
+        """
+        Returns the *samples* in the Prometheus text format.
+        """
+        by_metric = dict()
+        for metric, labels, value in samples:
+            by_metric.setdefault(metric, list()).append((labels, value))
+
+        lines = list()
+        for metric, metric_type, help_ in METRICS:
+            if metric not in by_metric:
+                continue
+
+            lines.append("# HELP {} {}".format(metric, help_))
+            lines.append("# TYPE {} {}".format(metric, metric_type))
+            for labels, value in by_metric[metric]:
+                labels = ",".join(
+                    "{}=\"{}\"".format(key, _escape(label)) \
+                    for key, label in sorted(labels.items())
+                    )
+                lines.append("{}{{{}}} {}".format(metric, labels, float(value)))
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """
+        Collects all metrics and writes them atomically into :meth:`textfile`.
+        """
+        samples = list()
+        for collect in (self._collect_worlds, self._collect_guard,
+                        self._collect_backups, self._collect_commands):
+            try:
+                samples.extend(collect())
+            except Exception as err:
+                log.exception(err)
+
+        # The node_exporter must never read a partially written file.
+        # A failed export (e.g. a missing textfile directory) must not
+        # break the EMSM run.
+        path = self.textfile()
+        try:
+            with open(path + ".tmp", "w") as file:
+                file.write(self._format(samples))
+            os.replace(path + ".tmp", path)
+        except OSError as err:
+            log.error("could not export the metrics to '{}': {}"\
+                      .format(path, err))
+            try:
+                os.remove(path + ".tmp")
+            except OSError:
+                pass
+        return None
+
+    def run(self, args):
+        """
+        """
+        # The metrics are exported in finish().
+        return None
+
+    def finish(self):
+        """
+        Exports the metrics at the end of each EMSM run.
+        """
+        self.export()
+        return None
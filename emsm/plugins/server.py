@@ -43,12 +43,26 @@ Configuration
     [server]
     update_message = The server is going down for an update.
         Come back soon.
+    update_batch_size = 1
+    update_ready_timeout = 300
 
 **update_message**
 
     Message sent to a world before stopping the world due to an server
     update.
 
+**update_batch_size**
+
+    The number of worlds, which are restarted at the same time after an
+    update.
+
+**update_ready_timeout**
+
+    The seconds the EMSM waits for a restarted batch of worlds to become
+    ready (the log contains the *Done* message or the port accepts
+    connections). If a world does not become ready, the update is aborted
+    and the remaining worlds keep running the old version.
+
 Arguments
 ---------
 
@@ -58,15 +72,48 @@ Arguments
 
 .. option:: --usage
 
-    Prints the names of the worlds, powered by a server.
+    Prints the names of the worlds, powered by a server. Supports the global
+    ``--output json`` argument.
 
 .. option:: --list
 
     Prints the names of all server supported by the EMSM.
 
+.. option:: --install-missing
+
+    Installs the server software of all worlds, which is not installed yet,
+    and prints the time each installation took. The downloads run at the
+    same time, while at most *max_parallel_builds* (see :file:`main.conf`)
+    server are built at the same time. Useful, when a new host is set up.
+    Supports the global ``--output json`` argument.
+
 .. option:: --update
 
-    Updates the server software.
+    Updates the server software. The worlds are only stopped and restarted,
+    if the downloaded server software differs from the installed one.
+
+    The new version is installed into a new directory, while the worlds keep
+    running. Afterwards, the worlds are stopped and restarted with the new
+    version in batches of *update_batch_size* worlds, so each world is only
+    down for one restart. The next batch is only restarted, when all worlds
+    of the current batch are ready. If the installation fails, nothing is
+    changed.
+
+Downloads
+---------
+
+The downloaded server software is cached in the :file:`downloads` directory
+of the instance folder. When a server is updated, the EMSM sends a
+conditional request (*ETag*, *Last-Modified*), so the file is only
+transferred again, if it has been changed.
+
+The downloads can be verified against the *sha1* or *sha256* hash in the
+:file:`server.conf` configuration file:
+
+.. code-block:: ini
+
+    [vanilla 1.12]
+    sha1 = 886945bfb2b978778c3a0288fd7fab09d315b25f
 """
 
 
@@ -76,6 +123,7 @@ Arguments
 # std
 import os
 import sys
+import time
 import logging
 
 # third party
@@ -123,6 +171,12 @@ class Server(BasePlugin):
             "The server is going down for an update.\nCome back soon."
             )
         conf["update_message"] = self._update_message
+
+        self._update_batch_size = max(conf.getint("update_batch_size", 1), 1)
+        conf["update_batch_size"] = str(self._update_batch_size)
+
+        self._update_ready_timeout = conf.getint("update_ready_timeout", 300)
+        conf["update_ready_timeout"] = str(self._update_ready_timeout)
         return None
 
     def _setup_argparser(self):
@@ -147,6 +201,13 @@ class Server(BasePlugin):
             dest = "server_list",
             help = "Prints the names of all server supported by the EMSM."
             )
+        me_group.add_argument(
+            "--install-missing",
+            action = "count",
+            dest = "server_install_missing",
+            help = "Installs the missing server software of all worlds "\
+                   "at the same time and prints the timings."
+            )
         me_group.add_argument(
             "--update",
             action = "count",
@@ -160,33 +221,53 @@ class Server(BasePlugin):
         """
         if args.server_list:
             self._print_list()
+        elif args.server_install_missing:
+            self._install_missing()
 
         else:
             # Sort the server by their names, before running.
             sel_server = self.app().server().get_selected()
             sel_server.sort(key = lambda s: s.name())
 
+            # The status of all worlds is queried at once.
+            status = self.app().worlds().status_all() if args.server_usage \
+                     else dict()
+
             for server in sel_server:
                 if args.server_usage:
-                    self._print_usage(server)
+                    self._print_usage(server, status)
                 elif args.server_update:
                     self._update_server(server)
         return None
 
-    def _print_usage(self, server):
+    def _print_usage(self, server, status=None):
         """
         Prints all worlds that are powered by the server *server*.
+
+        *status* is the result of :meth:`WorldManager.status_all`. If it is
+        ``None``, the status of the worlds is queried.
         """
         # Get all worlds powered by this server and sort them.
         worlds = self.app().worlds().get_by_pred(
             lambda w: w.server() is server
             )
-        online_worlds = list(filter(lambda w: w.is_online(), worlds))
+        if status is None:
+            status = self.app().worlds().status_all(worlds)
+
+        online_worlds = [w for w in worlds if status[w.name()]["online"]]
         online_worlds.sort(key = lambda w: w.name())
 
-        offline_worlds = list(filter(lambda w: w.is_offline(), worlds))
+        offline_worlds = [w for w in worlds if not status[w.name()]["online"]]
         offline_worlds.sort(key = lambda w: w.name())
 
+        output = self.app().output()
+        if output.is_json():
+            output.add("server", server.name(), {
+                "online_worlds": [world.name() for world in online_worlds],
+                "offline_worlds": [world.name() for world in offline_worlds]
+                })
+            return None
+
         # Print the worlds grouped by their current status (offline/online).
         print(termcolor.colored("{}:".format(server.name()), "cyan"))
         print("\t", "* {} worlds".format(len(worlds)))
@@ -209,10 +290,56 @@ class Server(BasePlugin):
         names = self.app().server().get_names()
         names.sort()
 
+        output = self.app().output()
+        if output.is_json():
+            for name in names:
+                output.add("server", name, {"supported": True})
+            return None
+
         for name in names:
             print("* {}".format(name))
         return None
 
+    def _install_missing(self):
+        """
+        Installs the server software, which is used by the worlds, but not
+        installed yet, and prints the time each installation took.
+
+        The EMSM already installs the missing server during its start, so
+        these installations are reported too.
+
+        See also:
+            * ServerManager.install_all()
+        """
+        server = set(world.server() for world in self.app().worlds().get_all())
+        self.app().server().install_all(server)
+        report = self.app().server().install_report()
+
+        output = self.app().output()
+        if output.is_json():
+            for name, result in report.items():
+                output.add("server", name, {"install": {
+                    "seconds": result["seconds"],
+                    "error": None if result["error"] is None \
+                             else str(result["error"])
+                    }})
+            return None
+
+        if not report:
+            print("all server software is installed.")
+            return None
+
+        for name, result in sorted(report.items()):
+            print(termcolor.colored("{}:".format(name), "cyan"))
+            if result["error"] is None:
+                print("\t", termcolor.colored("installed", "green"),
+                      "in {:.1f}s".format(result["seconds"]))
+            else:
+                print("\t", termcolor.colored("error:", "red"),
+                      result["error"],
+                      "({:.1f}s)".format(result["seconds"]))
+        return None
+
     def _update_server(self, server):
         """
         Updates the server *server*.
@@ -222,48 +349,150 @@ class Server(BasePlugin):
         """
         print(termcolor.colored("{}:".format(server.name()), "cyan"))
 
+        # Nothing to do, if the download has not been changed. (The download
+        # is cached, so the reinstallation does not transfer it again.)
+        try:
+            up_to_date = server.is_up_to_date()
+        except emsm.core.server.ServerInstallationFailure as err:
+            print("\t", termcolor.colored("error:", "red"), err)
+            log.exception(err)
+            return None
+
+        if up_to_date:
+            print("\t", "the server is already up to date.")
+            return None
+
+        # Install the new version next to the current one, while the worlds
+        # keep running. If this fails, nothing has been changed.
+        print("\t", "installing the new server version ...")
+        try:
+            staging_dir = server.stage_install()
+        except emsm.core.server.ServerInstallationFailure as err:
+            print("\t", termcolor.colored("error:", "red"), err)
+            log.exception(err)
+            return None
+
         # Get all worlds, that are currently running the server.
-        worlds = self.app().worlds().get_by_pred(
-            lambda w: w.server() is server and w.is_online()
-            )
+        worlds = self.app().worlds().get_by_pred(lambda w: w.server() is server)
+        status = self.app().worlds().status_all(worlds)
+        worlds = [world for world in worlds if status[world.name()]["online"]]
         worlds.sort(key = lambda w: w.name())
 
-        # Stop those worlds.
+        # The worlds are restarted with the new version in batches, so only
+        # a few JVMs are cold at the same time and the downtime of a world is
+        # only one restart. The new version is activated, when the first
+        # batch is offline.
+        batch_size = self._update_batch_size
+        batches = [
+            worlds[i:i + batch_size] for i in range(0, len(worlds), batch_size)
+            ]
+
+        old_dir = None
+        switched = False
+
+        # The worlds, which have not been restarted and still use the old
+        # version.
+        stale_worlds = list()
         try:
-            for world in worlds:
-                print("\t", "stopping the world '{}' ...".format(world.name()))
+            for i, batch in enumerate(batches):
+                stopped = self._stop_worlds(batch)
+                stale_worlds.extend(w for w in batch if w not in stopped)
+
+                # Do not continue, if the new version is not active yet.
+                if not switched and len(stopped) < len(batch):
+                    self._start_worlds(stopped)
+                    return None
+
+                if not switched and stopped:
+                    print("\t", "switching to the new server version ...")
+                    try:
+                        old_dir = server.switch_install(staging_dir)
+                    except OSError as err:
+                        print("\t", termcolor.colored("error:", "red"), err)
+                        log.exception(err)
+                        self._start_worlds(stopped)
+                        return None
+                    switched = True
+
+                # Abort the rolling restart, if a world does not come up.
+                if not self._start_worlds(stopped):
+                    print("\t", termcolor.colored("error:", "red"),
+                          "aborting the update.")
+                    for pending in batches[i + 1:]:
+                        stale_worlds.extend(pending)
+                    break
+
+            # No world is online.
+            if not switched:
+                old_dir = server.switch_install(staging_dir)
+                switched = True
+        finally:
+            if not switched:
+                server.discard_install(staging_dir)
+            elif stale_worlds:
+                print("\t", "the worlds {} still use the old version in '{}'. "\
+                      "Restart them and remove the directory."\
+                      .format(", ".join(w.name() for w in stale_worlds), old_dir))
+            else:
+                server.discard_install(old_dir)
+        return None
+
+    def _stop_worlds(self, worlds):
+        """
+        Stops the *worlds* for an update and returns the worlds, which have
+        been stopped.
+        """
+        stopped = list()
+        for world in worlds:
+            print("\t", "stopping the world '{}' ...".format(world.name()))
+            try:
                 world.stop(message=self._update_message)
+            except emsm.core.worlds.WorldStopFailed as err:
+                print("\t", termcolor.colored("error:", "red"),
+                      "the world '{}' could not be stopped."\
+                      .format(err.world.name())
+                      )
+                log.exception(err)
+            else:
+                stopped.append(world)
+        return stopped
 
-        # Do not continue if a world could not be stopped.
-        except emsm.core.worlds.WorldStopFailed as err:
-            print("\t", termcolor.colored("error:", "red"),
-                  "the world '{}' could not be stopped.".format(err.world.name())
-                  )
-            log.exception(err)
+    def _start_worlds(self, worlds):
+        """
+        Starts the *worlds* after an update and waits, until they are ready.
+        Returns ``True``, if all worlds are ready.
 
-        # Continue with the server update if all worlds are offline.
-        # Note, that a ServerIsOnlineError can not occur since we stopped
-        # all worlds. (If a world would still be online, we would not have
-        # reached this line of code.)
-        else:
-            print("\t", "reinstalling the server ...")
+        See also:
+            * WorldWrapper.is_ready()
+        """
+        ok = True
+        started = list()
+        for world in worlds:
+            print("\t", "restarting the world '{}' ...".format(world.name()))
             try:
-                server.reinstall()
-            except emsm.core.server.ServerInstallationFailure as err:
-                print("\t", termcolor.colored("error:", "red"), err)
+                world.start()
+            except emsm.core.worlds.WorldStartFailed as err:
+                print("\t", termcolor.colored("error:", "red"),
+                      "the world '{}' could not be restarted."\
+                      .format(err.world.name())
+                      )
                 log.exception(err)
-
-        # Restart the worlds.
-        finally:
-            for world in worlds:
-                print("\t", "restarting the world '{}' ..."\
-                      .format(world.name()))
-                try:
-                    world.start()
-                except emsm.core.worlds.WorldStartFailed as err:
+                ok = False
+            else:
+                started.append(world)
+
+        # Wait for all worlds of the batch at the same time.
+        deadline = time.monotonic() + self._update_ready_timeout
+        while started:
+            started = [world for world in started if not world.is_ready()]
+            offline = [world for world in started if not world.is_online()]
+            if offline or (started and time.monotonic() >= deadline):
+                for world in started:
                     print("\t", termcolor.colored("error:", "red"),
-                          "the world '{}' could not be restarted."\
-                          .format(err.world.name())
+                          "the world '{}' did not become ready."\
+                          .format(world.name())
                           )
-                    log.exception(err)
-        return None
+                return False
+            if started:
+                time.sleep(1)
+        return ok
@@ -45,6 +45,7 @@ Configuration
     default_log_limit = 10
     open_console_delay = 1
     send_command_timeout = 10
+    stats_period = 24
 
 **default_log_start**
 
@@ -65,6 +66,10 @@ Configuration
     Maximum time waited for the response of the minecraft server,
     if the ``--verbose-send`` command is used.
 
+**stats_period**
+
+    The number of hours covered by ``--stats``.
+
 Arguments
 ---------
 
@@ -97,10 +102,40 @@ Arguments
 
     Prints the PID of the screen session that runs the server.
 
+.. option:: --stats
+
+    Prints performance statistics of the world, which are extracted from the
+    server log: The tick lag (*"Can't keep up!"*), the number of online
+    players and the durations of the starts and saves.
+
+    Only the log lines appended since the last call are parsed. The values
+    are kept in compact time series files (the latest 4096 values of each
+    metric). Log lines written before a log rotation are only recorded, if
+    this command has been called in between, so you should call it
+    regularly, e.g. by cron.
+
 .. option:: --status
 
     Prints the status of the world (online or offline).
 
+.. option:: --status-all
+
+    Prints the status, the pid of the screen session, the address, the
+    uptime and the server of all selected worlds in one table. The process
+    table is only read once, so this is much faster than ``--status`` if
+    you have many worlds.
+
+.. option:: --top
+
+    Prints the resource usage of the Java processes of the selected worlds,
+    sorted by the CPU usage: CPU (100% is one core), resident memory (RSS and
+    PSS), threads, bytes read from and written to the disk and the uptime.
+    The values are read from :file:`/proc` (Linux only). The CPU usage is
+    measured over one second.
+
+    With ``--output json``, the samples are added to the *top* key of each
+    world (``null``, if the world is offline).
+
 .. option:: --send CMD
 
     Sends the command to the world.
@@ -156,10 +191,36 @@ Arguments
 
     Like --restart, but forces the stop of the world if necessary.
 
+.. option:: --clone NEW_NAME
+
+    Creates a copy of the world with the name *NEW_NAME*, including its
+    configuration. Online worlds are saved and the auto-save is disabled
+    while the world is copied.
+
+    On file systems with reflink support (btrfs, xfs, ...) the copy is
+    almost instant and uses no extra disk space until one of the worlds
+    is modified.
+
+    The *server-port*, *query.port* and *rcon.port* in the
+    :file:`server.properties` of the new world are changed to free ports,
+    so that both worlds can run at the same time.
+
 .. option:: --uninstall
 
     Removes the world and its configuration.
 
+JSON output
+-----------
+
+With the global ``--output json`` argument, the results of *--address*,
+*--configuration*, *--directory*, *--log*, *--pid*, *--status*,
+*--status-all*, *--stats* and *--top* are printed as one JSON document:
+
+.. code-block:: bash
+
+    $ minecraft -W --output json worlds --status
+    {"worlds": {"bar": {"status": "offline"}, "foo": {"status": "online"}}}
+
 Examples
 ---------
 
@@ -181,6 +242,18 @@ Examples
     # Open the console of a running world
     $ minecraft -w bar worlds --console
 
+    # Show which worlds are running:
+    $ minecraft -W worlds --status-all
+
+    # Find the world, which is eating the host:
+    $ minecraft -W worlds --top
+
+    # Record the performance statistics every 5 minutes (cron):
+    */5 * * * * root minecraft -W worlds --stats > /dev/null
+
+    # Create the test world *foo_test* as copy of *foo*
+    $ minecraft -w foo worlds --clone foo_test
+
     ...
 """
 
@@ -206,6 +279,15 @@ from emsm.core.base_plugin import BasePlugin
 
 PLUGIN = "Worlds"
 
+# The units of the metrics printed by *--stats*.
+STATS_UNITS = {
+    "lag_ms": "ms",
+    "lag_ticks": "ticks",
+    "players": "players",
+    "start_duration": "s",
+    "save_duration": "s"
+    }
+
 
 # Classes
 # --------------------------------------------------
@@ -227,6 +309,21 @@ class MyWorld(object):
         """
         return self._world
 
+    def _add_output(self, data):
+        """
+        Adds *data* to the JSON output document and returns ``True``, if the
+        JSON output has been selected. Otherwise, ``False`` is returned and
+        the caller should print the data.
+
+        See also:
+            * emsm.core.output.Output
+        """
+        output = self._app.output()
+        if not output.is_json():
+            return False
+        output.add("worlds", self._world.name(), data)
+        return True
+
     def print_address(self):
         """
         Prints the remote address (ip, port) the server is binded to.
@@ -235,6 +332,8 @@ class MyWorld(object):
             * WorldWrapper.address()
         """
         ip, port = self._world.address()
+        if self._add_output({"address": {"ip": ip, "port": port}}):
+            return None
 
         print(termcolor.colored("{}:".format(self._world.name()), "cyan"))
         if ip and port:
@@ -256,6 +355,8 @@ class MyWorld(object):
             * WorldWrapper.conf()
         """
         conf = self._world.conf().items()
+        if self._add_output({"configuration": dict(conf)}):
+            return None
 
         print(termcolor.colored("{}:".format(self._world.name()), "cyan"))
         for key, value in sorted(conf):
@@ -272,6 +373,9 @@ class MyWorld(object):
         See also:
             * WorldWrapper.directory()
         """
+        if self._add_output({"directory": self._world.directory()}):
+            return None
+
         print(termcolor.colored("{}:".format(self._world.name()), "cyan"))
         print("\t", self._world.directory())
         return None
@@ -318,6 +422,9 @@ class MyWorld(object):
         else:
             end_line = num_lines
 
+        if self._add_output({"log": log[start_line:end_line]}):
+            return None
+
         # Print the log section.
         tmp = termcolor.colored(self._world.name(), "cyan") + " - " +\
               termcolor.colored("lines {}-{}/{}".format(start_line + 1, end_line, num_lines), "green") +\
@@ -342,6 +449,8 @@ class MyWorld(object):
             * WorldWrapper.pids()
         """
         pids = self._world.pids()
+        if self._add_output({"pids": pids}):
+            return None
 
         print(termcolor.colored("{}:".format(self._world.name()), "cyan"))
         if not pids:
@@ -351,15 +460,55 @@ class MyWorld(object):
                 print("\t", pid)
         return None
 
+    def print_stats(self, directory, period):
+        """
+        Updates the log metrics of the world, which are stored in
+        *directory*, and prints a summary of the last *period* seconds.
+
+        See also:
+            * emsm.core.metrics.LogMetrics
+        """
+        metrics = emsm.core.metrics.LogMetrics(self._world, directory)
+        metrics.update()
+        summary = metrics.summary(since=time.time() - period)
+        if self._add_output({"stats": summary}):
+            return None
+
+        print(termcolor.colored("{}:".format(self._world.name()), "cyan"))
+        if not summary:
+            print("\t", "- no data -")
+
+        for metric in emsm.core.metrics.METRICS:
+            if metric not in summary:
+                continue
+
+            record = summary[metric]
+            print("\t", "{:<15} last: {:>8.1f}  min: {:>8.1f}  "\
+                  "mean: {:>8.1f}  max: {:>8.1f}  ({} values, {})"\
+                  .format(metric + ":", record["last"], record["min"],
+                          record["mean"], record["max"], record["count"],
+                          STATS_UNITS[metric]))
+        return None
+
     def print_status(self, status=None):
         """
         Prints the current status (*offline* or *online*) of the world.
 
+        *status* is the record of the world returned by
+        :meth:`WorldManager.status_all`. If it is ``None``, the status is
+        queried.
+
         See also:
             * WorldWrapper.is_online()
+            * WorldManager.status_all()
         """
+        online = status["online"] if status is not None \
+                 else self._world.is_online()
+        if self._add_output({"status": "online" if online else "offline"}):
+            return None
+
         print(termcolor.colored("{}:".format(self._world.name()), "cyan"))
-        if self._world.is_online():
+        if online:
             print("\t", termcolor.colored("online", "green"))
         else:
             print("\t", termcolor.colored("offline", "red"))
@@ -526,6 +675,25 @@ class MyWorld(object):
             print("\t", "the world has been", termcolor.colored("restarted.", "yellow"))
         return None
 
+    def clone(self, name):
+        """
+        Clones the world.
+
+        See also:
+            * WorldWrapper.clone()
+        """
+        print(termcolor.colored("{}:".format(self._world.name()), "cyan"))
+        try:
+            clone = self._world.clone(name)
+        except (ValueError, emsm.core.worlds.WorldError) as err:
+            print("\t", termcolor.colored("error:", "red"), err)
+        else:
+            print("\t", "the world has been cloned to '{}'.".format(name))
+            ip, port = clone.address()
+            if port is not None:
+                print("\t", "the clone uses the port {}.".format(port))
+        return None
+
     def uninstall(self):
         """
         Removes the world from EMSM.
@@ -576,6 +744,8 @@ class Worlds(BasePlugin):
             "open_console_delay", 1)
         self._default_send_command_timeout = conf.getint(
             "send_command_timeout", 10)
+        self._stats_period = conf.getint(
+            "stats_period", 24)
 
         # And store the *used* values in the configuration.
         # This makes sense since we initialise the configuration section
@@ -584,6 +754,7 @@ class Worlds(BasePlugin):
         conf["default_log_limit"] = str(self._default_log_limit)
         conf["open_console_delay"] = str(self._default_open_console_delay)
         conf["send_command_timeout"] = str(self._default_send_command_timeout)
+        conf["stats_period"] = str(self._stats_period)
         return None
 
     def setup_argparser(self):
@@ -674,12 +845,33 @@ class Worlds(BasePlugin):
             dest = "pid",
             help = "Prints the pid of the server that runs the world."
             )
+        status_group.add_argument(
+            "--stats",
+            action = "count",
+            dest = "worlds_stats",
+            help = "Prints the tick lag, player and start/save statistics "\
+                   "extracted from the log."
+            )
         status_group.add_argument(
             "--status",
             action = "count",
             dest = "status",
             help = "Prints the status of the world."
             )
+        status_group.add_argument(
+            "--status-all",
+            action = "count",
+            dest = "worlds_status_all",
+            help = "Prints the status, pids, address, uptime and server of "\
+                   "all selected worlds in one table."
+            )
+        status_group.add_argument(
+            "--top",
+            action = "count",
+            dest = "worlds_top",
+            help = "Prints the CPU, memory, thread and IO usage of the "\
+                   "worlds' server processes."
+            )
         status_group.add_argument(
             "--start",
             action = "count",
@@ -723,6 +915,13 @@ class Worlds(BasePlugin):
             )
 
         # Setup
+        parser.add_argument(
+            "--clone",
+            action = "store",
+            dest = "worlds_clone",
+            metavar = "NEW_NAME",
+            help = "Creates a copy of the world with the name NEW_NAME."
+            )
         parser.add_argument(
             "--uninstall",
             action = "count",
@@ -731,6 +930,100 @@ class Worlds(BasePlugin):
             )
         return None
 
+    def print_top(self, worlds):
+        """
+        Samples the resource usage of all *worlds* at once and prints it.
+
+        See also:
+            * emsm.core.resources.sample_worlds()
+        """
+        samples = emsm.core.resources.sample_worlds(worlds)
+
+        output = self.app().output()
+        if output.is_json():
+            for name, sample in samples.items():
+                output.add("worlds", name, {"top": sample})
+            return None
+
+        def mib(value):
+            return "?" if value is None else "{:.1f}M".format(value/1024**2)
+
+        # The busiest world comes first.
+        names = sorted(
+            samples,
+            key=lambda name: (samples[name] is None,
+                              -(samples[name] or dict()).get("cpu_percent", 0),
+                              name)
+            )
+
+        row = "{:<20} {:>7} {:>7} {:>9} {:>9} {:>7} {:>9} {:>9} {:>9}"
+        print(row.format(
+            "world", "pid", "cpu%", "rss", "pss", "threads", "read", "write",
+            "uptime"
+            ))
+        for name in names:
+            sample = samples[name]
+            if sample is None:
+                print(row.format(name, "-", "-", "-", "-", "-", "-", "-", "-"))
+                continue
+
+            uptime = int(time.time() - sample["start_time"])
+            print(row.format(
+                name, sample["pid"], "{:.1f}".format(sample["cpu_percent"]),
+                mib(sample["rss"]), mib(sample["pss"]), sample["threads"],
+                mib(sample["read_bytes"]), mib(sample["write_bytes"]),
+                "{}:{:02}:{:02}".format(
+                    uptime//3600, uptime//60 % 60, uptime % 60
+                    )
+                ))
+        return None
+
+    def print_status_all(self, worlds):
+        """
+        Prints the status of all *worlds* in one table. The process table is
+        only read once.
+
+        See also:
+            * emsm.core.worlds.WorldManager.status_all()
+        """
+        status = self.app().worlds().status_all(worlds)
+
+        output = self.app().output()
+        if output.is_json():
+            for name, record in status.items():
+                output.add("worlds", name, {"status_all": record})
+            return None
+
+        # The status is padded before it is colored.
+        row = "{:<20} {} {:>7} {:<21} {:>9}  {}"
+        print(row.format("world", "{:<8}".format("status"), "pid", "address",
+                         "uptime", "server"))
+        for name in sorted(status):
+            record = status[name]
+
+            ip, port = record["address"]
+            address = "{}:{}".format(ip or "*", port) \
+                      if port is not None else "-"
+
+            uptime = record["uptime"]
+            if uptime is None:
+                uptime = "-"
+            else:
+                uptime = int(uptime)
+                uptime = "{}:{:02}:{:02}".format(
+                    uptime//3600, uptime//60 % 60, uptime % 60
+                    )
+
+            print(row.format(
+                name,
+                termcolor.colored("{:<8}".format("online"), "green") \
+                if record["online"] else \
+                termcolor.colored("{:<8}".format("offline"), "red"),
+                record["pids"][0] if record["pids"] else "-",
+                address, uptime, record["server"]
+                ))
+        return None
+
     def run(self, args):
         """
         """
@@ -738,8 +1031,20 @@ class Worlds(BasePlugin):
         worlds = self.app().worlds().get_selected()
         worlds.sort(key = lambda w: w.name())
 
+        # The resource usage of all worlds is sampled at once.
+        if args.worlds_top:
+            self.print_top(worlds)
+            return None
+        if args.worlds_status_all:
+            self.print_status_all(worlds)
+            return None
+
+        # The status of all worlds is queried at once.
+        status = self.app().worlds().status_all(worlds) if args.status \
+                 else dict()
+
         for world in worlds:
-            world = MyWorld(self.app, world)
+            world = MyWorld(self.app(), world)
 
             # configuration
             if args.worlds_address:
@@ -766,7 +1071,12 @@ class Worlds(BasePlugin):
                 world.print_pids()
 
             elif args.status:
-                world.print_status()
+                world.print_status(status.get(world.world().name()))
+            elif args.worlds_stats:
+                world.print_stats(
+                    os.path.join(self.data_dir(), "stats", world.world().name()),
+                    self._stats_period*3600
+                    )
 
             # send / screen / ...
             elif args.send:
@@ -792,6 +1102,8 @@ class Worlds(BasePlugin):
             elif args.force_restart:
                 world.restart(force_restart=True)
             # Setup
+            elif args.worlds_clone:
+                world.clone(args.worlds_clone)
             elif args.uninstall:
                 world.uninstall()
         return None
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""
+Compares the throughput of :func:`shutil.copytree` and the EMSM copy engine
+:func:`emsm.core.copy.copytree` on a synthetic world with many small files.
+
+.. code-block:: bash
+
+    $ python3 tests/benchmarks/bench_copy.py --files 10000 --dir /var/tmp
+"""
+
+
+# Modules
+# ------------------------------------------------
+
+# std
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+# local
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+    )
+import emsm.core.copy_
+
+
+# Functions
+# ------------------------------------------------
+
+def create_world(directory, files):
+    """
+    Creates a synthetic world with *files* files in *directory* and returns
+    the total size in bytes.
+    """
+    random.seed(0)
+    size = 0
+    for i in range(files):
+        # Mostly small files (player data, stats, ...) and a few larger
+        # region files.
+        if i % 100 == 0:
+            file_size = random.randint(1, 8)*1024**2
+        else:
+            file_size = random.randint(256, 16*1024)
+
+        path = os.path.join(directory, "dir{}".format(i % 64), "{}.dat".format(i))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(os.urandom(file_size))
+        size += file_size
+    return size
+
+
+def bench(name, copytree, src, dst, size, repeat):
+    """
+    Copies *src* to *dst* with *copytree* and prints the best throughput
+    of *repeat* runs.
+    """
+    durations = list()
+    for i in range(repeat):
+        os.sync()
+        start = time.perf_counter()
+        copytree(src, dst)
+        durations.append(time.perf_counter() - start)
+        shutil.rmtree(dst)
+
+    duration = min(durations)
+    print("{:<24} {:8.2f} s {:10.1f} MiB/s".format(
+        name, duration, size/1024**2/duration
+        ))
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--dir", default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp_dir:
+        src = os.path.join(tmp_dir, "world")
+        size = create_world(src, args.files)
+        print("{} files, {:.1f} MiB".format(args.files, size/1024**2))
+
+        dst = os.path.join(tmp_dir, "copy")
+        for name, copytree in [
+            ("shutil.copytree", shutil.copytree),
+            ("emsm.core.copy.copytree", emsm.core.copy_.copytree)
+            ]:
+            bench(name, copytree, src, dst, size, args.repeat)
+    return None
+
+
+if __name__ == "__main__":
+    main()
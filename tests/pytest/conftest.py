@@ -0,0 +1,10 @@
+#!/usr/bin/python
+
+import os
+import sys
+
+# The tests use the emsm package of this repository, even if it is not
+# installed.
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    )
@@ -0,0 +1,222 @@
+#!/usr/bin/python
+
+import datetime
+import os
+import struct
+import types
+import zipfile
+
+import emsm.plugins.backups as backups
+
+
+SECTOR = backups.REGION_SECTOR_SIZE
+
+
+def write_region(path, chunks):
+    """
+    Writes a region file with the *chunks* (index -> (timestamp, data)) at
+    *path*. The chunks are stored one after another, like the EMSM
+    reconstructs them from a delta.
+    """
+    locations = [0]*1024
+    timestamps = [0]*1024
+    body = b""
+    sector = 2
+    for i in sorted(chunks):
+        timestamp, data = chunks[i]
+        count = -(-len(data)//SECTOR)
+        locations[i] = (sector << 8) | count
+        timestamps[i] = timestamp
+        body += data.ljust(count*SECTOR, b"\0")
+        sector += count
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(struct.pack(">1024I", *locations))
+        file.write(struct.pack(">1024I", *timestamps))
+        file.write(body)
+
+
+def read(path):
+    with open(path, "rb") as file:
+        return file.read()
+
+
+class World(object):
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    def name(self):
+        return "foo"
+
+    def directory(self):
+        return self._directory
+
+    def is_online(self):
+        return False
+
+
+class Clock(datetime.datetime):
+    """
+    Every backup gets its own second, so that the filenames differ.
+    """
+
+    ticks = 0
+
+    @classmethod
+    def now(cls):
+        cls.ticks += 1
+        return datetime.datetime(2020, 1, 1) \
+               + datetime.timedelta(seconds=cls.ticks)
+
+
+def backup_manager(tmpdir, monkeypatch, max_storage_size):
+    """
+    Returns a backup manager for a world in *tmpdir*, which creates up to
+    two delta backups after a full backup.
+    """
+    monkeypatch.setattr(
+        backups, "datetime", types.SimpleNamespace(
+            datetime=Clock, timedelta=datetime.timedelta
+            )
+        )
+
+    world_dir = str(tmpdir.join("worlds", "foo"))
+    conf_path = str(tmpdir.join("foo.world.conf"))
+    with open(conf_path, "w") as file:
+        file.write("[world]\n")
+
+    world_conf = types.SimpleNamespace(path=lambda: conf_path, read=lambda: None)
+    app = types.SimpleNamespace(
+        conf=lambda: types.SimpleNamespace(world=lambda name: world_conf)
+        )
+    return backups.BackupManager(
+        app=app, world=World(world_dir), max_storage_size=max_storage_size,
+        backup_dir=str(tmpdir.join("backups")), backup_logs=False,
+        default_archive_format="zip", exclude_paths=[], delta_backups=2
+        )
+
+
+def test_region_delta_restore(tmpdir, monkeypatch):
+    manager = backup_manager(tmpdir, monkeypatch, 10)
+    world_dir = manager.world().directory()
+
+    region = os.path.join(world_dir, "region", "r.0.0.mca")
+    other = os.path.join(world_dir, "level.dat")
+
+    # The full backup.
+    write_region(region, {
+        0: (1, b"a"*100), 1: (1, b"b"*5000), 7: (1, b"c"*10)
+        })
+    with open(other, "wb") as file:
+        file.write(b"level 1")
+    full_region, full_other = read(region), read(other)
+    manager.create()
+
+    # The delta backup. One chunk is changed and grows, one is added and
+    # one is removed.
+    write_region(region, {
+        0: (1, b"a"*100), 1: (2, b"B"*9000), 9: (2, b"d"*20)
+        })
+    with open(other, "wb") as file:
+        file.write(b"level 2")
+    delta_region, delta_other = read(region), read(other)
+    manager.create()
+
+    full, delta = sorted(manager.index())
+    assert manager.index()[full]["base"] is None
+    assert manager.index()[delta]["base"] == full
+
+    # The delta backup stores only the changed chunks of the region file.
+    with zipfile.ZipFile(os.path.join(manager.backup_dir(), delta)) as archive:
+        names = [name.lstrip("./") for name in archive.namelist()]
+    assert "world/region/r.0.0.mca.delta" in names
+    assert "world/region/r.0.0.mca" not in names
+
+    # Mess up the world and restore both backups.
+    write_region(region, {3: (3, b"x"*10)})
+    manager.restore(os.path.join(manager.backup_dir(), delta))
+    assert read(region) == delta_region
+    assert read(other) == delta_other
+
+    manager.restore(os.path.join(manager.backup_dir(), full))
+    assert read(region) == full_region
+    assert read(other) == full_other
+
+
+def test_pinned_base(tmpdir, monkeypatch, caplog):
+    manager = backup_manager(tmpdir, monkeypatch, 1)
+    region = os.path.join(manager.world().directory(), "region", "r.0.0.mca")
+
+    write_region(region, {0: (1, b"a"*100)})
+    manager.create()
+    write_region(region, {0: (2, b"b"*100)})
+    manager.create()
+
+    # The full backup exceeds the max_storage_size, because the delta
+    # backup depends on it.
+    full, delta = sorted(manager.index())
+    assert manager.index()[delta]["base"] == full
+    assert "needed by delta backups" in caplog.text
+
+
+def test_delta_restore_without_index(tmpdir, monkeypatch):
+    manager = backup_manager(tmpdir, monkeypatch, 10)
+    region = os.path.join(manager.world().directory(), "region", "r.0.0.mca")
+
+    write_region(region, {0: (1, b"a"*100), 1: (1, b"b"*100)})
+    manager.create()
+    write_region(region, {0: (1, b"a"*100), 1: (2, b"c"*100)})
+    delta_region = read(region)
+    manager.create()
+    full, delta = sorted(manager.index())
+
+    # The index is rebuilt from the backup directory.
+    os.remove(manager.index_path())
+    manager = backup_manager(tmpdir, monkeypatch, 10)
+    assert manager.index()[delta]["base"] == full
+    assert manager.index()[full]["base"] is None
+
+    write_region(region, {})
+    manager.restore(os.path.join(manager.backup_dir(), delta))
+    assert read(region) == delta_region
+
+
+class OnlineWorld(World):
+    """
+    A running world, which writes the log and the level.dat on every save.
+    """
+
+    def is_online(self):
+        return True
+
+    def send_command(self, command):
+        return None
+
+    def send_command_get_output(self, command, timeout=10, until=None):
+        assert until is not None and until.search("Saved the game")
+        os.makedirs(os.path.join(self._directory, "logs"), exist_ok=True)
+        with open(os.path.join(self._directory, "logs", "latest.log"), "a") as file:
+            file.write("[Server thread/INFO]: Saved the game\n")
+        with open(os.path.join(self._directory, "level.dat"), "ab") as file:
+            file.write(b"x")
+        return "Saved the game"
+
+
+def test_idle_online_world_unchanged(tmpdir, monkeypatch):
+    manager = backup_manager(tmpdir, monkeypatch, 10)
+    world = OnlineWorld(manager.world().directory())
+    manager._world = world
+    manager._backup_logs = True
+    region = os.path.join(world.directory(), "region", "r.0.0.mca")
+
+    write_region(region, {0: (1, b"a"*100)})
+    assert manager.create_if_changed()
+
+    # The saves of an idle world are not a modification.
+    assert not manager.has_changed()
+    assert not manager.create_if_changed()
+
+    write_region(region, {0: (2, b"b"*100)})
+    assert manager.has_changed()
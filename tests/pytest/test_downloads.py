@@ -0,0 +1,118 @@
+#!/usr/bin/python
+
+import hashlib
+import http.server
+import os
+import threading
+
+import pytest
+
+import emsm.core.downloads as downloads
+
+
+class Upstream(object):
+    """
+    Serves one file with an *ETag* and a *Last-Modified* header and counts
+    the full responses.
+    """
+
+    def __init__(self):
+        self.data = b"server v1"
+        self.etag = '"v1"'
+        self.last_modified = "Wed, 01 Jan 2020 00:00:00 GMT"
+        self.transfers = 0
+
+        upstream = self
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.headers.get("If-None-Match") == upstream.etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return None
+
+                upstream.transfers += 1
+                self.send_response(200)
+                self.send_header("ETag", upstream.etag)
+                self.send_header("Last-Modified", upstream.last_modified)
+                self.send_header("Content-Length", str(len(upstream.data)))
+                self.end_headers()
+                self.wfile.write(upstream.data)
+                return None
+
+            def log_message(self, *args):
+                return None
+
+        self.server = http.server.HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:{}/server.jar"\
+                   .format(self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+@pytest.fixture
+def upstream():
+    upstream = Upstream()
+    yield upstream
+    upstream.close()
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_not_modified(tmpdir, upstream, monkeypatch):
+    cache = downloads.DownloadCache(str(tmpdir))
+
+    download = cache.fetch(upstream.url)
+    assert download.transferred
+    assert download.sha256 == sha256(b"server v1")
+    with open(download.path, "rb") as file:
+        assert file.read() == b"server v1"
+
+    # The verified hash is reused, so the cached file is not hashed again.
+    def hash_file(path):
+        raise AssertionError("the cached file has been hashed again")
+    monkeypatch.setattr(downloads, "_hash_file", hash_file)
+
+    # A new cache instance reads the validators from the index.
+    cache = downloads.DownloadCache(str(tmpdir))
+    download = cache.fetch(upstream.url, max_age=0)
+    assert not download.transferred
+    assert download.sha256 == sha256(b"server v1")
+    assert upstream.transfers == 1
+
+
+def test_modified(tmpdir, upstream):
+    cache = downloads.DownloadCache(str(tmpdir))
+    old = cache.fetch(upstream.url)
+
+    upstream.data = b"server v2"
+    upstream.etag = '"v2"'
+    upstream.last_modified = "Thu, 02 Jan 2020 00:00:00 GMT"
+
+    new = cache.fetch(upstream.url, max_age=0)
+    assert new.transferred
+    assert new.sha256 == sha256(b"server v2")
+    with open(new.path, "rb") as file:
+        assert file.read() == b"server v2"
+
+    # The outdated object is removed from the cache.
+    assert not os.path.exists(old.path)
+    assert upstream.transfers == 2
+
+
+def test_sha256_mismatch(tmpdir, upstream):
+    cache = downloads.DownloadCache(str(tmpdir))
+
+    with pytest.raises(downloads.IntegrityError):
+        cache.fetch(upstream.url, sha256=sha256(b"something else"))
+
+    # The rejected file is not cached.
+    assert os.listdir(str(tmpdir.join("objects"))) == []
+    assert cache.fetch(upstream.url).transferred
@@ -0,0 +1,157 @@
+#!/usr/bin/python
+
+import asyncio
+import json
+import socket
+import struct
+
+import pytest
+
+import emsm.plugins.guard as guard
+
+
+def varint(value):
+    """
+    A straightforward varint encoder, which is independent from the guard.
+    """
+    value &= 0xffffffff
+    data = b""
+    while value > 0x7f:
+        data += bytes([(value & 0x7f) | 0x80])
+        value >>= 7
+    return data + bytes([value])
+
+
+async def read_varint(reader):
+    value = 0
+    for i in range(5):
+        byte = (await reader.readexactly(1))[0]
+        value |= (byte & 0x7f) << 7*i
+        if not byte & 0x80:
+            return value
+    raise ValueError("varint is too long")
+
+
+def ping(handler, timeout=2):
+    """
+    Starts a server, which handles the connections with *handler*, pings
+    it and returns the status, the packets, which have been received by the
+    server, and the port of the server.
+    """
+    packets = list()
+    ports = list()
+
+    async def main():
+        done = asyncio.Event()
+
+        async def handle(reader, writer):
+            try:
+                await handler(reader, writer, packets)
+            finally:
+                writer.close()
+                done.set()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        ports.append(port)
+        try:
+            return await guard.server_list_ping("127.0.0.1", port, timeout)
+        finally:
+            # Wait for the handler, so that the loop is not closed while
+            # the connection is still open.
+            await asyncio.wait_for(done.wait(), 5)
+            await asyncio.sleep(0)
+            server.close()
+            await server.wait_closed()
+
+    status = guard._run_until_complete(main())
+    return status, packets, ports[0]
+
+
+async def read_request(reader, packets):
+    """
+    Reads the handshake and the status request.
+    """
+    for i in range(2):
+        length = await read_varint(reader)
+        packets.append(await reader.readexactly(length))
+
+
+def test_varint():
+    for value, data in (
+        (0, b"\x00"), (1, b"\x01"), (127, b"\x7f"), (128, b"\x80\x01"),
+        (300, b"\xac\x02"), (2**31 - 1, b"\xff\xff\xff\xff\x07"),
+        (-1, b"\xff\xff\xff\xff\x0f")
+        ):
+        assert guard._pack_varint(value) == data
+        assert guard._unpack_varint(b"?" + data + b"?", 1) \
+               == (value & 0xffffffff, len(data) + 1)
+
+    with pytest.raises(ValueError):
+        guard._unpack_varint(b"\xff"*5)
+
+
+def test_status():
+    response = {
+        "version": {"name": "1.16.4", "protocol": 754},
+        "players": {"max": 20, "online": 3, "sample": []},
+        # The description makes the packet longer than 127 bytes, so that
+        # its length is a multi-byte varint.
+        "description": {"text": "A Minecraft Server"*20}
+        }
+
+    async def handler(reader, writer, packets):
+        await read_request(reader, packets)
+        data = json.dumps(response).encode()
+        packet = varint(0x00) + varint(len(data)) + data
+        writer.write(varint(len(packet)) + packet)
+        await writer.drain()
+
+    status, packets, port = ping(handler)
+    assert status["players_online"] == 3
+    assert status["players_max"] == 20
+    assert status["version"] == "1.16.4"
+    assert status["latency"] >= 0
+
+    # The handshake and the status request are framed correctly.
+    handshake, request = packets
+    host = b"127.0.0.1"
+    assert handshake == varint(0x00) + varint(guard.PING_PROTOCOL_VERSION) \
+                        + varint(len(host)) + host \
+                        + struct.pack(">H", port) + varint(1)
+    assert request == varint(0x00)
+
+
+def test_legacy_kick():
+    async def handler(reader, writer, packets):
+        await reader.read(1)
+        writer.write(b"\xff\x00\x23\x00\xa7\x00\x31")
+        await writer.drain()
+
+    status, packets, port = ping(handler)
+    assert status["latency"] >= 0
+    assert status["players_online"] is None
+    assert status["version"] is None
+
+
+def test_not_responding():
+    async def handler(reader, writer, packets):
+        await read_request(reader, packets)
+        # Wait until the guard gives up and closes the connection.
+        await reader.read()
+
+    with pytest.raises(guard.ServerNotResponding):
+        ping(handler, timeout=0.2)
+
+
+def test_not_reachable():
+    # Get a port, which is not in use.
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+
+    with pytest.raises(guard.ServerNotReachable):
+        guard._run_until_complete(
+            guard.server_list_ping("127.0.0.1", port, 1)
+            )